@@ -13,13 +13,24 @@ import json
 import os
 import sys
 import time
+import uuid
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any, Literal, Optional
 
 import pandas as pd
 from woodwide import WoodWide
 
+from drift import DriftProfile, ModelRegistry, build_profile, should_retrain
+from inventory_schema import NDC_COLUMN
+from inventory_tables import flat_rows, normalize_inventory, sample_split
+from retry_policy import as_utc, call_with_retry, raise_for_transient_status
+from run_checkpoint import CheckpointStore, RunCheckpoint
+from singleflight import flight
+from stage_timing import StageTracer, current_span, stage_span
+from woodwide_pool import get_client, read_source_csv
+
 # Load environment variables from .env file if it exists
 try:
     from dotenv import load_dotenv
@@ -43,6 +54,8 @@ class WoodwideRunResult:
     test_dataset_id: str
     label_column: Optional[str]
     inference_result: Any
+    retrained: bool = True  # False: the drift gate kept the registered model
+    drift_profile: Optional[DriftProfile] = None  # of the training split, for registering the model later
 
 
 # -------------------------
@@ -59,21 +72,24 @@ def fetch_and_prepare_data(
     random_state: int = 42,
 ) -> tuple[str, str, Optional[str]]:
     print(f"Loading dataset from: {data_path}")
-    df = pd.read_csv(data_path)
+    df = read_source_csv(data_path)
 
     if label_column not in df.columns:
         raise ValueError(f"Label column '{label_column}' not found in dataset")
 
-    train_df = df.sample(frac=train_frac, random_state=random_state)
-    test_df = df.drop(train_df.index)
+    train_rows, test_rows = sample_split(len(df), train_frac=train_frac, random_state=random_state)
+    n_columns = df.shape[1]
+    if NDC_COLUMN in df.columns:
+        # Split in the compact dimension/fact form; flat rows are rebuilt only for the upload CSVs
+        df = normalize_inventory(df)
 
-    train_df.to_csv(train_out, index=False)
-    test_df.to_csv(test_out, index=False)
+    flat_rows(df, train_rows).to_csv(train_out, index=False)
+    flat_rows(df, test_rows).to_csv(test_out, index=False)
 
     print("Data prepared successfully.")
     print(f"Label column: '{label_column}'")
-    print(f"Train shape: {train_df.shape}")
-    print(f"Test shape:  {test_df.shape}")
+    print(f"Train shape: {(len(train_rows), n_columns)}")
+    print(f"Test shape:  {(len(test_rows), n_columns)}")
 
     return train_out, test_out, label_column
 
@@ -84,17 +100,21 @@ def fetch_and_prepare_data(
 
 def upload_dataset(client: WoodWide, file_path: str, name: str) -> str:
     print(f"Uploading {file_path} as '{name}'...")
-    start = time.time()
 
-    with open(file_path, "rb") as f:
-        dataset = client.api.datasets.upload(
-            file=f,
-            name=name,
-            overwrite=True,
-        )
+    with stage_span("upload", dataset_name=name, bytes=os.path.getsize(file_path)) as span:
+        def _upload():
+            # Reopen per attempt so a retry sends the file from the start
+            with open(file_path, "rb") as f:
+                return client.api.datasets.upload(
+                    file=f,
+                    name=name,
+                    overwrite=True,
+                )
+
+        dataset = call_with_retry("upload", _upload)
+        span.set(rows=getattr(dataset, "num_rows", None), dataset_id=dataset.id)
 
-    elapsed = time.time() - start
-    print(f"Upload took {elapsed:.2f}s")
+    print(f"Upload took {span.duration_s:.2f}s")
     print(f"Dataset Uploaded. ID: {dataset.id}\n")
     return dataset.id
 
@@ -126,30 +146,51 @@ def train_model(
         }
         print(f"Training Prediction Model '{model_name}'...")
 
-    start = time.time()
-    response = client._client.post(
-        endpoint,
-        params={"dataset_name": dataset_name},
-        data=data,
-        headers=client.auth_headers,
-    )
-
-    elapsed = time.time() - start
-    print(f"Training request took {elapsed:.2f}s")
-
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Training failed ({response.status_code}): {response.text}"
-        )
-
-    model_id = response.json().get("id")
-    if not model_id:
-        raise RuntimeError("No model ID returned from training endpoint")
+    # One key per logical training start, reused across retries, so the
+    # server can recognise a repeated post instead of starting a second job
+    headers = {**client.auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    # Allow for clock skew between us and the server
+    first_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=30)
+
+    def _start_training() -> str:
+        response = raise_for_transient_status(client._client.post(
+            endpoint,
+            params={"dataset_name": dataset_name},
+            data=data,
+            headers=headers,
+        ))
+        current_span().set(http_status=response.status_code)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Training failed ({response.status_code}): {response.text}"
+            )
+        model_id = response.json().get("id")
+        if not model_id:
+            raise RuntimeError("No model ID returned from training endpoint")
+        return model_id
+
+    def _find_started_model() -> Optional[str]:
+        # A timed-out or 5xx post may still have started training
+        for model in call_with_retry("retrieve", client.api.models.list):
+            created_at = as_utc(getattr(model, "created_at", None))
+            if model.name == model_name and created_at is not None and created_at >= first_attempt_at:
+                return model.id
+        return None
+
+    with stage_span("train_request", usecase=usecase, model_name=model_name) as span:
+        model_id = call_with_retry("train", _start_training, reconcile=_find_started_model)
+        span.set(model_id=model_id)
+
+    print(f"Training request took {span.duration_s:.2f}s")
 
     print(f"Model Training Started. ID: {model_id}\n")
     return model_id
 
 
+class TrainingFailedError(RuntimeError):
+    """The model reached training_status FAILED; waiting on it again won't help."""
+
+
 def wait_for_training(
     client: WoodWide,
     model_id: str,
@@ -158,57 +199,123 @@ def wait_for_training(
     poll_s: int = 2,
 ) -> None:
     print(f"Waiting for model {model_id} to complete training...")
-    start = time.time()
 
-    while True:
-        model = client.api.models.retrieve(model_id)
-        status = getattr(model, "training_status", None)
+    with stage_span("train_wait", model_id=model_id) as span:
+        polls = 0
+        while True:
+            model = call_with_retry("retrieve", lambda: client.api.models.retrieve(model_id))
+            status = getattr(model, "training_status", None)
+            polls += 1
+            span.set(polls=polls, training_status=status)
 
-        if status == "COMPLETE":
-            print(f"Training complete in {time.time() - start:.2f}s\n")
-            return
+            if status == "COMPLETE":
+                break
 
-        if status == "FAILED":
-            print(model)
-            raise RuntimeError("Model training failed")
+            if status == "FAILED":
+                print(model)
+                raise TrainingFailedError(f"Model {model_id} training failed")
 
-        if time.time() - start > timeout_s:
-            raise TimeoutError("Model training timed out")
+            if span.elapsed() > timeout_s:
+                raise TimeoutError("Model training timed out")
 
-        print(f"Status: {status}. Waiting...")
-        time.sleep(poll_s)
+            print(f"Status: {status}. Waiting...")
+            time.sleep(poll_s)
 
+    print(f"Training complete in {span.duration_s:.2f}s\n")
 
-def run_inference(
-    *,
-    client: WoodWide,
-    model_id: str,
-    test_dataset_id: str,
-    usecase: str,
-) -> Any:
-    print(f"Running inference on model {model_id}...")
 
-    start = time.time()
+def _infer_once(client: WoodWide, model_id: str, test_dataset_id: str, usecase: str) -> Any:
     if usecase == "embedding":
-        result = client.api.models.embedding.infer(
+        return call_with_retry("infer", lambda: client.api.models.embedding.infer(
             model_id=model_id,
             dataset_id=test_dataset_id,
-        )
+        ))
     elif usecase == "anomaly":
-        result = client.api.models.anomaly.infer(
+        return call_with_retry("infer", lambda: client.api.models.anomaly.infer(
             model_id=model_id,
             dataset_id=test_dataset_id,
-        )
+        ))
     else:
-        result = client.api.models.prediction.infer(
+        return call_with_retry("infer", lambda: client.api.models.prediction.infer(
             model_id=model_id,
             dataset_id=test_dataset_id,
+        ))
+
+
+def _inference_key(client: WoodWide, model_id: str, test_dataset_id: str, usecase: str) -> tuple:
+    # Credentials are part of the key so callers never share another tenant's result
+    return (str(client.base_url), client.api_key, usecase, model_id, test_dataset_id)
+
+
+def run_inference(
+    *,
+    client: WoodWide,
+    model_id: str,
+    test_dataset_id: str,
+    usecase: str,
+) -> Any:
+    """
+    Concurrent calls for the same (model_id, test_dataset_id) share one
+    request and its result; see flight("inference").stats() for counts.
+    """
+    print(f"Running inference on model {model_id}...")
+
+    with stage_span("inference", usecase=usecase, model_id=model_id) as span:
+        result, shared = flight("inference").do(
+            _inference_key(client, model_id, test_dataset_id, usecase),
+            lambda: _infer_once(client, model_id, test_dataset_id, usecase),
+        )
+        span.set(coalesced=shared)
+
+    print(f"Inference completed in {span.duration_s:.2f}s" + (" (shared in-flight call)" if shared else ""))
+    return result
+
+
+async def run_inference_async(
+    *,
+    client: WoodWide,
+    model_id: str,
+    test_dataset_id: str,
+    usecase: str,
+) -> Any:
+    """run_inference for asyncio callers; coalesces with threads and other tasks."""
+    print(f"Running inference on model {model_id}...")
+
+    with stage_span("inference", usecase=usecase, model_id=model_id) as span:
+        result, shared = await flight("inference").do_async(
+            _inference_key(client, model_id, test_dataset_id, usecase),
+            lambda: _infer_once(client, model_id, test_dataset_id, usecase),
         )
+        span.set(coalesced=shared)
 
-    print(f"Inference completed in {time.time() - start:.2f}s")
+    print(f"Inference completed in {span.duration_s:.2f}s" + (" (shared in-flight call)" if shared else ""))
     return result
 
 
+def _register_model(
+    registry: ModelRegistry,
+    key: str,
+    checkpoint: RunCheckpoint,
+    *,
+    model_name: str,
+    data_path: str,
+) -> None:
+    if not checkpoint.drift_profile:
+        # Checkpoints written before drift profiles were recorded
+        print(f"No drift profile for run {checkpoint.run_id}; model {checkpoint.model_id} not registered")
+        return
+    registry.register(
+        key,
+        model_id=checkpoint.model_id,
+        profile=DriftProfile.from_dict(checkpoint.drift_profile),
+        model_name=model_name,
+        run_id=checkpoint.run_id,
+        train_dataset_id=checkpoint.train_dataset_id,
+        data_path=os.path.abspath(data_path),
+    )
+    print(f"Registered model {checkpoint.model_id} as the current '{key}' model in {registry.path}")
+
+
 def format_result(result: Any) -> str:
     if hasattr(result, "model_dump_json"):
         return result.model_dump_json(indent=2)
@@ -232,61 +339,192 @@ def woodwide_run(
     output_file: Optional[str] = None,
     label_column: str = DEFAULT_LABEL_COLUMN,
     cleanup_temp_files: bool = True,
+    run_id: Optional[str] = None,
+    spans_file: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+    client: Optional[WoodWide] = None,
+    work_dir: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    prepared_splits: Optional[tuple[str, str, Optional[str]]] = None,
+    drift_gate: bool = False,
+    register_model: bool = True,
+    registry_file: Optional[str] = None,
+    registry_key: Optional[str] = None,
 ) -> WoodwideRunResult:
     """
     End-to-end WoodWide workflow.
     This function is the ONLY intended entrypoint.
-    """
-    client = WoodWide(api_key=api_key, base_url=base_url)
 
-    train_path = test_path = ""
-    train_dataset_id = test_dataset_id = model_id = ""
-
-    effective_label = None if usecase in ("embedding", "anomaly") else label_column
+    Every stage is recorded as a timing span. Spans are appended to
+    `spans_file` (JSONL) and written to `metrics_file` (Prometheus text);
+    both default to the WOODWIDE_SPANS_FILE / WOODWIDE_METRICS_FILE env vars.
 
-    try:
-        train_path, test_path, prepared_label = fetch_and_prepare_data(
-            data_path=data_path,
-            label_column=label_column,
-        )
-        if usecase == "anomaly":
-            effective_label = prepared_label
+    Without an explicit `client`, the process-wide pooled client for
+    (base_url, api_key) is used. `work_dir` keeps the temporary train/test
+    splits apart when several runs share a working directory.
 
-        train_dataset_id = upload_dataset(client, train_path, dataset_name)
-        test_dataset_id = upload_dataset(
-            client, test_path, f"{dataset_name}_test"
-        )
-
-        model_id = train_model(
-            client=client,
-            dataset_name=dataset_name,
-            model_name=model_name,
-            usecase=usecase,
-            label_column=effective_label,
-        )
+    Each completed stage (split hashes, dataset ids, model id) is checkpointed
+    under `checkpoint_dir`. With resume=True and the original run_id, stages
+    that already finished are skipped; see run_checkpoint.resume().
 
-        wait_for_training(client, model_id)
+    `prepared_splits` is the (train_path, test_path, label_column) result of
+    an earlier fetch_and_prepare_data call, e.g. from a batch runner's
+    process pool; the prepare stage then reuses those files.
 
-        inference_result = run_inference(
-            client=client,
-            model_id=model_id,
-            test_dataset_id=test_dataset_id,
+    Once training completes, the model is registered as the current
+    `registry_key` model (default: the usecase) in the drift registry, with
+    a profile of its training split; with drift_gate=True a stable training
+    split skips training and the registered model scores the new test
+    split. See prediction-model.py's woodwide_run for details.
+    """
+    client = client or get_client(api_key=api_key, base_url=base_url)
+    tracer = StageTracer(run_id=run_id)
+    store = CheckpointStore(checkpoint_dir)
+    registry = ModelRegistry(registry_file)
+    registry_key = registry_key or usecase
+
+    if resume:
+        checkpoint = store.load(tracer.run_id)
+        checkpoint.status, checkpoint.error = "running", None
+        print(f"Resuming run {checkpoint.run_id} after stage '{checkpoint.stage}'")
+    else:
+        checkpoint = RunCheckpoint(
+            run_id=tracer.run_id,
             usecase=usecase,
+            params={
+                "usecase": usecase,
+                "model_name": model_name,
+                "dataset_name": dataset_name,
+                # Absolute, so a resume from another working directory finds the same files
+                "data_path": os.path.abspath(data_path),
+                "base_url": base_url,
+                "output_file": os.path.abspath(output_file) if output_file else None,
+                "label_column": label_column,
+                "drift_gate": drift_gate,
+                "register_model": register_model,
+                "registry_file": os.path.abspath(registry.path),
+                "registry_key": registry_key,
+            },
         )
+        print(f"Run ID: {checkpoint.run_id}")
+    store.save(checkpoint)
 
-        if output_file:
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(format_result(inference_result))
+    train_path = test_path = ""
 
-        return WoodwideRunResult(
-            usecase=usecase,
-            model_id=model_id,
-            train_dataset_id=train_dataset_id,
-            test_dataset_id=test_dataset_id,
-            label_column=effective_label,
-            inference_result=inference_result,
-        )
+    effective_label = None if usecase in ("embedding", "anomaly") else label_column
 
+    try:
+        with tracer.activate(), stage_span("woodwide_run", usecase=usecase, model_name=model_name):
+            # Splits are only needed until both datasets are uploaded
+            if not checkpoint.reached("uploaded_test"):
+                with stage_span("prepare", data_path=data_path, external=bool(prepared_splits) or None) as span:
+                    if prepared_splits:
+                        train_path, test_path, prepared_label = prepared_splits
+                    else:
+                        train_path, test_path, prepared_label = fetch_and_prepare_data(
+                            data_path=data_path,
+                            label_column=label_column,
+                            train_out=os.path.join(work_dir or "", "pharmacy_train.csv"),
+                            test_out=os.path.join(work_dir or "", "pharmacy_test.csv"),
+                        )
+                    span.set(bytes=os.path.getsize(train_path) + os.path.getsize(test_path))
+
+                if usecase == "anomaly":
+                    effective_label = prepared_label
+                checkpoint.label_column = effective_label
+                store.record_splits(checkpoint, train_path, test_path)
+
+                if not checkpoint.reached("uploaded_train"):
+                    # Profiled now: the split files are gone once both datasets are uploaded
+                    train_df = pd.read_csv(train_path)
+                    current = None
+                    if drift_gate:
+                        with stage_span("drift_check", registry_key=registry_key) as span:
+                            decision = should_retrain(registry_key, train_df, registry=registry)
+                            span.set(retrain=decision.retrain, drifted=len(decision.drifted_features))
+                        print(f"Drift check: {'RETRAIN' if decision.retrain else 'SKIP'}: {decision.reason}")
+                        if not decision.retrain:
+                            current = registry.get(registry_key)
+                    if current:
+                        # Stable data: the registered model scores the new test split, nothing is trained
+                        store.advance(
+                            checkpoint,
+                            "uploaded_train",
+                            train_dataset_id=current.get("train_dataset_id", ""),
+                            model_id=current["model_id"],
+                            reused_model=True,
+                        )
+                    else:
+                        checkpoint.drift_profile = build_profile(train_df).to_dict()
+                        checkpoint.reused_model = False
+                    del train_df
+
+            effective_label = checkpoint.label_column
+
+            if not checkpoint.reached("uploaded_train"):
+                train_dataset_id = upload_dataset(client, train_path, dataset_name)
+                store.advance(checkpoint, "uploaded_train", train_dataset_id=train_dataset_id)
+
+            if not checkpoint.reached("uploaded_test"):
+                test_dataset_id = upload_dataset(
+                    client, test_path, f"{dataset_name}_test"
+                )
+                store.advance(checkpoint, "uploaded_test", test_dataset_id=test_dataset_id)
+
+            if checkpoint.reused_model and not checkpoint.reached("trained"):
+                store.advance(checkpoint, "trained")
+
+            if not checkpoint.reached("training_started"):
+                model_id = train_model(
+                    client=client,
+                    dataset_name=dataset_name,
+                    model_name=model_name,
+                    usecase=usecase,
+                    label_column=effective_label,
+                )
+                store.advance(checkpoint, "training_started", model_id=model_id)
+
+            if not checkpoint.reached("trained"):
+                try:
+                    wait_for_training(client, checkpoint.model_id)
+                except TrainingFailedError:
+                    # A FAILED model can't be waited on again; resuming retrains it.
+                    # Timeouts and polling errors keep the model id: it may still finish.
+                    store.advance(checkpoint, "uploaded_test", model_id="")
+                    raise
+                if register_model:
+                    _register_model(registry, registry_key, checkpoint, model_name=model_name, data_path=data_path)
+                store.advance(checkpoint, "trained")
+
+            inference_result = run_inference(
+                client=client,
+                model_id=checkpoint.model_id,
+                test_dataset_id=checkpoint.test_dataset_id,
+                usecase=usecase,
+            )
+
+            if output_file:
+                with open(output_file, "w", encoding="utf-8") as f:
+                    f.write(format_result(inference_result))
+
+            checkpoint.status = "complete"
+            store.advance(checkpoint, "complete")
+
+            return WoodwideRunResult(
+                usecase=usecase,
+                model_id=checkpoint.model_id,
+                train_dataset_id=checkpoint.train_dataset_id,
+                test_dataset_id=checkpoint.test_dataset_id,
+                label_column=effective_label,
+                inference_result=inference_result,
+                retrained=not checkpoint.reused_model,
+                drift_profile=DriftProfile.from_dict(checkpoint.drift_profile) if checkpoint.drift_profile else None,
+            )
+
+    except BaseException as e:
+        store.fail(checkpoint, e)
+        raise
     finally:
         if cleanup_temp_files:
             for p in (train_path, test_path):
@@ -295,6 +533,7 @@ def woodwide_run(
                         os.remove(p)
                     except OSError:
                         pass
+        tracer.export(jsonl_path=spans_file, prometheus_path=metrics_file)
 
 # Example usage for anomaly detection:
 # result = woodwide_run(
@@ -0,0 +1,291 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "numpy",
+#   "pandas",
+#   "woodwide",
+# ]
+# ///
+# backtest.py
+#
+# Rolling-origin backtests for the demand forecast. A random 80/20 split
+# lets the model see future months; here each fold trains on every month up
+# to t and is scored on month t+1 only, which is what month-ahead accuracy
+# actually means.
+#
+# The cleaned data is sorted by year_month once. Because the sort is by
+# time, every fold's train set is a prefix of that frame and its test set
+# the block right after it, so folds are plain positional slices of the one
+# frame. Folds train and infer concurrently.
+#
+# The sorted frame is held as an inventory_tables dimension/fact pair, so
+# the static per-NDC attributes are stored once instead of once per month;
+# each fold's rows are only flattened when its CSVs are written for upload.
+#
+#   python backtest.py -k $WOODWIDE_API_KEY --data-path inventory.csv --min-train-months 6
+
+from __future__ import annotations
+
+import argparse
+import contextvars
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from inventory_tables import NormalizedInventory, normalize_inventory
+from model_promotion import calculate_model_metrics_from_csv_response, inference_result_to_frame
+from script_loader import load_script
+from stage_timing import StageTracer, stage_span
+
+DEFAULT_BASE_URL = "https://beta.woodwide.ai/"
+DEFAULT_TIME_COLUMN = "year_month"
+
+
+@dataclass(frozen=True)
+class Fold:
+    index: int
+    train_end: int  # rows [0, train_end) of the sorted frame
+    test_start: int  # rows [test_start, test_end)
+    test_end: int
+    last_train_period: str
+    test_period: str
+
+
+@dataclass(frozen=True)
+class BacktestResult:
+    folds: list[Fold]
+    fold_metrics: pd.DataFrame  # one row per fold (failed folds carry an error)
+    summary: pd.DataFrame  # mean / std / min / max of each metric across folds
+
+
+# -------------------------
+# Fold generation
+# -------------------------
+
+def sort_by_period(df: pd.DataFrame, time_column: str = DEFAULT_TIME_COLUMN) -> pd.DataFrame:
+    if time_column not in df.columns:
+        raise ValueError(f"Time column '{time_column}' not found in dataset")
+    # Stable sort keeps the original row order within a month
+    return df.sort_values(time_column, kind="stable").reset_index(drop=True)
+
+
+def rolling_origin_folds(
+    sorted_df: pd.DataFrame | NormalizedInventory,
+    *,
+    time_column: str = DEFAULT_TIME_COLUMN,
+    min_train_periods: int = 6,
+    horizon: int = 1,
+    max_folds: Optional[int] = None,
+) -> list[Fold]:
+    """
+    Folds over a frame already sorted by `time_column`: train on periods up
+    to t, test on period t + horizon. With `max_folds`, keep the latest ones.
+    """
+    if isinstance(sorted_df, NormalizedInventory):
+        sorted_df = sorted_df.fact
+    periods = np.asarray(sorted_df[time_column].to_numpy())
+    unique_periods = pd.unique(periods)
+    # Row where each period starts / ends in the sorted frame
+    starts = np.searchsorted(periods, unique_periods, side="left")
+    ends = np.searchsorted(periods, unique_periods, side="right")
+
+    folds = []
+    for t in range(min_train_periods - 1, len(unique_periods) - horizon):
+        test = t + horizon
+        folds.append(Fold(
+            index=len(folds),
+            train_end=int(ends[t]),
+            test_start=int(starts[test]),
+            test_end=int(ends[test]),
+            last_train_period=str(unique_periods[t]),
+            test_period=str(unique_periods[test]),
+        ))
+    if not folds:
+        raise ValueError(
+            f"Need more than {min_train_periods + horizon - 1} distinct '{time_column}' values "
+            f"for a backtest; found {len(unique_periods)}"
+        )
+    if max_folds:
+        folds = folds[-max_folds:]
+    return folds
+
+
+# -------------------------
+# Running folds
+# -------------------------
+
+def run_backtest(
+    *,
+    api_key: str,
+    data_path: str,
+    dataset_name: str,
+    model_name: str,
+    label_column: Optional[str] = None,
+    time_column: str = DEFAULT_TIME_COLUMN,
+    base_url: str = DEFAULT_BASE_URL,
+    min_train_periods: int = 6,
+    horizon: int = 1,
+    max_folds: Optional[int] = None,
+    max_workers: int = 4,
+    run_id: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    spans_file: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+) -> BacktestResult:
+    """
+    Train one prediction model per fold (concurrently, via woodwide_run) and
+    score it on its test month with model_promotion's metrics.
+    """
+    pm = load_script("prediction-model.py")
+    label_column = label_column or pm.DEFAULT_LABEL_COLUMN
+    tracer = StageTracer(run_id=run_id)
+    work_dir = tempfile.mkdtemp(prefix=f"woodwide_backtest_{tracer.run_id}_")
+    print(f"Backtest run ID: {tracer.run_id}")
+
+    try:
+        with tracer.activate(), stage_span("backtest", model_name=model_name):
+            with stage_span("prepare", data_path=data_path):
+                sorted_df = sort_by_period(
+                    pm.load_and_clean_data(data_path=data_path, label_column=label_column),
+                    time_column,
+                )
+                flat_bytes = int(sorted_df.memory_usage(deep=True).sum())
+                inventory = normalize_inventory(sorted_df)
+                del sorted_df
+                print(
+                    f"Normalized {len(inventory)} rows / {len(inventory.dim)} NDCs: "
+                    f"{flat_bytes / 1e6:.2f} MB -> {inventory.memory_bytes() / 1e6:.2f} MB"
+                )
+                folds = rolling_origin_folds(
+                    inventory,
+                    time_column=time_column,
+                    min_train_periods=min_train_periods,
+                    horizon=horizon,
+                    max_folds=max_folds,
+                )
+            print(f"{len(folds)} folds: test months {folds[0].test_period} .. {folds[-1].test_period}")
+
+            def run_fold(fold: Fold) -> dict:
+                train_path = os.path.join(work_dir, f"fold{fold.index}_train.csv")
+                test_path = os.path.join(work_dir, f"fold{fold.index}_test.csv")
+                # The dataset API takes one flat table, so denormalize at the upload boundary
+                inventory.denormalize(slice(0, fold.train_end)).to_csv(train_path, index=False)
+                inventory.denormalize(slice(fold.test_start, fold.test_end)).to_csv(test_path, index=False)
+
+                tag = f"bt_{fold.test_period}".replace("-", "")
+                result = pm.woodwide_run(
+                    usecase="prediction",
+                    api_key=api_key,
+                    model_name=f"{model_name}__{tag}",
+                    dataset_name=f"{dataset_name}__{tag}",
+                    data_path=data_path,
+                    base_url=base_url,
+                    label_column=label_column,
+                    run_id=f"{tracer.run_id}-fold{fold.index}",
+                    spans_file=spans_file,
+                    work_dir=work_dir,
+                    checkpoint_dir=checkpoint_dir,
+                    cleanup_temp_files=False,  # the test split is needed for scoring
+                    prepared_splits=(train_path, test_path, label_column),
+                )
+                metrics = calculate_model_metrics_from_csv_response(
+                    usecase="prediction",
+                    inference_csv=inference_result_to_frame(result.inference_result),
+                    test_csv_path=test_path,
+                    label_column=label_column,
+                )
+                return {"model_id": result.model_id, "n_rows": metrics.n_rows, **metrics.metrics}
+
+            rows = []
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="woodwide-fold") as pool:
+                futures = [(fold, pool.submit(contextvars.copy_context().run, run_fold, fold)) for fold in folds]
+                for fold, future in futures:
+                    row = {
+                        "fold": fold.index,
+                        "train_through": fold.last_train_period,
+                        "test_period": fold.test_period,
+                        "train_rows": fold.train_end,
+                        "test_rows": fold.test_end - fold.test_start,
+                    }
+                    try:
+                        row.update(future.result())
+                    except Exception as e:
+                        row["error"] = f"{type(e).__name__}: {e}"
+                        print(f"Fold {fold.index} ({fold.test_period}) failed: {row['error']}")
+                    rows.append(row)
+
+            fold_metrics = pd.DataFrame(rows)
+            metric_cols = [
+                c for c in fold_metrics.columns
+                if c not in ("fold", "train_through", "test_period", "train_rows", "test_rows", "model_id", "n_rows", "error")
+            ]
+            summary = (
+                fold_metrics[metric_cols].agg(["mean", "std", "min", "max"]).T
+                if metric_cols else pd.DataFrame()
+            )
+            return BacktestResult(folds=folds, fold_metrics=fold_metrics, summary=summary)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        tracer.export(jsonl_path=spans_file, prometheus_path=metrics_file)
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the demand forecast model")
+    parser.add_argument("-k", "--api-key", help="Woodwide API Key (default: $WOODWIDE_API_KEY)")
+    parser.add_argument("--data-path", default="./mock_medicine_inventory_timeseries.csv")
+    parser.add_argument("--dataset-name", default="inventory_backtest")
+    parser.add_argument("--model-name", default="inventory_backtest")
+    parser.add_argument("--label-column", help="Target column (default: units_used_this_month)")
+    parser.add_argument("--time-column", default=DEFAULT_TIME_COLUMN)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--min-train-months", type=int, default=6, help="Months in the first fold's training set")
+    parser.add_argument("--horizon", type=int, default=1, help="Months ahead of the training cutoff to test on")
+    parser.add_argument("--max-folds", type=int, help="Only run the latest N folds")
+    parser.add_argument("--workers", type=int, default=4, help="Folds trained concurrently")
+    parser.add_argument("--output", help="Write per-fold metrics to this CSV")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    api_key = args.api_key or os.getenv("WOODWIDE_API_KEY")
+    if not api_key:
+        print("Error: API key is required (--api-key or WOODWIDE_API_KEY)")
+        sys.exit(1)
+
+    result = run_backtest(
+        api_key=api_key,
+        data_path=args.data_path,
+        dataset_name=args.dataset_name,
+        model_name=args.model_name,
+        label_column=args.label_column,
+        time_column=args.time_column,
+        base_url=args.base_url,
+        min_train_periods=args.min_train_months,
+        horizon=args.horizon,
+        max_folds=args.max_folds,
+        max_workers=args.workers,
+    )
+
+    print("\nPer-fold metrics:")
+    print(result.fold_metrics.to_string(index=False))
+    if not result.summary.empty:
+        print("\nAcross folds:")
+        print(result.summary.to_string())
+    if args.output:
+        result.fold_metrics.to_csv(args.output, index=False)
+        print(f"\nFold metrics written to {args.output}")
+
+    if "error" in result.fold_metrics.columns and result.fold_metrics["error"].notna().any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
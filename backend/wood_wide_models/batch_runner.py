@@ -0,0 +1,333 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "pandas",
+#   "pyyaml",
+#   "woodwide",
+# ]
+# ///
+# batch_runner.py
+#
+# Run many woodwide_run jobs from one manifest instead of a shell loop.
+# CPU-bound data preparation (CSV parsing, cleaning, splitting) runs in a
+# process pool; the I/O-bound remote stages (upload, train, wait, infer) run
+# in a bounded thread pool on the shared clients. A job's remote stages start
+# as soon as its own splits are ready.
+#
+#   python batch_runner.py nightly.yaml --max-concurrency 6 --prep-workers 4
+#
+# Manifest (YAML or JSON):
+#
+#   defaults:
+#     usecase: prediction
+#     label_column: units_used_this_month
+#   jobs:
+#     - name: mercy-prediction
+#       data_path: exports/mercy.csv
+#       dataset_name: mercy_inventory
+#       model_name: mercy_demand
+#     - usecase: anomaly
+#       data_path: exports/mercy.csv
+#       dataset_name: mercy_inventory_anomaly
+#       model_name: mercy_anomaly
+
+from __future__ import annotations
+
+import argparse
+import contextvars
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from script_loader import USECASE_SCRIPTS, load_runner, load_script
+from stage_timing import load_spans_jsonl
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_BASE_URL = "https://beta.woodwide.ai/"
+
+JOB_FIELDS = {
+    "name", "usecase", "data_path", "dataset_name", "model_name",
+    "label_column", "output_file", "base_url",
+}
+REQUIRED_FIELDS = ("usecase", "data_path", "dataset_name", "model_name")
+
+# Columns of the summary table, in pipeline order
+SUMMARY_STAGES = ("prepare", "upload", "train_request", "train_wait", "inference")
+
+
+@dataclass
+class BatchJob:
+    name: str
+    params: dict[str, Any]
+    status: str = "pending"  # pending | preparing | running | succeeded | failed
+    error: Optional[str] = None
+    model_id: Optional[str] = None
+    stage_s: dict[str, float] = field(default_factory=dict)
+    total_s: float = 0.0
+
+
+# -------------------------
+# Manifest
+# -------------------------
+
+def load_manifest(path: str) -> list[BatchJob]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ValueError("PyYAML is required for YAML manifests (pip install pyyaml)")
+        manifest = yaml.safe_load(text)
+    else:
+        manifest = json.loads(text)
+
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    defaults = manifest.get("defaults") or {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    jobs: list[BatchJob] = []
+    seen: set[str] = set()
+    for i, entry in enumerate(manifest.get("jobs") or []):
+        params = {**defaults, **entry}
+        unknown = set(params) - JOB_FIELDS
+        if unknown:
+            raise ValueError(f"Job {i}: unknown fields {sorted(unknown)}")
+        for required in REQUIRED_FIELDS:
+            if not params.get(required):
+                raise ValueError(f"Job {i}: '{required}' is required")
+        if params["usecase"] not in USECASE_SCRIPTS:
+            raise ValueError(f"Job {i}: unknown usecase '{params['usecase']}'. Expected one of: {sorted(USECASE_SCRIPTS)}")
+
+        # Paths in the manifest are relative to the manifest itself
+        for key in ("data_path", "output_file"):
+            if params.get(key) and not os.path.isabs(params[key]):
+                params[key] = os.path.join(base_dir, params[key])
+
+        name = params.pop("name", None) or f"{params['usecase']}-{params['dataset_name']}"
+        if name in seen:
+            raise ValueError(f"Duplicate job name '{name}'")
+        seen.add(name)
+        jobs.append(BatchJob(name=name, params=params))
+
+    if not jobs:
+        raise ValueError(f"No jobs in manifest {path}")
+    return jobs
+
+
+# -------------------------
+# Execution
+# -------------------------
+
+def _prepare_in_worker(usecase: str, data_path: str, label_column: Optional[str], work_dir: str) -> tuple[tuple[str, str, Optional[str]], float]:
+    """Process-pool entry point: write the job's splits into work_dir."""
+    script = load_script(USECASE_SCRIPTS[usecase])
+    kwargs = {"label_column": label_column} if label_column else {}
+    start = time.monotonic()
+    splits = script.fetch_and_prepare_data(
+        data_path=data_path,
+        train_out=os.path.join(work_dir, "pharmacy_train.csv"),
+        test_out=os.path.join(work_dir, "pharmacy_test.csv"),
+        **kwargs,
+    )
+    return splits, time.monotonic() - start
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        jobs: list[BatchJob],
+        *,
+        api_key: str,
+        max_concurrency: int = 4,
+        prep_workers: Optional[int] = None,
+        out_dir: str = "batch_runs",
+        checkpoint_dir: Optional[str] = None,
+    ) -> None:
+        self.jobs = jobs
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.prep_workers = prep_workers or min(len(jobs), os.cpu_count() or 1)
+        self.out_dir = out_dir
+        self.checkpoint_dir = checkpoint_dir
+
+    def run(self) -> list[BatchJob]:
+        os.makedirs(os.path.join(self.out_dir, "spans"), exist_ok=True)
+        work_root = tempfile.mkdtemp(prefix="woodwide_batch_")
+        # spawn, not fork: the parent already has client threads and sockets open
+        prep_pool = ProcessPoolExecutor(self.prep_workers, mp_context=multiprocessing.get_context("spawn"))
+        remote_pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="woodwide-batch")
+        try:
+            preps: dict[Future, tuple[BatchJob, str]] = {}
+            for job in self.jobs:
+                work_dir = os.path.join(work_root, _safe_name(job.name))
+                os.makedirs(work_dir)
+                job.status = "preparing"
+                prep = prep_pool.submit(
+                    _prepare_in_worker,
+                    job.params["usecase"],
+                    job.params["data_path"],
+                    job.params.get("label_column"),
+                    work_dir,
+                )
+                preps[prep] = (job, work_dir)
+
+            # Hand each job to the remote pool as soon as its own splits are ready
+            remote = [
+                remote_pool.submit(contextvars.copy_context().run, self._run_remote, *preps[prep], prep)
+                for prep in as_completed(preps)
+            ]
+            for f in remote:
+                f.result()
+        finally:
+            prep_pool.shutdown(wait=True, cancel_futures=True)
+            remote_pool.shutdown(wait=True)
+            shutil.rmtree(work_root, ignore_errors=True)
+        return self.jobs
+
+    def _run_remote(self, job: BatchJob, work_dir: str, prep: Future) -> None:
+        start = time.monotonic()
+        try:
+            splits, prep_s = prep.result()
+            job.stage_s["prepare"] = prep_s
+            job.status = "running"
+            print(f"[{job.name}] prepared in {prep_s:.2f}s; starting remote stages")
+
+            params = dict(job.params)
+            spans_file = os.path.join(self.out_dir, "spans", f"{_safe_name(job.name)}.jsonl")
+            if os.path.exists(spans_file):
+                os.remove(spans_file)
+            woodwide_run = load_runner(params["usecase"])
+            result = woodwide_run(
+                api_key=self.api_key,
+                base_url=params.pop("base_url", None) or DEFAULT_BASE_URL,
+                work_dir=work_dir,
+                checkpoint_dir=self.checkpoint_dir,
+                spans_file=spans_file,
+                prepared_splits=splits,
+                **params,
+            )
+            job.model_id = result.model_id
+            job.status = "succeeded"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            job.total_s = job.stage_s.get("prepare", 0.0) + (time.monotonic() - start)
+            self._collect_stage_times(job)
+            print(f"[{job.name}] {job.status} in {job.total_s:.2f}s")
+
+    def _collect_stage_times(self, job: BatchJob) -> None:
+        spans_file = os.path.join(self.out_dir, "spans", f"{_safe_name(job.name)}.jsonl")
+        if not os.path.exists(spans_file):
+            return
+        for span in load_spans_jsonl(spans_file):
+            # prepare ran in the process pool; its span only covers the hand-off
+            if span["name"] in SUMMARY_STAGES and span["name"] != "prepare":
+                job.stage_s[span["name"]] = job.stage_s.get(span["name"], 0.0) + span["duration_s"]
+
+
+# -------------------------
+# Reporting
+# -------------------------
+
+def summary_table(jobs: list[BatchJob]) -> str:
+    name_w = max(10, *(len(j.name) for j in jobs))
+    header = f"{'job':<{name_w}} {'status':<10}" + "".join(f" {s:>13}" for s in SUMMARY_STAGES) + f" {'total_s':>9}"
+    lines = [header, "-" * len(header)]
+    for job in jobs:
+        cells = "".join(
+            f" {job.stage_s[s]:>13.2f}" if s in job.stage_s else f" {'-':>13}" for s in SUMMARY_STAGES
+        )
+        lines.append(f"{job.name:<{name_w}} {job.status:<10}{cells} {job.total_s:>9.2f}")
+    failed = [j for j in jobs if j.status == "failed"]
+    lines.append("")
+    lines.append(f"{len(jobs) - len(failed)}/{len(jobs)} jobs succeeded")
+    for job in failed:
+        lines.append(f"  FAILED {job.name}: {job.error}")
+    return "\n".join(lines)
+
+
+def write_summary_json(path: str, jobs: list[BatchJob]) -> None:
+    payload = [
+        {
+            "name": j.name,
+            "usecase": j.params["usecase"],
+            "status": j.status,
+            "model_id": j.model_id,
+            "error": j.error,
+            "stage_s": j.stage_s,
+            "total_s": j.total_s,
+        }
+        for j in jobs
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Run woodwide_run jobs from a YAML/JSON manifest")
+    parser.add_argument("manifest", help="YAML or JSON manifest listing jobs")
+    parser.add_argument("-k", "--api-key", help="Woodwide API Key (default: $WOODWIDE_API_KEY)")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Jobs in their remote stages at once")
+    parser.add_argument("--prep-workers", type=int, help="Processes for data preparation (default: min(jobs, CPUs))")
+    parser.add_argument("--out-dir", default="batch_runs", help="Per-job span files and summary.json")
+    parser.add_argument("--checkpoint-dir", help="Checkpoint directory for the runs")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    api_key = args.api_key or os.getenv("WOODWIDE_API_KEY")
+    if not api_key:
+        print("Error: API key is required (--api-key or WOODWIDE_API_KEY)")
+        sys.exit(1)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Running {len(jobs)} jobs (max concurrency {args.max_concurrency})")
+    start = time.monotonic()
+    runner = BatchRunner(
+        jobs,
+        api_key=api_key,
+        max_concurrency=args.max_concurrency,
+        prep_workers=args.prep_workers,
+        out_dir=args.out_dir,
+        checkpoint_dir=args.checkpoint_dir,
+    )
+    runner.run()
+
+    print()
+    print(summary_table(jobs))
+    print(f"Wall time: {time.monotonic() - start:.2f}s")
+    summary_path = os.path.join(args.out_dir, "summary.json")
+    write_summary_json(summary_path, jobs)
+    print(f"Summary written to {summary_path}")
+
+    if any(j.status == "failed" for j in jobs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "numpy",
+#   "pandas",
+#   "woodwide",
+# ]
+# ///
+# benchmark_data_paths.py
+#
+# Wall time / peak RSS benchmarks for the local data paths of the pipeline:
+# data preparation, inference CSV parsing and metrics. Every case does work
+# proportional to the row count; calls whose cost doesn't grow with rows
+# have nothing to show at 10M rows and are left out. Each (case, size) runs
+# in a fresh interpreter so peak RSS is not polluted by earlier cases.
+# Results are appended to a JSON history file and compared against a stored
+# baseline.
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+DEFAULT_SIZES = "1k,100k,10M"
+DEFAULT_HISTORY_FILE = str(Path(__file__).parent / "benchmark_history.json")
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "woodwide_bench")
+DEFAULT_PREP_SCRIPT = "prediction-model.py"
+
+CASES = [
+    "fetch_and_prepare_data",
+    "parse_woodwide_inference_csv",
+    "regression_metrics",
+    "classification_metrics",
+]
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    case: str
+    rows: int
+    repeat: int
+    wall_s: float  # best of `repeat`
+    mean_wall_s: float
+    peak_rss_mb: float
+    setup_rss_mb: float  # peak RSS before the timed call (interpreter + inputs)
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale != 1 else text
+    return int(float(number) * scale)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# -------------------------
+# Input builders
+# -------------------------
+
+def ensure_inventory_csv(rows: int, data_dir: str, seed: int = 42) -> str:
+    """Generate (once) a synthetic inventory CSV with exactly `rows` rows."""
+    path = os.path.join(data_dir, f"inventory_{rows}_s{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    from synthetic_inventory import iter_synthetic_inventory
+
+    os.makedirs(data_dir, exist_ok=True)
+    n_months = 60
+    n_ndcs = -(-rows // n_months)
+    tmp_path = f"{path}.partial"
+    written = 0
+    for i, chunk in enumerate(
+        iter_synthetic_inventory(n_ndcs=n_ndcs, n_months=n_months, seed=seed)
+    ):
+        chunk = chunk.iloc[: rows - written]
+        chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        written += len(chunk)
+        if written >= rows:
+            break
+    os.replace(tmp_path, path)
+    return path
+
+
+def _build_case(case: str, rows: int, data_dir: str, prep_script: str) -> Callable[[], Any]:
+    """Build the inputs for a case and return the zero-arg callable to time."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+
+    if case == "fetch_and_prepare_data":
+        from script_loader import load_script
+
+        prep = load_script(prep_script)
+        data_path = ensure_inventory_csv(rows, data_dir)
+        out_dir = tempfile.mkdtemp(prefix="bench_prep_")
+
+        def run() -> Any:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return prep.fetch_and_prepare_data(
+                    data_path=data_path,
+                    train_out=os.path.join(out_dir, "train.csv"),
+                    test_out=os.path.join(out_dir, "test.csv"),
+                )
+
+        return run
+
+    from model_promotion import (
+        classification_metrics,
+        parse_woodwide_inference_csv,
+        regression_metrics,
+    )
+
+    if case == "parse_woodwide_inference_csv":
+        body = pd.DataFrame({"prediction": rng.normal(1900, 2000, rows)}).to_csv(index=False).encode()
+        return lambda: parse_woodwide_inference_csv(body)
+
+    if case == "regression_metrics":
+        y_true = pd.Series(rng.integers(0, 20_000, rows))
+        y_pred = pd.Series(y_true.to_numpy() + rng.normal(0, 300, rows))
+        return lambda: regression_metrics(y_true, y_pred)
+
+    if case == "classification_metrics":
+        labels = np.array(["stable", "increasing", "decreasing"])
+        y_true = pd.Series(labels[rng.integers(0, 3, rows)])
+        y_pred = pd.Series(np.where(rng.random(rows) < 0.8, y_true, labels[rng.integers(0, 3, rows)]))
+        return lambda: classification_metrics(y_true, y_pred)
+
+    raise ValueError(f"Unknown benchmark case '{case}'. Expected one of: {CASES}")
+
+
+def run_case_in_process(case: str, rows: int, *, repeat: int, data_dir: str, prep_script: str) -> BenchmarkResult:
+    fn = _build_case(case, rows, data_dir, prep_script)
+    setup_rss = _peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return BenchmarkResult(
+        case=case,
+        rows=rows,
+        repeat=repeat,
+        wall_s=min(timings),
+        mean_wall_s=sum(timings) / len(timings),
+        peak_rss_mb=_peak_rss_mb(),
+        setup_rss_mb=setup_rss,
+    )
+
+
+def run_case_subprocess(case: str, rows: int, *, repeat: int, data_dir: str, prep_script: str) -> BenchmarkResult:
+    cmd = [
+        sys.executable, os.path.abspath(__file__),
+        "--run-case", case,
+        "--sizes", str(rows),
+        "--repeat", str(repeat),
+        "--data-dir", data_dir,
+        "--prep-script", prep_script,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark case '{case}' ({rows} rows) failed:\n{proc.stderr}")
+    return BenchmarkResult(**json.loads(proc.stdout.strip().splitlines()[-1]))
+
+
+# -------------------------
+# History and regression check
+# -------------------------
+
+def load_history(history_file: str) -> dict[str, Any]:
+    if not os.path.exists(history_file):
+        return {"baseline": None, "runs": []}
+    with open(history_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history_file: str, history: dict[str, Any]) -> None:
+    tmp_path = f"{history_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, history_file)
+
+
+def find_regressions(
+    results: list[BenchmarkResult],
+    baseline: Optional[dict[str, Any]],
+    *,
+    max_time_regression: float,
+    max_rss_regression: float,
+) -> list[str]:
+    """Return human-readable descriptions of results that exceed the thresholds."""
+    if not baseline:
+        return []
+
+    base_by_key = {(r["case"], r["rows"]): r for r in baseline["results"]}
+    failures = []
+    for res in results:
+        base = base_by_key.get((res.case, res.rows))
+        if base is None:
+            continue
+        time_ratio = res.wall_s / base["wall_s"] if base["wall_s"] > 0 else 1.0
+        if time_ratio > 1 + max_time_regression:
+            failures.append(
+                f"{res.case}[{res.rows}]: wall {res.wall_s:.4f}s vs baseline "
+                f"{base['wall_s']:.4f}s (+{(time_ratio - 1) * 100:.1f}%)"
+            )
+        rss_ratio = res.peak_rss_mb / base["peak_rss_mb"] if base["peak_rss_mb"] > 0 else 1.0
+        if rss_ratio > 1 + max_rss_regression:
+            failures.append(
+                f"{res.case}[{res.rows}]: peak RSS {res.peak_rss_mb:.1f}MB vs baseline "
+                f"{base['peak_rss_mb']:.1f}MB (+{(rss_ratio - 1) * 100:.1f}%)"
+            )
+    return failures
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def format_results_table(results: list[BenchmarkResult]) -> str:
+    lines = [f"{'case':<30} {'rows':>12} {'best_s':>10} {'mean_s':>10} {'peak_rss_mb':>12}"]
+    for r in results:
+        lines.append(
+            f"{r.case:<30} {r.rows:>12} {r.wall_s:>10.4f} {r.mean_wall_s:>10.4f} {r.peak_rss_mb:>12.1f}"
+        )
+    return "\n".join(lines)
+
+
+# -------------------------
+# CLI
+# -------------------------
+
+def setup_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark wood_wide_models data paths across dataset sizes"
+    )
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Comma-separated row counts, k/M suffixes allowed (default: 1k,100k,10M)")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions per case (best is kept)")
+    parser.add_argument("--history-file", default=DEFAULT_HISTORY_FILE, help="JSON history file")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Cache directory for generated inputs")
+    parser.add_argument("--prep-script", default=DEFAULT_PREP_SCRIPT,
+                        help="Script whose fetch_and_prepare_data is benchmarked")
+    parser.add_argument("--max-time-regression", type=float, default=0.25,
+                        help="Allowed wall-time increase over baseline (0.25 = +25%%)")
+    parser.add_argument("--max-rss-regression", type=float, default=0.25,
+                        help="Allowed peak RSS increase over baseline (0.25 = +25%%)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    if args.run_case:
+        # Child mode: one case, one size, result as a JSON line on stdout
+        res = run_case_in_process(
+            args.run_case, sizes[0], repeat=args.repeat, data_dir=args.data_dir, prep_script=args.prep_script
+        )
+        print(json.dumps(asdict(res)))
+        return
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        print(f"Error: unknown cases {unknown}. Expected some of: {CASES}")
+        sys.exit(2)
+
+    results = []
+    for rows in sizes:
+        for case in cases:
+            print(f"Running {case} at {rows} rows...")
+            res = run_case_subprocess(
+                case, rows, repeat=args.repeat, data_dir=args.data_dir, prep_script=args.prep_script
+            )
+            print(f"  best {res.wall_s:.4f}s, peak RSS {res.peak_rss_mb:.1f}MB")
+            results.append(res)
+
+    print("")
+    print(format_results_table(results))
+
+    history = load_history(args.history_file)
+    failures = find_regressions(
+        results,
+        history.get("baseline"),
+        max_time_regression=args.max_time_regression,
+        max_rss_regression=args.max_rss_regression,
+    )
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [asdict(r) for r in results],
+    }
+    history["runs"].append(run)
+    if args.update_baseline or not history.get("baseline"):
+        history["baseline"] = run
+        print("\nStored this run as the baseline.")
+    save_history(args.history_file, history)
+    print(f"History written to {args.history_file}")
+
+    if failures and not args.update_baseline:
+        print("\nPerformance regressions detected:")
+        for f in failures:
+            print(f"  - {f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
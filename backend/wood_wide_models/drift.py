@@ -0,0 +1,363 @@
+# drift.py
+#
+# Drift check to gate retraining: compare a new data batch with the snapshot
+# the current model was trained on, and only retrain when distributions
+# actually moved.
+#
+# At registration time each feature of the training data is summarized once:
+#   - numeric: quantile bin edges + bin proportions, mean, std, null rate
+#   - categorical: frequency table (top categories + "__other__"), null rate
+# The profile is stored with the model's registry entry (model_registry.json),
+# so a check only has to bin the new batch. Per feature it reports PSI,
+# KS (on the stored bin edges), standardized mean shift and the change in
+# null rate.
+#
+# woodwide_run (prediction-model.py, anomaly-model.py) registers every model
+# it trains with a profile of its training split, and with drift_gate=True
+# skips training when the new split is stable against the current model.
+#
+#   python drift.py register --usecase prediction --model-id model_abc --data train.csv
+#   python drift.py check --usecase prediction --data new_batch.csv
+#       exit 0: stable, skip retraining; exit 3: drift, retrain
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: registrations are not serialized across processes
+    fcntl = None
+
+REGISTRY_FILE_ENV = "WOODWIDE_MODEL_REGISTRY"
+DEFAULT_REGISTRY_FILE = "model_registry.json"
+
+# Identifiers and time keys always differ between batches; they are not features
+DEFAULT_EXCLUDE = ("medicine_id_ndc", "year_month")
+OTHER_CATEGORY = "__other__"
+EPSILON = 1e-4  # floor for empty bins in PSI
+
+# Conventional PSI reading: < 0.1 stable, 0.1-0.25 moderate, > 0.25 significant
+DEFAULT_PSI_THRESHOLD = 0.25
+DEFAULT_KS_THRESHOLD = 0.2
+DEFAULT_MEAN_SHIFT_THRESHOLD = 0.5  # in training standard deviations
+DEFAULT_NULL_RATE_THRESHOLD = 0.05  # absolute change in the fraction of missing values
+
+EXIT_RETRAIN = 3
+
+
+@dataclass
+class FeatureProfile:
+    name: str
+    kind: str  # "numeric" | "categorical"
+    null_rate: float
+    edges: list[float] = field(default_factory=list)  # numeric: inner bin edges
+    proportions: list[float] = field(default_factory=list)  # numeric: len(edges) + 1 bins
+    mean: float = 0.0
+    std: float = 0.0
+    frequencies: dict[str, float] = field(default_factory=dict)  # categorical
+
+
+@dataclass
+class DriftProfile:
+    n_rows: int
+    created_at: float
+    features: dict[str, FeatureProfile]
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "DriftProfile":
+        return cls(
+            n_rows=data["n_rows"],
+            created_at=data["created_at"],
+            features={k: FeatureProfile(**v) for k, v in data["features"].items()},
+        )
+
+
+@dataclass(frozen=True)
+class DriftDecision:
+    retrain: bool
+    reason: str
+    drifted_features: list[str]
+    report: Optional[pd.DataFrame]
+
+
+# -------------------------
+# Profiling
+# -------------------------
+
+def _numeric_profile(name: str, values: pd.Series, bins: int) -> FeatureProfile:
+    x = values.to_numpy(dtype=float, na_value=np.nan)
+    present = x[~np.isnan(x)]
+    null_rate = 1.0 - len(present) / len(x) if len(x) else 0.0
+    if len(present) == 0:
+        return FeatureProfile(name=name, kind="numeric", null_rate=null_rate, proportions=[1.0])
+    edges = np.unique(np.quantile(present, np.linspace(0, 1, bins + 1))[1:-1])
+    counts = np.bincount(np.searchsorted(edges, present, side="right"), minlength=len(edges) + 1)
+    return FeatureProfile(
+        name=name,
+        kind="numeric",
+        null_rate=null_rate,
+        edges=edges.tolist(),
+        proportions=(counts / len(present)).tolist(),
+        mean=float(present.mean()),
+        std=float(present.std()),
+    )
+
+
+def _frequencies(values: pd.Series) -> pd.Series:
+    """Normalized value counts keyed by str. Counting first keeps the str cast to distinct values only."""
+    freq = values.value_counts(normalize=True, dropna=True)
+    freq.index = freq.index.astype(str)
+    return freq.groupby(level=0).sum().sort_values(ascending=False, kind="stable")
+
+
+def _categorical_profile(name: str, values: pd.Series, max_categories: int) -> FeatureProfile:
+    null_rate = float(values.isna().mean()) if len(values) else 0.0
+    freq = _frequencies(values)
+    top = freq.iloc[:max_categories]
+    frequencies = top.to_dict()
+    if len(freq) > max_categories:
+        frequencies[OTHER_CATEGORY] = float(freq.iloc[max_categories:].sum())
+    return FeatureProfile(name=name, kind="categorical", null_rate=null_rate, frequencies=frequencies)
+
+
+def build_profile(
+    df: pd.DataFrame,
+    *,
+    columns: Optional[Sequence[str]] = None,
+    exclude: Sequence[str] = DEFAULT_EXCLUDE,
+    bins: int = 20,
+    max_categories: int = 50,
+) -> DriftProfile:
+    """Summarize a training snapshot once; numeric columns get quantile bins."""
+    columns = [c for c in (columns or df.columns) if c not in exclude]
+    features = {}
+    for col in columns:
+        if pd.api.types.is_bool_dtype(df[col]) or not pd.api.types.is_numeric_dtype(df[col]):
+            features[col] = _categorical_profile(col, df[col], max_categories)
+        else:
+            features[col] = _numeric_profile(col, df[col], bins)
+    return DriftProfile(n_rows=len(df), created_at=time.time(), features=features)
+
+
+# -------------------------
+# Comparison
+# -------------------------
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    e = np.maximum(expected, EPSILON)
+    a = np.maximum(actual, EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def _compare_numeric(ref: FeatureProfile, values: pd.Series) -> dict[str, float]:
+    x = values.to_numpy(dtype=float, na_value=np.nan)
+    present = x[~np.isnan(x)]
+    null_rate = 1.0 - len(present) / len(x) if len(x) else 0.0
+    if len(present) == 0:
+        return {"psi": float("nan"), "ks": float("nan"), "mean_shift": float("nan"), "null_rate": null_rate}
+
+    edges = np.asarray(ref.edges)
+    expected = np.asarray(ref.proportions)
+    counts = np.bincount(np.searchsorted(edges, present, side="right"), minlength=len(expected))
+    actual = counts / len(present)
+    # KS evaluated at the stored edges: exact at those points, a lower bound overall
+    ks = float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual)))) if len(expected) > 1 else 0.0
+    mean_shift = (present.mean() - ref.mean) / ref.std if ref.std > 0 else (0.0 if present.mean() == ref.mean else float("inf"))
+    return {"psi": psi(expected, actual), "ks": ks, "mean_shift": float(mean_shift), "null_rate": null_rate}
+
+
+def _compare_categorical(ref: FeatureProfile, values: pd.Series) -> dict[str, float]:
+    null_rate = float(values.isna().mean()) if len(values) else 0.0
+    freq = _frequencies(values)
+    known = [c for c in ref.frequencies if c != OTHER_CATEGORY]
+    actual_known = freq.reindex(known, fill_value=0.0)
+    # Unseen and long-tail categories share the "__other__" bucket
+    expected = np.append([ref.frequencies[c] for c in known], ref.frequencies.get(OTHER_CATEGORY, 0.0))
+    actual = np.append(actual_known.to_numpy(), max(0.0, 1.0 - float(actual_known.sum())))
+    unseen = int((~freq.index.isin(known)).sum()) if OTHER_CATEGORY not in ref.frequencies else 0
+    return {"psi": psi(expected, actual), "ks": float("nan"), "mean_shift": float("nan"), "null_rate": null_rate, "new_categories": float(unseen)}
+
+
+def compare_to_profile(profile: DriftProfile, df: pd.DataFrame) -> pd.DataFrame:
+    """One row per profiled feature: psi, ks, mean_shift, null rates and their shift."""
+    rows = []
+    for name, ref in profile.features.items():
+        if name not in df.columns:
+            rows.append({"feature": name, "kind": ref.kind, "missing": True})
+            continue
+        stats = _compare_numeric(ref, df[name]) if ref.kind == "numeric" else _compare_categorical(ref, df[name])
+        rows.append({
+            "feature": name,
+            "kind": ref.kind,
+            "missing": False,
+            "ref_null_rate": ref.null_rate,
+            **stats,
+            "null_rate_shift": stats["null_rate"] - ref.null_rate,
+        })
+    return pd.DataFrame(rows)
+
+
+def drift_decision(
+    report: pd.DataFrame,
+    *,
+    psi_threshold: float = DEFAULT_PSI_THRESHOLD,
+    ks_threshold: float = DEFAULT_KS_THRESHOLD,
+    mean_shift_threshold: float = DEFAULT_MEAN_SHIFT_THRESHOLD,
+    null_rate_threshold: float = DEFAULT_NULL_RATE_THRESHOLD,
+) -> DriftDecision:
+    drifted_mask = (
+        report["missing"].astype(bool)
+        | (report.get("psi", pd.Series(dtype=float)) >= psi_threshold)
+        | (report.get("ks", pd.Series(dtype=float)) >= ks_threshold)
+        | (report.get("mean_shift", pd.Series(dtype=float)).abs() >= mean_shift_threshold)
+        | (report.get("null_rate_shift", pd.Series(dtype=float)).abs() >= null_rate_threshold)
+    ).fillna(False)
+    report = report.assign(drifted=drifted_mask)
+    drifted = report.loc[drifted_mask, "feature"].tolist()
+    if drifted:
+        reason = f"{len(drifted)} feature(s) drifted: {', '.join(drifted)}"
+    else:
+        reason = (
+            f"All {len(report)} features stable "
+            f"(max PSI {report['psi'].max():.3f}, max KS {report['ks'].max():.3f}, "
+            f"max null-rate shift {report['null_rate_shift'].abs().max():.3f})"
+        )
+    return DriftDecision(retrain=bool(drifted), reason=reason, drifted_features=drifted, report=report)
+
+
+# -------------------------
+# Registry
+# -------------------------
+
+class ModelRegistry:
+    """
+    Current model per usecase, persisted as JSON. Each entry carries the
+    drift profile of the data that model was trained on.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.getenv(REGISTRY_FILE_ENV) or DEFAULT_REGISTRY_FILE
+
+    def _load(self) -> dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, usecase: str) -> Optional[dict[str, Any]]:
+        return self._load().get(usecase)
+
+    def register(self, usecase: str, *, model_id: str, profile: DriftProfile, **metadata: Any) -> None:
+        # Segment runs register concurrently: the read-modify-write holds an
+        # flock on a sidecar file, and the registry itself is replaced atomically
+        directory = os.path.dirname(self.path) or "."
+        lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            entries = self._load()
+            entries[usecase] = {
+                "model_id": model_id,
+                "registered_at": time.time(),
+                **metadata,
+                "drift_profile": profile.to_dict(),
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        finally:
+            os.close(lock_fd)  # releases the flock
+
+    def profile(self, usecase: str) -> Optional[DriftProfile]:
+        entry = self.get(usecase)
+        if not entry or "drift_profile" not in entry:
+            return None
+        return DriftProfile.from_dict(entry["drift_profile"])
+
+
+def should_retrain(
+    usecase: str,
+    new_df: pd.DataFrame,
+    *,
+    registry: Optional[ModelRegistry] = None,
+    **thresholds: float,
+) -> DriftDecision:
+    """Retrain when there is no registered model yet or the new batch drifted."""
+    profile = (registry or ModelRegistry()).profile(usecase)
+    if profile is None:
+        return DriftDecision(retrain=True, reason=f"No registered {usecase} model", drifted_features=[], report=None)
+    return drift_decision(compare_to_profile(profile, new_df), **thresholds)
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Drift check between a model's training snapshot and new data")
+    parser.add_argument("--registry", help=f"Registry JSON (default: ${REGISTRY_FILE_ENV} or {DEFAULT_REGISTRY_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    reg = sub.add_parser("register", help="Record a trained model and profile its training data")
+    reg.add_argument("--usecase", required=True)
+    reg.add_argument("--model-id", required=True)
+    reg.add_argument("--data", required=True, help="CSV the model was trained on")
+    reg.add_argument("--bins", type=int, default=20)
+
+    chk = sub.add_parser("check", help=f"Compare new data to the registered snapshot (exit {EXIT_RETRAIN} = retrain)")
+    chk.add_argument("--usecase", required=True)
+    chk.add_argument("--data", required=True, help="New batch CSV")
+    chk.add_argument("--psi", type=float, default=DEFAULT_PSI_THRESHOLD)
+    chk.add_argument("--ks", type=float, default=DEFAULT_KS_THRESHOLD)
+    chk.add_argument("--mean-shift", type=float, default=DEFAULT_MEAN_SHIFT_THRESHOLD)
+    chk.add_argument("--null-rate", type=float, default=DEFAULT_NULL_RATE_THRESHOLD,
+                     help="Absolute change in a feature's null rate that counts as drift")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    registry = ModelRegistry(args.registry)
+
+    if args.command == "register":
+        profile = build_profile(pd.read_csv(args.data), bins=args.bins)
+        registry.register(args.usecase, model_id=args.model_id, profile=profile, data_path=args.data)
+        print(f"Registered {args.usecase} model {args.model_id} ({len(profile.features)} features profiled)")
+        return
+
+    decision = should_retrain(
+        args.usecase,
+        pd.read_csv(args.data),
+        registry=registry,
+        psi_threshold=args.psi,
+        ks_threshold=args.ks,
+        mean_shift_threshold=args.mean_shift,
+        null_rate_threshold=args.null_rate,
+    )
+    if decision.report is not None:
+        cols = [c for c in ("feature", "kind", "psi", "ks", "mean_shift", "null_rate_shift", "drifted") if c in decision.report.columns]
+        print(decision.report[cols].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"\n{'RETRAIN' if decision.retrain else 'SKIP'}: {decision.reason}")
+    sys.exit(EXIT_RETRAIN if decision.retrain else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "pandas",
+#   "requests",
+# ]
+# ///
+# export_standin_check.py
+#
+# Check of the partitioned export in supabase_export_import.py against a
+# local stand-in for the export_table_csv Edge Function (stdlib HTTP server
+# serving a synthetic table, honouring {"range": {"column", "gte", "lt"}}):
+#
+#   in_order   later partitions are answered first; the concatenated file
+#              must still equal a single unpartitioned export byte for byte
+#   resume     one partition fails with 503; the run raises listing it and
+#              keeps the finished parts; the re-run fetches only that
+#              partition and produces the same file
+#
+#   python export_standin_check.py
+#
+# Exits non-zero on the first failed check.
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import supabase_export_import as export
+from supabase_export_import import ExportPartition, int_range_partitions
+
+TABLE = "inventory"
+
+
+def _make_rows(n_rows: int) -> list[list[Any]]:
+    return [[i, f"2024-{i % 12 + 1:02d}", f"00000-{i % 97:04d}-01", (i * 37) % 500] for i in range(1, n_rows + 1)]
+
+
+class _ExportState:
+    def __init__(self, rows: list[list[Any]], *, invert_delay_s: float = 0.0) -> None:
+        self.columns = ["id", "year_month", "medicine_id_ndc", "monthly_usage_units"]
+        self.rows = rows
+        self.invert_delay_s = invert_delay_s  # lower ranges answer later, so parts finish out of order
+        self.fail_once: set[str] = set()  # json range payloads answered 503 once
+        self.requests: Counter = Counter()
+        self.lock = threading.Lock()
+
+
+class _ExportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_ExportServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        state = self.server.state
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        rng = body.get("range")
+        key = json.dumps(rng, sort_keys=True)
+        with state.lock:
+            state.requests[key] += 1
+            fail = key in state.fail_once
+            state.fail_once.discard(key)
+        if fail:
+            self._send(503, b"Injected failure", "text/plain")
+            return
+
+        rows = state.rows
+        if rng:
+            col = state.columns.index(rng["column"])
+            rows = [r for r in rows if ("gte" not in rng or r[col] >= rng["gte"]) and ("lt" not in rng or r[col] < rng["lt"])]
+            if state.invert_delay_s and "gte" in rng:
+                time.sleep(max(0.0, state.invert_delay_s * (1 - rng["gte"] / len(state.rows))))
+            elif state.invert_delay_s:
+                time.sleep(state.invert_delay_s)
+        out = io.StringIO()
+        if rows:
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(state.columns)
+            writer.writerows(rows)
+        self._send(200, out.getvalue().encode(), "text/csv")
+
+    def _send(self, status: int, data: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _ExportServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state: _ExportState) -> None:
+        super().__init__(("127.0.0.1", 0), _ExportHandler)
+        self.state = state
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/export_table_csv"
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Check partitioned Supabase export against a local stand-in")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--fail-partition", type=int, default=3, help="Partition index answered 503 once")
+    return parser.parse_args()
+
+
+def _check(condition: bool, message: str) -> None:
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _plan(n_rows: int, n_partitions: int) -> list[ExportPartition]:
+    # Upper bound past the last id, so the last range is partly empty
+    return int_range_partitions("id", 1, n_rows + n_rows // n_partitions, n_partitions)
+
+
+def check_in_order(tmp: str, n_rows: int, n_partitions: int) -> None:
+    print(f"in_order: {n_partitions} partitions, later ranges answered first")
+    server = _ExportServer(_ExportState(_make_rows(n_rows), invert_delay_s=0.3))
+    export.FUNCTION_URL = server.url
+    try:
+        full_path = os.path.join(tmp, "full.csv")
+        export.export_table_to_csv(TABLE, full_path)
+        dest = os.path.join(tmp, "in_order.csv")
+        export.export_table_partitioned(TABLE, dest, _plan(n_rows, n_partitions), max_workers=n_partitions)
+    finally:
+        server.stop()
+
+    data = _read(dest)
+    ids = [int(line.split(b",", 1)[0]) for line in data.splitlines()[1:]]
+    _check(data == _read(full_path), f"partitioned file equals the unpartitioned export ({len(data)} bytes)")
+    _check(ids == list(range(1, n_rows + 1)), f"{len(ids)} rows in key order, header once")
+    _check(not os.path.exists(export._parts_dir(dest)), "part files removed after concatenation")
+
+
+def check_resume(tmp: str, n_rows: int, n_partitions: int, fail_index: int) -> None:
+    print(f"resume: partition {fail_index} of {n_partitions} fails once")
+    partitions = _plan(n_rows, n_partitions)
+    failing = partitions[fail_index]
+    state = _ExportState(_make_rows(n_rows))
+    state.fail_once.add(json.dumps(failing.payload(TABLE)["range"], sort_keys=True))
+    server = _ExportServer(state)
+    export.FUNCTION_URL = server.url
+    dest = os.path.join(tmp, "resume.csv")
+    parts_dir = export._parts_dir(dest)
+    try:
+        full_path = os.path.join(tmp, "full_resume.csv")
+        export.export_table_to_csv(TABLE, full_path)
+        try:
+            export.export_table_partitioned(TABLE, dest, partitions, max_workers=4)
+            raised = None
+        except RuntimeError as e:
+            raised = str(e)
+        _check(raised is not None and f"[{fail_index}]" in raised, f"first run raised listing partition {fail_index}")
+        kept = sorted(f for f in os.listdir(parts_dir) if f.startswith("part") and f.endswith(".csv"))
+        _check(
+            len(kept) == n_partitions - 1 and os.path.basename(export._part_path(parts_dir, failing)) not in kept,
+            f"{len(kept)} finished parts kept, failed part absent",
+        )
+        _check(not os.path.exists(dest), "no output file after a failed run")
+
+        before = sum(state.requests.values())
+        export.export_table_partitioned(TABLE, dest, partitions, max_workers=4)
+        refetched = sum(state.requests.values()) - before
+    finally:
+        server.stop()
+
+    _check(refetched == 1, f"re-run fetched {refetched} partition(s)")
+    _check(_read(dest) == _read(full_path), "resumed file equals the unpartitioned export")
+
+
+def main():
+    args = setup_args()
+    if not 0 <= args.fail_partition < args.partitions:
+        raise SystemExit("--fail-partition must be a partition index")
+    with tempfile.TemporaryDirectory() as tmp:
+        check_in_order(tmp, args.rows, args.partitions)
+        check_resume(tmp, args.rows, args.partitions, args.fail_partition)
+    print("\nAll export checks passed")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+# inventory_schema.py
+#
+# Column names of the monthly inventory timeseries
+# (mock_medicine_inventory_timeseries.csv), shared by the data generator
+# (synthetic_inventory.py) and the dimension/fact split (inventory_tables.py).
+
+NDC_COLUMN = "medicine_id_ndc"
+MONTH_COLUMN = "year_month"
+
+# Attributes that never change for a given NDC
+STATIC_COLUMNS = [
+    "generic_medicine_name",
+    "brand_name",
+    "manufacturer_name",
+    "dosage_amount",
+    "dosage_unit",
+    "medication_form",
+    "order_unit_description",
+    "units_per_order_unit",
+    "is_order_unit_openable",
+    "price_per_unit_usd",
+    "usage_variability_flag",
+    "available_suppliers",
+    "historically_stocked",
+]
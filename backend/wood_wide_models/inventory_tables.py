@@ -0,0 +1,141 @@
+# inventory_tables.py
+#
+# Dimension/fact split of the monthly inventory timeseries. Thirteen of the
+# 23 columns (names, manufacturer, dosage, form, order unit, price, ...) are
+# static per NDC but repeat on every monthly row. normalize_inventory() moves
+# them into a per-NDC dimension table keyed by a dense int32 `ndc_key` and
+# keeps a narrow fact table of the per-month columns:
+#
+#   dim:  ndc_key -> medicine_id_ndc, generic_medicine_name, ..., historically_stocked
+#   fact: ndc_key, year_month, beginning_inventory_units, ..., currently_backordered
+#
+# Work that only needs a few rows (train/test splits, partition segments,
+# backtest folds, forecast rows) stays in this form as row positions into the
+# fact table, and denormalize() rebuilds flat rows for just those rows where
+# a flat table is required. The WoodWide dataset API takes one flat CSV and
+# has no joins, so uploads are denormalized right before writing.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from inventory_schema import NDC_COLUMN, STATIC_COLUMNS
+
+KEY_COLUMN = "ndc_key"
+
+
+@dataclass(frozen=True)
+class NormalizedInventory:
+    dim: pd.DataFrame  # one row per NDC; row position == ndc_key
+    fact: pd.DataFrame  # ndc_key + per-month columns
+    columns: list[str]  # original column order
+    dtypes: dict[str, str]  # original dtypes, restored by denormalize()
+
+    def __len__(self) -> int:
+        return len(self.fact)
+
+    def memory_bytes(self) -> int:
+        return int(self.dim.memory_usage(deep=True).sum() + self.fact.memory_usage(deep=True).sum())
+
+    def take(self, rows: slice | np.ndarray) -> "NormalizedInventory":
+        """Subset of fact rows (positional); the dimension table is shared."""
+        return NormalizedInventory(self.dim, self.fact.iloc[rows], self.columns, self.dtypes)
+
+    def column(self, name: str) -> pd.Series:
+        """One column aligned with the fact rows, without rebuilding the rest."""
+        if name in self.fact.columns:
+            return self.fact[name]
+        if name not in self.dim.columns:
+            raise KeyError(name)
+        values = self.dim[name].iloc[self.fact[KEY_COLUMN].to_numpy()]
+        return values.set_axis(self.fact.index)
+
+    def denormalize(self, rows: Optional[slice | np.ndarray] = None) -> pd.DataFrame:
+        """Flat frame in the original column order and dtypes, for `rows` only if given."""
+        fact = self.fact if rows is None else self.fact.iloc[rows]
+        keys = fact[KEY_COLUMN].to_numpy()
+        dim_rows = self.dim.iloc[keys].reset_index(drop=True)
+        flat = pd.concat([dim_rows, fact.drop(columns=[KEY_COLUMN]).reset_index(drop=True)], axis=1)
+        flat = flat[self.columns]
+        restore = {c: t for c, t in self.dtypes.items() if str(flat[c].dtype) != t}
+        return flat.astype(restore) if restore else flat
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Low-cardinality strings -> category, integers -> smallest safe int type."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s):
+            out[col] = s
+        elif pd.api.types.is_integer_dtype(s):
+            out[col] = pd.to_numeric(s, downcast="integer")
+        elif not pd.api.types.is_numeric_dtype(s) and s.nunique(dropna=False) <= max(1, len(s) // 2):
+            out[col] = s.astype("category")
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def normalize_inventory(
+    df: pd.DataFrame,
+    *,
+    id_column: str = NDC_COLUMN,
+    static_columns: Sequence[str] = STATIC_COLUMNS,
+) -> NormalizedInventory:
+    """
+    Split a flat inventory frame into dimension + fact tables. A listed
+    static column that actually varies within some NDC stays in the fact
+    table, so the round trip is always lossless.
+    """
+    if id_column not in df.columns:
+        raise ValueError(f"Column '{id_column}' not found in dataset")
+
+    codes, _ = pd.factorize(df[id_column])
+    if (codes < 0).any():
+        raise ValueError(f"Column '{id_column}' has missing values")
+    # First row of each NDC supplies its dimension values
+    _, first_rows = np.unique(codes, return_index=True)
+
+    static = []
+    for col in static_columns:
+        if col not in df.columns:
+            continue
+        values = df[col].to_numpy()
+        per_ndc = values[first_rows][codes]
+        differs = per_ndc != values
+        # NaN != NaN, so only the mismatching rows need a missing-value check
+        if not differs.any() or (pd.isna(per_ndc[differs]) & pd.isna(values[differs])).all():
+            static.append(col)
+
+    dim = _compact(df.iloc[first_rows][[id_column, *static]].reset_index(drop=True))
+    fact = _compact(df.drop(columns=[id_column, *static]).reset_index(drop=True))
+    fact.insert(0, KEY_COLUMN, codes.astype(np.int32))
+    return NormalizedInventory(
+        dim=dim,
+        fact=fact,
+        columns=list(df.columns),
+        dtypes={c: str(t) for c, t in df.dtypes.items()},
+    )
+
+
+def sample_split(n_rows: int, *, train_frac: float, random_state: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Train/test row positions: the same rows, in the same order, as
+    df.sample(frac=train_frac, random_state=random_state) and the df.drop()
+    of those, but usable on a NormalizedInventory.
+    """
+    train_rows = pd.Series(np.arange(n_rows)).sample(frac=train_frac, random_state=random_state).to_numpy()
+    test_rows = np.setdiff1d(np.arange(n_rows), train_rows)  # sorted, i.e. original order
+    return train_rows, test_rows
+
+
+def flat_rows(table: NormalizedInventory | pd.DataFrame, rows: slice | np.ndarray) -> pd.DataFrame:
+    """Flat frame of `rows` (positional), whether `table` is normalized or already flat."""
+    if isinstance(table, NormalizedInventory):
+        return table.denormalize(rows)
+    return table.iloc[rows]
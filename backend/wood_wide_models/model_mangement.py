@@ -1,9 +1,11 @@
 # model_management.py
 
+import os
 
 from woodwide import WoodWide
 from model_train_and_inference import *
 from model_promotion import *
+from drift import ModelRegistry
 
 # train new model on trigger and decide whether to promote and save the inference or not
 
@@ -11,9 +13,38 @@ CURRENT_PREDICTION_MODEL = None
 CURRENT_CLUSTERING_MODEL = None
 CURRENT_ANOMALY_MODEL = None
 
+# The CURRENT_* results above only live as long as the process; the drift
+# registry (model_registry.json) keeps the promoted model id per usecase,
+# with the profile its next trigger is checked against
+MODEL_REGISTRY = ModelRegistry()
+
 DEFAULT_BASE_URL = "https://beta.woodwide.ai/"
 
 
+def current_model_id(usecase: str) -> Optional[str]:
+    entry = MODEL_REGISTRY.get(usecase)
+    return entry["model_id"] if entry else None
+
+
+def promote_model(usecase: str, result, data_path: str) -> None:
+    """Make `result` the current model, in memory and in the drift registry."""
+    global CURRENT_PREDICTION_MODEL, CURRENT_CLUSTERING_MODEL, CURRENT_ANOMALY_MODEL
+    if usecase == "prediction":
+        CURRENT_PREDICTION_MODEL = result
+    elif usecase == "clustering":
+        CURRENT_CLUSTERING_MODEL = result
+    elif usecase == "anomaly_detection":
+        CURRENT_ANOMALY_MODEL = result
+    if result.drift_profile is not None:
+        MODEL_REGISTRY.register(
+            usecase,
+            model_id=result.model_id,
+            profile=result.drift_profile,
+            train_dataset_id=result.train_dataset_id,
+            data_path=os.path.abspath(data_path),
+        )
+
+
 # ------------------------------------------------------------
 def woodwide_oneshot(
     client: WoodWide,
@@ -31,7 +62,9 @@ def woodwide_oneshot(
     # train and infer via model_train_and_inference.woodwide_run()
     print("Starting WoodWide oneshot run...")
 
-    # train and inference on new model
+    # train and inference on new model; skipped (current model reused) when
+    # the data has not drifted from the current model's training snapshot.
+    # Registration happens below, only when the new model is promoted.
 
     new_model_result = woodwide_run(
         usecase=usecase,
@@ -44,8 +77,16 @@ def woodwide_oneshot(
         test_csv_path="pharmacy_test.csv",
         #output_file=output_file,
         cleanup_temp_files=cleanup_temp_files,
+        drift_gate=True,
+        register_model=False,
+        registry_file=MODEL_REGISTRY.path,
+        registry_key=usecase,
     )
 
+    if not new_model_result.retrained:
+        print(f"No drift since model {current_model_id(usecase)} was trained; keeping it.")
+        return
+
     # compare the new model with the old one if it exists
     if usecase == "prediction" and CURRENT_PREDICTION_MODEL is not None:
         
@@ -84,6 +125,7 @@ def woodwide_oneshot(
     else:
         with open(output_file, "w", encoding="utf-8") as f:
                 f.write(format_result(new_model_result.inference_result))
+        promote_model(usecase, new_model_result, data_path)
         print("No existing model to compare against. New model inference results saved.")
         return
     
@@ -172,11 +214,11 @@ def woodwide_oneshot(
             f"Improvement(a-b)={improvement:.6g} vs threshold={float(min_improvement):.6g}."
         )
 
-    if Recommendation == "upgrade_to_model_b":
+    if rec == "upgrade_to_model_b":
         with open(output_file, "w", encoding="utf-8") as f:
             f.write(format_result(new_model_result.inference_result))
         print("New model outperforms the existing model. Inference results saved to output file.")
-        CURRENT_PREDICTION_MODEL = new_model_result
+        promote_model(usecase, new_model_result, data_path)
 
 if "__main__" == __name__:
 
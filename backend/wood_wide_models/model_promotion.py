@@ -57,6 +57,30 @@ def parse_woodwide_inference_csv(inference_csv: Any) -> pd.DataFrame:
     )
 
 
+def inference_result_to_frame(result: Any) -> pd.DataFrame:
+    """
+    Row-aligned frame from an infer response. JSON responses map each output
+    to {row_position: value} (e.g. {"prediction": {"0": 12.5, ...}}); each
+    becomes a column ordered by row position. CSV text/bytes/DataFrames are
+    parsed as-is.
+    """
+    if hasattr(result, "model_dump"):
+        result = result.model_dump()
+    if isinstance(result, dict):
+        columns = {}
+        for key, values in result.items():
+            if isinstance(values, dict):
+                col = pd.Series(values)
+                col.index = col.index.astype(int)
+                columns[key] = col.sort_index()
+            elif isinstance(values, list):
+                columns[key] = pd.Series(values)
+        if not columns:
+            raise ValueError(f"No row-level outputs in inference result keys: {list(result)}")
+        return pd.DataFrame(columns)
+    return parse_woodwide_inference_csv(result)
+
+
 # -------------------------
 # Dynamic prediction column selection
 # -------------------------
@@ -9,17 +9,48 @@
 
 from __future__ import annotations
 
+import contextvars
 import json
 import os
+import re
+import shutil
 import time
-from dataclasses import dataclass
-from typing import Any, Literal, Optional
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Literal, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 from woodwide import WoodWide
 
+from drift import DriftProfile, ModelRegistry, build_profile, should_retrain
+from inventory_tables import KEY_COLUMN, NormalizedInventory, flat_rows, normalize_inventory, sample_split
+from model_promotion import infer_task_type, inference_result_to_frame, regression_metrics
+from retry_policy import as_utc, call_with_retry, raise_for_transient_status
+from run_checkpoint import CheckpointStore, RunCheckpoint
+from singleflight import flight
+from stage_timing import StageTracer, current_span, stage_span
+from woodwide_pool import get_client, read_source_csv
+
 DEFAULT_BASE_URL = "https://beta.woodwide.ai/"
 DEFAULT_LABEL_COLUMN = "units_used_this_month"
+DEFAULT_ID_COLUMN = "medicine_id_ndc"
+DEFAULT_TIME_COLUMN = "year_month"
+DEFAULT_HORIZONS = (1, 3, 6)
+
+# Forecast rows (build_forecast_frame) must not carry the latest month's own
+# usage figures into future months: the ledger (ending = beginning +
+# received - used), the daily rate (used / days) and the trend (used vs. the
+# month before) all encode that month's label. They are re-derived from the
+# NDC's observed history instead. Static NDC attributes and the latest
+# currently_backordered status are carried forward as they are.
+# (opening, closing): a future month opens with the last closing stock and
+# closes at opening + mean received - mean used
+FORECAST_STOCK_COLUMNS = ("beginning_inventory_units", "ending_inventory_units")
+FORECAST_HISTORY_MEANS = ("units_received_this_month", "restock_events_count", "average_daily_usage_units")
+FORECAST_HISTORY_MODES = ("monthly_usage_trend",)
 
 #sUseCase = Literal["prediction", "clustering"]
 
@@ -32,35 +63,64 @@ class WoodwideRunResult:
     test_dataset_id: str
     label_column: Optional[str]
     inference_result: Any
+    forecast: Optional[pd.DataFrame] = None  # NDC x horizon, when forecast_horizons was given
+    retrained: bool = True  # False: the drift gate kept the registered model
+    drift_profile: Optional[DriftProfile] = None  # of the training split, for registering the model later
+
+
+@dataclass(frozen=True)
+class PartitionedRunResult:
+    usecase: str
+    partition_by: str
+    segments: dict[str, WoodwideRunResult]  # segment -> its own run
+    failed: dict[str, str] = field(default_factory=dict)  # segment -> error
+    predictions: Optional[pd.DataFrame] = None  # test rows + model outputs + segment/model_id
+    metrics: Optional[pd.DataFrame] = None  # one row per segment plus "ALL"
+    forecast: Optional[pd.DataFrame] = None  # NDC x horizon + segment, when forecast_horizons was given
 
 
 # -------------------------
 # Data preparation
 # -------------------------
 
-def fetch_and_prepare_data(
-    *,
-    data_path: str,
-    label_column: str = DEFAULT_LABEL_COLUMN,
-    train_out: str = "pharmacy_train.csv",
-    test_out: str = "pharmacy_test.csv",
-    train_frac: float = 0.8,
-    random_state: int = 42,
-) -> tuple[str, str, Optional[str]]:
-    print(f"Loading dataset from: {data_path}")
-    # Read CSV with proper quoting and error handling to handle malformed rows
-    df = pd.read_csv(
-        data_path,
-        on_bad_lines="skip",  # Skip rows with too many/too few fields
-        engine="python",  # Use Python engine for better handling of complex CSVs
-    )
-    
+def _strip_whitespace(df: pd.DataFrame) -> pd.DataFrame:
     # Strip whitespace from column names
     df.columns = df.columns.str.strip()
     
     # Strip whitespace from all string columns
     for col in df.select_dtypes(include=['object']).columns:
         df[col] = df[col].str.strip()
+    return df
+
+
+def load_and_clean_data(
+    *,
+    data_path: Optional[str] = None,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+    frames: Optional[Iterable[pd.DataFrame]] = None,
+) -> pd.DataFrame:
+    """
+    Read `data_path`, or consume `frames` (DataFrame chunks, e.g. from
+    supabase_export_import.iter_table_frames) without a CSV on disk; each
+    chunk is whitespace-stripped as it arrives. Then clean as one frame.
+    """
+    if (data_path is None) == (frames is None):
+        raise ValueError("Pass exactly one of data_path or frames")
+
+    if frames is not None:
+        print("Loading dataset from streamed chunks")
+        chunks = [_strip_whitespace(chunk) for chunk in frames]
+        if not chunks:
+            raise ValueError("No data received from the streamed source")
+        df = pd.concat(chunks, ignore_index=True)
+    else:
+        print(f"Loading dataset from: {data_path}")
+        # Read CSV with proper quoting and error handling to handle malformed rows
+        df = _strip_whitespace(read_source_csv(
+            data_path,
+            on_bad_lines="skip",  # Skip rows with too many/too few fields
+            engine="python",  # Use Python engine for better handling of complex CSVs
+        ))
 
     if label_column not in df.columns:
         raise ValueError(f"Label column '{label_column}' not found in dataset")
@@ -102,38 +162,83 @@ def fetch_and_prepare_data(
         )
     
     print(f"Final dataset shape: {df.shape}")
+    return df
 
-    train_df = df.sample(frac=train_frac, random_state=random_state)
-    test_df = df.drop(train_df.index)
 
-    train_df.to_csv(train_out, index=False)
-    test_df.to_csv(test_out, index=False)
+def fetch_and_prepare_data(
+    *,
+    data_path: Optional[str] = None,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+    train_out: str = "pharmacy_train.csv",
+    test_out: str = "pharmacy_test.csv",
+    train_frac: float = 0.8,
+    random_state: int = 42,
+    frames: Optional[Iterable[pd.DataFrame]] = None,
+) -> tuple[str, str, Optional[str]]:
+    table, train_rows, test_rows = prepare_inventory(
+        data_path=data_path,
+        label_column=label_column,
+        train_frac=train_frac,
+        random_state=random_state,
+        frames=frames,
+    )
+
+    # The only flat copies: one per upload CSV
+    flat_rows(table, train_rows).to_csv(train_out, index=False)
+    flat_rows(table, test_rows).to_csv(test_out, index=False)
 
+    n_columns = len(table.columns)
     print("Data prepared successfully.")
     print(f"Label column: '{label_column}'")
-    print(f"Train shape: {train_df.shape}")
-    print(f"Test shape:  {test_df.shape}")
+    print(f"Train shape: {(len(train_rows), n_columns)}")
+    print(f"Test shape:  {(len(test_rows), n_columns)}")
 
     return train_out, test_out, label_column
 
 
+def prepare_inventory(
+    *,
+    data_path: Optional[str] = None,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+    id_column: str = DEFAULT_ID_COLUMN,
+    train_frac: float = 0.8,
+    random_state: int = 42,
+    frames: Optional[Iterable[pd.DataFrame]] = None,
+) -> tuple[NormalizedInventory | pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Clean the data and pick the train/test rows without copying them:
+    returns (table, train_rows, test_rows), where the rows are positions
+    into `table`. With an NDC column the table is the compact
+    dimension/fact form (see inventory_tables.py); data without one stays
+    flat.
+    """
+    df = load_and_clean_data(data_path=data_path, label_column=label_column, frames=frames)
+    train_rows, test_rows = sample_split(len(df), train_frac=train_frac, random_state=random_state)
+    table = normalize_inventory(df, id_column=id_column) if id_column in df.columns else df
+    return table, train_rows, test_rows
+
+
 # -------------------------
 # WoodWide operations
 # -------------------------
 
 def upload_dataset(client: WoodWide, file_path: str, name: str) -> str:
     print(f"Uploading {file_path} as '{name}'...")
-    start = time.time()
 
-    with open(file_path, "rb") as f:
-        dataset = client.api.datasets.upload(
-            file=f,
-            name=name,
-            overwrite=True,
-        )
+    with stage_span("upload", dataset_name=name, bytes=os.path.getsize(file_path)) as span:
+        def _upload():
+            # Reopen per attempt so a retry sends the file from the start
+            with open(file_path, "rb") as f:
+                return client.api.datasets.upload(
+                    file=f,
+                    name=name,
+                    overwrite=True,
+                )
+
+        dataset = call_with_retry("upload", _upload)
+        span.set(rows=getattr(dataset, "num_rows", None), dataset_id=dataset.id)
 
-    elapsed = time.time() - start
-    print(f"Upload took {elapsed:.2f}s")
+    print(f"Upload took {span.duration_s:.2f}s")
     print(f"Dataset Uploaded. ID: {dataset.id}\n")
     return dataset.id
 
@@ -161,30 +266,51 @@ def train_model(
         }
         print(f"Training Prediction Model '{model_name}'...")
 
-    start = time.time()
-    response = client._client.post(
-        endpoint,
-        params={"dataset_name": dataset_name},
-        data=data,
-        headers=client.auth_headers,
-    )
+    # One key per logical training start, reused across retries, so the
+    # server can recognise a repeated post instead of starting a second job
+    headers = {**client.auth_headers, "Idempotency-Key": uuid.uuid4().hex}
+    # Allow for clock skew between us and the server
+    first_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=30)
 
-    elapsed = time.time() - start
-    print(f"Training request took {elapsed:.2f}s")
+    def _start_training() -> str:
+        response = raise_for_transient_status(client._client.post(
+            endpoint,
+            params={"dataset_name": dataset_name},
+            data=data,
+            headers=headers,
+        ))
+        current_span().set(http_status=response.status_code)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Training failed ({response.status_code}): {response.text}"
+            )
+        model_id = response.json().get("id")
+        if not model_id:
+            raise RuntimeError("No model ID returned from training endpoint")
+        return model_id
 
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Training failed ({response.status_code}): {response.text}"
-        )
+    def _find_started_model() -> Optional[str]:
+        # A timed-out or 5xx post may still have started training
+        for model in call_with_retry("retrieve", client.api.models.list):
+            created_at = as_utc(getattr(model, "created_at", None))
+            if model.name == model_name and created_at is not None and created_at >= first_attempt_at:
+                return model.id
+        return None
+
+    with stage_span("train_request", usecase=usecase, model_name=model_name) as span:
+        model_id = call_with_retry("train", _start_training, reconcile=_find_started_model)
+        span.set(model_id=model_id)
 
-    model_id = response.json().get("id")
-    if not model_id:
-        raise RuntimeError("No model ID returned from training endpoint")
+    print(f"Training request took {span.duration_s:.2f}s")
 
     print(f"Model Training Started. ID: {model_id}\n")
     return model_id
 
 
+class TrainingFailedError(RuntimeError):
+    """The model reached training_status FAILED; waiting on it again won't help."""
+
+
 def wait_for_training(
     client: WoodWide,
     model_id: str,
@@ -193,25 +319,47 @@ def wait_for_training(
     poll_s: int = 2,
 ) -> None:
     print(f"Waiting for model {model_id} to complete training...")
-    start = time.time()
 
-    while True:
-        model = client.api.models.retrieve(model_id)
-        status = getattr(model, "training_status", None)
+    with stage_span("train_wait", model_id=model_id) as span:
+        polls = 0
+        while True:
+            model = call_with_retry("retrieve", lambda: client.api.models.retrieve(model_id))
+            status = getattr(model, "training_status", None)
+            polls += 1
+            span.set(polls=polls, training_status=status)
+
+            if status == "COMPLETE":
+                break
+
+            if status == "FAILED":
+                print(model)
+                raise TrainingFailedError(f"Model {model_id} training failed")
 
-        if status == "COMPLETE":
-            print(f"Training complete in {time.time() - start:.2f}s\n")
-            return
+            if span.elapsed() > timeout_s:
+                raise TimeoutError("Model training timed out")
 
-        if status == "FAILED":
-            print(model)
-            raise RuntimeError("Model training failed")
+            print(f"Status: {status}. Waiting...")
+            time.sleep(poll_s)
 
-        if time.time() - start > timeout_s:
-            raise TimeoutError("Model training timed out")
+    print(f"Training complete in {span.duration_s:.2f}s\n")
 
-        print(f"Status: {status}. Waiting...")
-        time.sleep(poll_s)
+
+def _infer_once(client: WoodWide, model_id: str, test_dataset_id: str, usecase: str) -> Any:
+    if usecase == "clustering":
+        return call_with_retry("infer", lambda: client.api.models.clustering.infer(
+            model_id=model_id,
+            dataset_id=test_dataset_id,
+        ))
+    else:
+        return call_with_retry("infer", lambda: client.api.models.prediction.infer(
+            model_id=model_id,
+            dataset_id=test_dataset_id,
+        ))
+
+
+def _inference_key(client: WoodWide, model_id: str, test_dataset_id: str, usecase: str) -> tuple:
+    # Credentials are part of the key so callers never share another tenant's result
+    return (str(client.base_url), client.api_key, usecase, model_id, test_dataset_id)
 
 
 def run_inference(
@@ -221,24 +369,223 @@ def run_inference(
     test_dataset_id: str,
     usecase: str,
 ) -> Any:
+    """
+    Concurrent calls for the same (model_id, test_dataset_id) share one
+    request and its result; see flight("inference").stats() for counts.
+    """
     print(f"Running inference on model {model_id}...")
 
-    start = time.time()
-    if usecase == "clustering":
-        result = client.api.models.clustering.infer(
-            model_id=model_id,
-            dataset_id=test_dataset_id,
+    with stage_span("inference", usecase=usecase, model_id=model_id) as span:
+        result, shared = flight("inference").do(
+            _inference_key(client, model_id, test_dataset_id, usecase),
+            lambda: _infer_once(client, model_id, test_dataset_id, usecase),
         )
-    else:
-        result = client.api.models.prediction.infer(
-            model_id=model_id,
-            dataset_id=test_dataset_id,
+        span.set(coalesced=shared)
+
+    print(f"Inference completed in {span.duration_s:.2f}s" + (" (shared in-flight call)" if shared else ""))
+    return result
+
+
+async def run_inference_async(
+    *,
+    client: WoodWide,
+    model_id: str,
+    test_dataset_id: str,
+    usecase: str,
+) -> Any:
+    """run_inference for asyncio callers; coalesces with threads and other tasks."""
+    print(f"Running inference on model {model_id}...")
+
+    with stage_span("inference", usecase=usecase, model_id=model_id) as span:
+        result, shared = await flight("inference").do_async(
+            _inference_key(client, model_id, test_dataset_id, usecase),
+            lambda: _infer_once(client, model_id, test_dataset_id, usecase),
         )
+        span.set(coalesced=shared)
 
-    print(f"Inference completed in {time.time() - start:.2f}s")
+    print(f"Inference completed in {span.duration_s:.2f}s" + (" (shared in-flight call)" if shared else ""))
     return result
 
 
+# -------------------------
+# Forecasting
+# -------------------------
+
+def build_forecast_frame(
+    inventory: NormalizedInventory,
+    *,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    id_column: str = DEFAULT_ID_COLUMN,
+    time_column: str = DEFAULT_TIME_COLUMN,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+) -> pd.DataFrame:
+    """
+    Future-month feature rows for every NDC: the latest observed row per NDC,
+    repeated once per horizon with year_month moved h months ahead. Rows are
+    horizon-major (all NDCs for horizons[0], then horizons[1], ...), sorted
+    by NDC within each block.
+
+    Features that encode the month's own usage are not copied from the
+    latest month (see FORECAST_*): beginning inventory is the latest ending
+    inventory, received units, restock events and average daily usage are
+    the NDC's historical means, the usage trend is its most frequent one,
+    and ending inventory is projected from those. Everything else (static
+    attributes, currently_backordered) is carried forward.
+
+    The latest rows and history aggregates are computed on the fact table;
+    only the rows uploaded for the forecast are denormalized.
+    """
+    if time_column not in inventory.fact.columns:
+        raise ValueError(f"Column '{time_column}' not found in dataset")
+    if id_column not in inventory.dim.columns:
+        raise ValueError(f"Column '{id_column}' not found in dataset")
+
+    # Months as integer ordinals; only the few distinct "YYYY-MM" strings are parsed or formatted
+    month_codes, months = pd.factorize(inventory.fact[time_column])
+    ordinals = pd.PeriodIndex(months, freq="M").asi8[month_codes]
+    keys = inventory.fact[KEY_COLUMN].to_numpy()
+    latest_rows = pd.Series(ordinals).groupby(keys).idxmax().to_numpy()
+    ndcs = inventory.dim[id_column].to_numpy()[keys[latest_rows]]
+    latest_rows = latest_rows[np.argsort(ndcs, kind="stable")]
+
+    n = len(latest_rows)
+    steps = np.repeat(np.asarray(horizons, dtype=np.int64), n)
+    frame = inventory.denormalize(np.tile(latest_rows, len(horizons)))
+    _rederive_usage_features(frame, inventory, np.tile(keys[latest_rows], len(horizons)), label_column)
+    frame = frame.drop(columns=[label_column], errors="ignore")
+    future = np.tile(ordinals[latest_rows], len(horizons)) + steps
+    future_codes, future_months = pd.factorize(future)
+    labels = pd.PeriodIndex.from_ordinals(future_months, freq="M").strftime("%Y-%m")
+    frame[time_column] = labels.to_numpy()[future_codes]
+    return frame
+
+
+def _rederive_usage_features(
+    frame: pd.DataFrame,
+    inventory: NormalizedInventory,
+    frame_keys: np.ndarray,
+    label_column: str,
+) -> None:
+    """Replace the latest month's usage-derived features in `frame` (in place); see FORECAST_*."""
+    fact = inventory.fact
+    opening, closing = FORECAST_STOCK_COLUMNS
+    if opening in frame.columns and closing in frame.columns:
+        frame[opening] = frame[closing].to_numpy()
+
+    means = [c for c in (*FORECAST_HISTORY_MEANS, label_column) if c in fact.columns]
+    history = fact.groupby(KEY_COLUMN)[means].mean().reindex(frame_keys) if means else None
+    for col in FORECAST_HISTORY_MEANS:
+        if col in means:
+            frame[col] = _as_dtype(history[col].to_numpy(), frame[col].dtype)
+
+    for col in FORECAST_HISTORY_MODES:
+        if col not in fact.columns:
+            continue
+        counts = fact.groupby([KEY_COLUMN, col], observed=True).size().rename("n").reset_index()
+        modes = (
+            counts.sort_values([KEY_COLUMN, "n"], ascending=[True, False], kind="stable")
+            .drop_duplicates(KEY_COLUMN)
+            .set_index(KEY_COLUMN)[col]
+        )
+        frame[col] = pd.Series(modes.reindex(frame_keys).to_numpy(), index=frame.index).astype(inventory.dtypes[col])
+
+    received = FORECAST_HISTORY_MEANS[0]
+    if closing in frame.columns and opening in frame.columns and received in means and label_column in means:
+        projected = frame[opening].to_numpy() + history[received].to_numpy() - history[label_column].to_numpy()
+        frame[closing] = _as_dtype(np.maximum(projected, 0), frame[closing].dtype)
+
+
+def _as_dtype(values: np.ndarray, dtype: Any) -> np.ndarray:
+    return np.rint(values).astype(dtype) if pd.api.types.is_integer_dtype(dtype) else values.astype(dtype)
+
+
+def forecast_usage(
+    *,
+    client: WoodWide,
+    model_id: str,
+    data_path: Optional[str] = None,
+    dataset_name: str,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+    id_column: str = DEFAULT_ID_COLUMN,
+    time_column: str = DEFAULT_TIME_COLUMN,
+    work_dir: Optional[str] = None,
+    inventory: Optional[NormalizedInventory] = None,
+) -> pd.DataFrame:
+    """
+    Forecast `label_column` h months ahead for every NDC with one upload and
+    one inference call. Returns a wide frame: one row per NDC, one column per
+    horizon ("h1", "h3", ...). History comes from `data_path` or from an
+    already cleaned `inventory` (e.g. one segment's rows, via take()).
+    """
+    if (data_path is None) == (inventory is None):
+        raise ValueError("Pass exactly one of data_path or inventory")
+    horizons = sorted(set(int(h) for h in horizons))
+    if not horizons or horizons[0] < 1:
+        raise ValueError(f"Horizons must be positive month counts, got {horizons}")
+
+    with stage_span("forecast", model_id=model_id, horizons=",".join(map(str, horizons))) as span:
+        if inventory is None:
+            df = load_and_clean_data(data_path=data_path, label_column=label_column)
+            inventory = normalize_inventory(df, id_column=id_column)
+            del df
+        frame = build_forecast_frame(
+            inventory,
+            horizons=horizons,
+            id_column=id_column,
+            time_column=time_column,
+            label_column=label_column,
+        )
+        span.set(rows=len(frame))
+
+        path = os.path.join(work_dir or "", "pharmacy_forecast.csv")
+        frame.to_csv(path, index=False)
+        try:
+            dataset_id = upload_dataset(client, path, f"{dataset_name}_forecast")
+        finally:
+            os.remove(path)
+        result = run_inference(
+            client=client,
+            model_id=model_id,
+            test_dataset_id=dataset_id,
+            usecase="prediction",
+        )
+
+        preds = inference_result_to_frame(result)["prediction"].reset_index(drop=True)
+        if len(preds) != len(frame):
+            raise RuntimeError(f"Forecast returned {len(preds)} predictions for {len(frame)} rows")
+        # Horizon-major rows -> (n_horizons, n_ndcs) -> NDC x horizon
+        values = preds.to_numpy(dtype=float).reshape(len(horizons), -1).T
+        ndcs = frame[id_column].iloc[: values.shape[0]].to_numpy()
+
+    print(f"Forecast {values.shape[0]} NDCs x {len(horizons)} horizons in {span.duration_s:.2f}s")
+    return pd.DataFrame(values, index=pd.Index(ndcs, name=id_column), columns=[f"h{h}" for h in horizons])
+
+
+def _register_model(
+    registry: ModelRegistry,
+    key: str,
+    checkpoint: RunCheckpoint,
+    *,
+    model_name: str,
+    data_path: str,
+) -> None:
+    if not checkpoint.drift_profile:
+        # Checkpoints written before drift profiles were recorded
+        print(f"No drift profile for run {checkpoint.run_id}; model {checkpoint.model_id} not registered")
+        return
+    registry.register(
+        key,
+        model_id=checkpoint.model_id,
+        profile=DriftProfile.from_dict(checkpoint.drift_profile),
+        model_name=model_name,
+        run_id=checkpoint.run_id,
+        train_dataset_id=checkpoint.train_dataset_id,
+        data_path=os.path.abspath(data_path),
+    )
+    print(f"Registered model {checkpoint.model_id} as the current '{key}' model in {registry.path}")
+
+
 def format_result(result: Any) -> str:
     if hasattr(result, "model_dump_json"):
         return result.model_dump_json(indent=2)
@@ -270,64 +617,267 @@ def woodwide_run(
     output_file: Optional[str] = None,
     label_column: str = DEFAULT_LABEL_COLUMN,
     cleanup_temp_files: bool = True,
-) -> WoodwideRunResult:
+    run_id: Optional[str] = None,
+    spans_file: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+    client: Optional[WoodWide] = None,
+    work_dir: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    prepared_splits: Optional[tuple[str, str, Optional[str]]] = None,
+    partition_by: Optional[str] = None,
+    partition_concurrency: int = 4,
+    min_segment_rows: int = 20,
+    forecast_horizons: Optional[Sequence[int]] = None,
+    segment_of: Optional[str] = None,
+    drift_gate: bool = False,
+    register_model: bool = True,
+    registry_file: Optional[str] = None,
+    registry_key: Optional[str] = None,
+) -> WoodwideRunResult | PartitionedRunResult:
     """
     End-to-end WoodWide workflow.
     This function is the ONLY intended entrypoint.
+
+    Every stage is recorded as a timing span. Spans are appended to
+    `spans_file` (JSONL) and written to `metrics_file` (Prometheus text);
+    both default to the WOODWIDE_SPANS_FILE / WOODWIDE_METRICS_FILE env vars.
+
+    Without an explicit `client`, the process-wide pooled client for
+    (base_url, api_key) is used. `work_dir` keeps the temporary train/test
+    splits apart when several runs share a working directory.
+
+    Each completed stage (split hashes, dataset ids, model id) is checkpointed
+    under `checkpoint_dir`. With resume=True and the original run_id, stages
+    that already finished are skipped; see run_checkpoint.resume().
+
+    `prepared_splits` is the (train_path, test_path, label_column) result of
+    an earlier fetch_and_prepare_data call, e.g. from a batch runner's
+    process pool; the prepare stage then reuses those files.
+
+    `segment_of` marks a segment run of a partitioned run (the parent's
+    run_id). Its checkpoint then records `prepared_splits`, so resuming the
+    segment reuses its own split instead of preparing the whole dataset.
+
+    With `partition_by` (e.g. "medication_form"), one model is trained per
+    segment of that column instead of one global model; see
+    woodwide_run_partitioned(). Forecasts then come from each NDC's segment
+    model.
+
+    With `forecast_horizons` (e.g. (1, 3, 6)) a prediction run also
+    forecasts every NDC that many months ahead in one batched inference;
+    see forecast_usage().
+
+    Once training completes, the model is registered as the current
+    `registry_key` model (default: the usecase) in the drift registry
+    (`registry_file`, see drift.py), with a profile of its training split.
+    Callers that promote models themselves pass register_model=False and
+    register result.drift_profile on promotion. With drift_gate=True the
+    new training split is first checked against the registered profile: if
+    nothing drifted, no model is trained and the registered model scores the
+    new test split (result.retrained is False).
     """
     # Validate inputs
     validate_data_path(data_path)
+
+    if partition_by:
+        return woodwide_run_partitioned(
+            usecase=usecase,
+            api_key=api_key,
+            model_name=model_name,
+            dataset_name=dataset_name,
+            data_path=data_path,
+            partition_by=partition_by,
+            base_url=base_url,
+            output_file=output_file,
+            label_column=label_column,
+            run_id=run_id,
+            spans_file=spans_file,
+            metrics_file=metrics_file,
+            client=client,
+            work_dir=work_dir,
+            checkpoint_dir=checkpoint_dir,
+            resume=resume,
+            max_workers=partition_concurrency,
+            min_segment_rows=min_segment_rows,
+            forecast_horizons=forecast_horizons,
+            drift_gate=drift_gate,
+            register_model=register_model,
+            registry_file=registry_file,
+            registry_key=registry_key,
+        )
     
-    client = WoodWide(api_key=api_key, base_url=base_url)
+    client = client or get_client(api_key=api_key, base_url=base_url)
+    tracer = StageTracer(run_id=run_id)
+    store = CheckpointStore(checkpoint_dir)
+    registry = ModelRegistry(registry_file)
+    registry_key = registry_key or usecase
+
+    if resume:
+        checkpoint = store.load(tracer.run_id)
+        checkpoint.status, checkpoint.error = "running", None
+        print(f"Resuming run {checkpoint.run_id} after stage '{checkpoint.stage}'")
+    else:
+        checkpoint = RunCheckpoint(
+            run_id=tracer.run_id,
+            usecase=usecase,
+            params={
+                "usecase": usecase,
+                "model_name": model_name,
+                "dataset_name": dataset_name,
+                # Absolute, so a resume from another working directory finds the same files
+                "data_path": os.path.abspath(data_path),
+                "base_url": base_url,
+                "output_file": os.path.abspath(output_file) if output_file else None,
+                "label_column": label_column,
+                "drift_gate": drift_gate,
+                "register_model": register_model,
+                "registry_file": os.path.abspath(registry.path),
+                "registry_key": registry_key,
+            },
+        )
+        if segment_of and prepared_splits:
+            checkpoint.params["segment_of"] = segment_of
+            checkpoint.params["prepared_splits"] = [
+                os.path.abspath(prepared_splits[0]),
+                os.path.abspath(prepared_splits[1]),
+                prepared_splits[2],
+            ]
+        print(f"Run ID: {checkpoint.run_id}")
+    store.save(checkpoint)
 
     train_path = test_path = ""
-    train_dataset_id = test_dataset_id = model_id = ""
 
     effective_label = None if usecase == "clustering" else label_column
 
     try:
-        train_path, test_path, prepared_label = fetch_and_prepare_data(
-            data_path=data_path,
-            label_column=label_column,
-        )
-        if usecase == "prediction":
-            effective_label = prepared_label
+        with tracer.activate(), stage_span("woodwide_run", usecase=usecase, model_name=model_name):
+            # Splits are only needed until both datasets are uploaded
+            if not checkpoint.reached("uploaded_test"):
+                with stage_span("prepare", data_path=data_path, external=bool(prepared_splits) or None) as span:
+                    if prepared_splits:
+                        train_path, test_path, prepared_label = prepared_splits
+                        if segment_of and not os.path.exists(train_path):
+                            raise FileNotFoundError(
+                                f"Segment split {train_path} is gone; resume the partitioned run '{segment_of}' instead"
+                            )
+                    else:
+                        train_path, test_path, prepared_label = fetch_and_prepare_data(
+                            data_path=data_path,
+                            label_column=label_column,
+                            train_out=os.path.join(work_dir or "", "pharmacy_train.csv"),
+                            test_out=os.path.join(work_dir or "", "pharmacy_test.csv"),
+                        )
+                    span.set(bytes=os.path.getsize(train_path) + os.path.getsize(test_path))
 
-        train_dataset_id = upload_dataset(client, train_path, dataset_name)
-        test_dataset_id = upload_dataset(
-            client, test_path, f"{dataset_name}_test"
-        )
+                if usecase == "prediction":
+                    effective_label = prepared_label
+                checkpoint.label_column = effective_label
+                store.record_splits(checkpoint, train_path, test_path)
 
-        model_id = train_model(
-            client=client,
-            dataset_name=dataset_name,
-            model_name=model_name,
-            usecase=usecase,
-            label_column=effective_label,
-        )
+                if not checkpoint.reached("uploaded_train"):
+                    # Profiled now: the split files are gone once both datasets are uploaded
+                    train_df = pd.read_csv(train_path)
+                    current = None
+                    if drift_gate:
+                        with stage_span("drift_check", registry_key=registry_key) as span:
+                            decision = should_retrain(registry_key, train_df, registry=registry)
+                            span.set(retrain=decision.retrain, drifted=len(decision.drifted_features))
+                        print(f"Drift check: {'RETRAIN' if decision.retrain else 'SKIP'}: {decision.reason}")
+                        if not decision.retrain:
+                            current = registry.get(registry_key)
+                    if current:
+                        # Stable data: the registered model scores the new test split, nothing is trained
+                        store.advance(
+                            checkpoint,
+                            "uploaded_train",
+                            train_dataset_id=current.get("train_dataset_id", ""),
+                            model_id=current["model_id"],
+                            reused_model=True,
+                        )
+                    else:
+                        checkpoint.drift_profile = build_profile(train_df).to_dict()
+                        checkpoint.reused_model = False
+                    del train_df
 
-        wait_for_training(client, model_id)
+            effective_label = checkpoint.label_column
 
-        inference_result = run_inference(
-            client=client,
-            model_id=model_id,
-            test_dataset_id=test_dataset_id,
-            usecase=usecase,
-        )
+            if not checkpoint.reached("uploaded_train"):
+                train_dataset_id = upload_dataset(client, train_path, dataset_name)
+                store.advance(checkpoint, "uploaded_train", train_dataset_id=train_dataset_id)
 
-        if output_file:
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(format_result(inference_result))
+            if not checkpoint.reached("uploaded_test"):
+                test_dataset_id = upload_dataset(
+                    client, test_path, f"{dataset_name}_test"
+                )
+                store.advance(checkpoint, "uploaded_test", test_dataset_id=test_dataset_id)
 
-        return WoodwideRunResult(
-            usecase=usecase,
-            model_id=model_id,
-            train_dataset_id=train_dataset_id,
-            test_dataset_id=test_dataset_id,
-            label_column=effective_label,
-            inference_result=inference_result,
-        )
+            if checkpoint.reused_model and not checkpoint.reached("trained"):
+                store.advance(checkpoint, "trained")
+
+            if not checkpoint.reached("training_started"):
+                model_id = train_model(
+                    client=client,
+                    dataset_name=dataset_name,
+                    model_name=model_name,
+                    usecase=usecase,
+                    label_column=effective_label,
+                )
+                store.advance(checkpoint, "training_started", model_id=model_id)
+
+            if not checkpoint.reached("trained"):
+                try:
+                    wait_for_training(client, checkpoint.model_id)
+                except TrainingFailedError:
+                    # A FAILED model can't be waited on again; resuming retrains it.
+                    # Timeouts and polling errors keep the model id: it may still finish.
+                    store.advance(checkpoint, "uploaded_test", model_id="")
+                    raise
+                if register_model:
+                    _register_model(registry, registry_key, checkpoint, model_name=model_name, data_path=data_path)
+                store.advance(checkpoint, "trained")
+
+            inference_result = run_inference(
+                client=client,
+                model_id=checkpoint.model_id,
+                test_dataset_id=checkpoint.test_dataset_id,
+                usecase=usecase,
+            )
+
+            if output_file:
+                with open(output_file, "w", encoding="utf-8") as f:
+                    f.write(format_result(inference_result))
 
+            forecast = None
+            if forecast_horizons and usecase == "prediction":
+                forecast = forecast_usage(
+                    client=client,
+                    model_id=checkpoint.model_id,
+                    data_path=data_path,
+                    dataset_name=dataset_name,
+                    horizons=forecast_horizons,
+                    label_column=effective_label,
+                    work_dir=work_dir,
+                )
+
+            checkpoint.status = "complete"
+            store.advance(checkpoint, "complete")
+
+            return WoodwideRunResult(
+                usecase=usecase,
+                model_id=checkpoint.model_id,
+                train_dataset_id=checkpoint.train_dataset_id,
+                test_dataset_id=checkpoint.test_dataset_id,
+                label_column=effective_label,
+                inference_result=inference_result,
+                forecast=forecast,
+                retrained=not checkpoint.reused_model,
+                drift_profile=DriftProfile.from_dict(checkpoint.drift_profile) if checkpoint.drift_profile else None,
+            )
+
+    except BaseException as e:
+        store.fail(checkpoint, e)
+        raise
     finally:
         if cleanup_temp_files:
             for p in (train_path, test_path):
@@ -336,6 +886,339 @@ def woodwide_run(
                         os.remove(p)
                     except OSError:
                         pass  # Ignore errors during cleanup
+        tracer.export(jsonl_path=spans_file, prometheus_path=metrics_file)
+
+# -------------------------
+# Partitioned runs
+# -------------------------
+
+OTHER_SEGMENT = "_other"
+
+
+def _segment_slug(value: Any) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", str(value)).strip("_").lower()
+    return slug or "blank"
+
+
+def split_by_partition(
+    table: NormalizedInventory | pd.DataFrame,
+    train_rows: np.ndarray,
+    test_rows: np.ndarray,
+    partition_by: str,
+    *,
+    min_segment_rows: int = 20,
+    id_column: str = DEFAULT_ID_COLUMN,
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Split prepared train/test rows (positions into `table`, as returned by
+    prepare_inventory) into {segment: (train_rows, test_rows)} with one
+    factorize of the partition column; no rows are copied. Segments with
+    fewer than `min_segment_rows` training rows (or no test rows) are pooled
+    into one "_other" segment. No row is dropped, so every NDC still gets a
+    model (and a forecast):
+
+    - a pooled segment without test rows holds out a fifth of its training
+      rows to score
+    - a pool too small to train on is folded into the largest segment
+    """
+    if partition_by not in table.columns:
+        raise ValueError(f"Partition column '{partition_by}' not found in dataset")
+    if isinstance(table, NormalizedInventory):
+        values, ids = table.column(partition_by), table.fact[KEY_COLUMN]
+    else:
+        values, ids = table[partition_by], table.get(id_column)
+
+    codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=False)
+    train_codes, test_codes = codes[train_rows], codes[test_rows]
+
+    segments: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    pooled_train, pooled_test, pooled_values = [], [], []
+    for code, value in enumerate(uniques):
+        seg_train = train_rows[train_codes == code]
+        seg_test = test_rows[test_codes == code]
+        if len(seg_train) < min_segment_rows or not len(seg_test):
+            pooled_train.append(seg_train)
+            pooled_test.append(seg_test)
+            pooled_values.append(value)
+            continue
+        slug = _segment_slug(value)
+        while slug in segments:
+            slug += "_"
+        segments[slug] = (seg_train, seg_test)
+
+    if not pooled_values:
+        return segments
+
+    other_train = np.concatenate(pooled_train)
+    other_test = np.concatenate(pooled_test)
+    ndcs = ids.iloc[np.concatenate([other_train, other_test])].nunique() if ids is not None else "?"
+    holdout = max(1, len(other_train) // 5) if not len(other_test) else 0
+    if len(other_train) - holdout >= min_segment_rows:
+        if holdout:
+            # No test rows landed in these segments; score the pooled model on a slice of its own rows
+            other_test = pd.Series(other_train).sample(n=holdout, random_state=42).to_numpy()
+            other_train = other_train[~np.isin(other_train, other_test)]
+        segments[OTHER_SEGMENT] = (other_train, other_test)
+        print(f"Pooled {partition_by}={pooled_values} ({ndcs} NDCs) into '{OTHER_SEGMENT}'")
+    elif segments:
+        target = max(segments, key=lambda slug: len(segments[slug][0]))
+        target_train, target_test = segments[target]
+        segments[target] = (np.concatenate([target_train, other_train]), np.concatenate([target_test, other_test]))
+        print(
+            f"{partition_by}={pooled_values} ({ndcs} NDCs, {len(other_train)} training rows) "
+            f"too small for a model of its own; folded into segment '{target}'"
+        )
+    else:
+        raise ValueError(
+            f"Segments too small to train: {len(other_train)} training rows in total "
+            f"(min_segment_rows={min_segment_rows}); use a coarser partition column"
+        )
+    return segments
+
+
+def woodwide_run_partitioned(
+    *,
+    usecase: str,
+    api_key: str,
+    model_name: str,
+    dataset_name: str,
+    data_path: str,
+    partition_by: str,
+    base_url: str = DEFAULT_BASE_URL,
+    output_file: Optional[str] = None,
+    label_column: str = DEFAULT_LABEL_COLUMN,
+    run_id: Optional[str] = None,
+    spans_file: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+    client: Optional[WoodWide] = None,
+    work_dir: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    max_workers: int = 4,
+    min_segment_rows: int = 20,
+    forecast_horizons: Optional[Sequence[int]] = None,
+    drift_gate: bool = False,
+    register_model: bool = True,
+    registry_file: Optional[str] = None,
+    registry_key: Optional[str] = None,
+) -> PartitionedRunResult:
+    """
+    Train and run one model per `partition_by` segment. Data is prepared and
+    split once; each segment is then a regular woodwide_run (own datasets,
+    model, checkpoint "<run_id>-<segment>"), run concurrently. Each segment's
+    test rows are scored by that segment's model and merged back into one
+    prediction table (written to `output_file` as CSV) with a metrics row
+    per segment and one combined "ALL" row.
+
+    Segment spans go to the same `spans_file` / `metrics_file` as the parent
+    run. With `forecast_horizons`, every segment model forecasts the NDCs of
+    its own segment (train + test rows as history); the per-segment
+    forecasts are combined into `forecast` with a "segment" column.
+
+    The run itself is checkpointed too (stage "prepared" lists the segment
+    run ids), so resume(<run_id>) re-splits the data, resumes the segments
+    that have checkpoints and starts the rest. Each segment's split files
+    stay next to its checkpoint until the segment completes.
+
+    Each segment model has its own drift registry entry,
+    "<registry_key>__<segment>", so drift_gate decides per segment.
+    """
+    client = client or get_client(api_key=api_key, base_url=base_url)
+    tracer = StageTracer(run_id=run_id)
+    store = CheckpointStore(checkpoint_dir)
+    seg_dir = os.path.join(work_dir or "", f"partitions_{tracer.run_id}")
+    os.makedirs(seg_dir, exist_ok=True)
+
+    if resume:
+        checkpoint = store.load(tracer.run_id)
+        checkpoint.status, checkpoint.error = "running", None
+        print(f"Resuming partitioned run {checkpoint.run_id} ({len(checkpoint.segments)} segments)")
+    else:
+        checkpoint = RunCheckpoint(
+            run_id=tracer.run_id,
+            usecase=usecase,
+            params={
+                "usecase": usecase,
+                "model_name": model_name,
+                "dataset_name": dataset_name,
+                "data_path": os.path.abspath(data_path),
+                "base_url": base_url,
+                "output_file": os.path.abspath(output_file) if output_file else None,
+                "label_column": label_column,
+                "partition_by": partition_by,
+                "partition_concurrency": max_workers,
+                "min_segment_rows": min_segment_rows,
+                "forecast_horizons": list(forecast_horizons) if forecast_horizons else None,
+                "drift_gate": drift_gate,
+                "register_model": register_model,
+                "registry_file": os.path.abspath(registry_file) if registry_file else None,
+                "registry_key": registry_key,
+            },
+        )
+        print(f"Run ID: {tracer.run_id} (partitioned by '{partition_by}')")
+    store.save(checkpoint)
+
+    results: dict[str, WoodwideRunResult] = {}
+    failed: dict[str, str] = {}
+
+    try:
+        with tracer.activate(), stage_span("woodwide_run", usecase=usecase, model_name=model_name, partition_by=partition_by):
+            with stage_span("prepare", data_path=data_path):
+                # Kept in the compact form; each segment's rows are denormalized only for its upload CSVs
+                table, train_rows, test_rows = prepare_inventory(data_path=data_path, label_column=label_column)
+            effective_label = None if usecase == "clustering" else label_column
+            if forecast_horizons and usecase == "prediction" and not isinstance(table, NormalizedInventory):
+                raise ValueError(f"Forecasting needs the '{DEFAULT_ID_COLUMN}' column, not found in dataset")
+
+            with stage_span("partition", partition_by=partition_by) as span:
+                segments = split_by_partition(
+                    table, train_rows, test_rows, partition_by, min_segment_rows=min_segment_rows
+                )
+                span.set(segments=len(segments))
+            print(f"Training {len(segments)} segment models: {', '.join(segments)}")
+            store.advance(checkpoint, "prepared", segments={slug: f"{tracer.run_id}-{slug}" for slug in segments})
+
+            def run_segment(slug: str) -> WoodwideRunResult:
+                seg_train, seg_test = segments[slug]
+                seg_run_id = checkpoint.segments[slug]
+                # Kept with the checkpoint, not in seg_dir: a failed segment resumes from these
+                seg_train_path, seg_test_path = store.split_paths(seg_run_id)
+                os.makedirs(store.root, exist_ok=True)
+                flat_rows(table, seg_train).to_csv(seg_train_path, index=False)
+                flat_rows(table, seg_test).to_csv(seg_test_path, index=False)
+                result = woodwide_run(
+                    usecase=usecase,
+                    api_key=api_key,
+                    model_name=f"{model_name}__{slug}",
+                    dataset_name=f"{dataset_name}__{slug}",
+                    data_path=data_path,
+                    base_url=base_url,
+                    label_column=label_column,
+                    run_id=seg_run_id,
+                    spans_file=spans_file,
+                    metrics_file=metrics_file,
+                    client=client,
+                    work_dir=seg_dir,
+                    checkpoint_dir=checkpoint_dir,
+                    resume=resume and store.exists(seg_run_id),
+                    prepared_splits=(seg_train_path, seg_test_path, label_column),
+                    segment_of=tracer.run_id,
+                    cleanup_temp_files=False,  # removed below once the segment succeeds
+                    drift_gate=drift_gate,
+                    register_model=register_model,
+                    registry_file=registry_file,
+                    registry_key=f"{registry_key or usecase}__{slug}",
+                )
+                store.remove_splits(seg_run_id)
+                if forecast_horizons and usecase == "prediction":
+                    # Own directory: every segment's forecast upload is named pharmacy_forecast.csv
+                    forecast_dir = os.path.join(seg_dir, f"{slug}_forecast")
+                    os.makedirs(forecast_dir, exist_ok=True)
+                    forecast = forecast_usage(
+                        client=client,
+                        model_id=result.model_id,
+                        dataset_name=f"{dataset_name}__{slug}",
+                        horizons=forecast_horizons,
+                        label_column=effective_label,
+                        work_dir=forecast_dir,
+                        inventory=table.take(np.concatenate([seg_train, seg_test])),
+                    )
+                    result = replace(result, forecast=forecast)
+                return result
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="woodwide-segment") as pool:
+                futures = {
+                    slug: pool.submit(contextvars.copy_context().run, run_segment, slug)
+                    for slug in segments
+                }
+                for slug, future in futures.items():
+                    try:
+                        results[slug] = future.result()
+                    except Exception as e:
+                        failed[slug] = f"{type(e).__name__}: {e}"
+                        print(f"Segment '{slug}' failed: {failed[slug]}")
+
+            if not results:
+                raise RuntimeError(f"All {len(segments)} segment runs failed: {failed}")
+
+            with stage_span("merge", segments=len(results)) as span:
+                predictions, metrics = _merge_segment_outputs(table, segments, results, effective_label)
+                span.set(rows=len(predictions))
+
+            if output_file:
+                predictions.to_csv(output_file, index=False)
+            print(f"\nSegment metrics:\n{metrics.to_string(index=False)}\n")
+
+            forecasts = [r.forecast.assign(segment=slug) for slug, r in results.items() if r.forecast is not None]
+            forecast = pd.concat(forecasts) if forecasts else None
+
+            if failed:
+                # Partial result is still returned; the checkpoint stays resumable for the failed segments
+                store.fail(checkpoint, RuntimeError(f"Segments failed: {sorted(failed)}"))
+            else:
+                checkpoint.status = "complete"
+                store.advance(checkpoint, "complete")
+
+            return PartitionedRunResult(
+                usecase=usecase,
+                partition_by=partition_by,
+                segments=results,
+                failed=failed,
+                predictions=predictions,
+                metrics=metrics,
+                forecast=forecast,
+            )
+    except BaseException as e:
+        store.fail(checkpoint, e)
+        raise
+    finally:
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        tracer.export(jsonl_path=spans_file, prometheus_path=metrics_file)
+
+
+def _merge_segment_outputs(
+    table: NormalizedInventory | pd.DataFrame,
+    segments: dict[str, tuple[np.ndarray, np.ndarray]],
+    results: dict[str, WoodwideRunResult],
+    label_column: Optional[str],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    merged = []
+    for slug, result in results.items():
+        seg_test = flat_rows(table, segments[slug][1]).reset_index(drop=True)
+        outputs = inference_result_to_frame(result.inference_result).reset_index(drop=True)
+        if len(outputs) != len(seg_test):
+            print(f"Warning: segment '{slug}' returned {len(outputs)} outputs for {len(seg_test)} rows")
+        outputs = outputs.reindex(range(len(seg_test)))
+        seg_out = pd.concat([seg_test, outputs.add_prefix("pred_")], axis=1)
+        seg_out["segment"] = slug
+        seg_out["model_id"] = result.model_id
+        merged.append(seg_out)
+    predictions = pd.concat(merged, ignore_index=True)
+
+    # Decide regression vs classification once; small segments would misjudge it
+    regression = (
+        label_column is not None
+        and "pred_prediction" in predictions.columns
+        and infer_task_type(predictions[label_column]) == "regression"
+    )
+    metric_rows = [
+        {"segment": slug, "model_id": frame["model_id"].iloc[0], **_segment_metrics(frame, label_column, regression)}
+        for slug, frame in predictions.groupby("segment", sort=False)
+    ]
+    metric_rows.append({"segment": "ALL", "model_id": "", **_segment_metrics(predictions, label_column, regression)})
+    return predictions, pd.DataFrame(metric_rows)
+
+
+def _segment_metrics(frame: pd.DataFrame, label_column: Optional[str], regression: bool) -> dict[str, float]:
+    row: dict[str, float] = {"rows": float(len(frame))}
+    if not regression:
+        return row
+    scored = frame.dropna(subset=[label_column, "pred_prediction"])
+    if scored.empty:
+        return row
+    metrics = regression_metrics(scored[label_column], scored["pred_prediction"])
+    return {**row, **{k: metrics[k] for k in ("mae", "rmse", "r2", "smape_pct")}}
+
 
 def main():
     """Main entry point for the script."""
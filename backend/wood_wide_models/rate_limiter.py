@@ -0,0 +1,189 @@
+# rate_limiter.py
+#
+# Host-wide client-side rate limit for WoodWide API calls. The token bucket
+# lives in a small JSON file guarded by an exclusive flock, so every thread
+# and every worker process on the machine (parallel per-hospital runs, the
+# resident service, batch runners) draws from the same budget instead of
+# each one discovering the server's limit through its own 429s.
+#
+# The refill rate adapts (AIMD): each success nudges it up by a fixed step,
+# a 429 halves it and pauses every caller for the server's Retry-After. The
+# shared rate therefore settles just under what the API will sustain.
+#
+#   WOODWIDE_RATE_LIMIT_RPS=8 python prediction-model.py ...   # starting rate
+#   WOODWIDE_RATE_LIMIT_RPS=0 ...                              # disable
+#   python rate_limiter.py                                     # show shared state
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: falls back to a per-process lock
+    fcntl = None
+
+RATE_ENV = "WOODWIDE_RATE_LIMIT_RPS"
+MAX_RATE_ENV = "WOODWIDE_RATE_LIMIT_MAX_RPS"
+STATE_FILE_ENV = "WOODWIDE_RATE_LIMIT_FILE"
+DEFAULT_STATE_FILE = os.path.join(tempfile.gettempdir(), "woodwide_rate_limit.json")
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    initial_rps: float = 5.0
+    min_rps: float = 0.5
+    max_rps: float = 20.0
+    burst: float = 10.0
+    increase_rps: float = 0.1  # added to the shared rate per successful call
+    decrease_factor: float = 0.5  # applied on 429
+    decrease_cooldown_s: float = 1.0  # one 429 storm halves the rate once, not per request
+
+
+class SharedTokenBucket:
+    def __init__(self, state_path: str = DEFAULT_STATE_FILE, config: Optional[RateLimitConfig] = None) -> None:
+        self.state_path = state_path
+        self.config = config or RateLimitConfig()
+        self._thread_lock = threading.Lock()
+
+    def _fresh_state(self, now: float) -> dict[str, float]:
+        return {
+            "rate": self.config.initial_rps,
+            "tokens": self.config.burst,
+            "updated": now,
+            "blocked_until": 0.0,
+            "last_decrease": 0.0,
+        }
+
+    def _update(self, fn) -> Any:
+        """Run fn(state, now) under the host-wide lock and persist the state."""
+        with self._thread_lock:
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                    # time.time(), not monotonic: the clock has to agree across processes
+                    now = time.time()
+                    try:
+                        state = json.loads(f.read() or "{}")
+                    except json.JSONDecodeError:
+                        state = {}
+                    if not state:
+                        state = self._fresh_state(now)
+                    result = fn(state, now)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                return result
+            finally:
+                os.close(fd)  # releases the flock
+
+    def _refill(self, state: dict[str, float], now: float) -> None:
+        elapsed = max(0.0, now - state["updated"])
+        # Clamp in case the file was written under a different config
+        state["rate"] = min(self.config.max_rps, max(self.config.min_rps, state["rate"]))
+        state["tokens"] = min(self.config.burst, state["tokens"] + elapsed * state["rate"])
+        state["updated"] = now
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds spent waiting."""
+        def take(state: dict[str, float], now: float) -> float:
+            self._refill(state, now)
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+            if state["tokens"] >= 1.0:
+                state["tokens"] -= 1.0
+                return 0.0
+            return (1.0 - state["tokens"]) / state["rate"]
+
+        waited = 0.0
+        while True:
+            wait = self._update(take)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self) -> None:
+        def increase(state: dict[str, float], now: float) -> None:
+            self._refill(state, now)
+            state["rate"] = min(self.config.max_rps, state["rate"] + self.config.increase_rps)
+
+        self._update(increase)
+
+    def on_throttled(self, retry_after_s: Optional[float] = None) -> None:
+        """Server said 429: back off host-wide."""
+        def decrease(state: dict[str, float], now: float) -> None:
+            self._refill(state, now)
+            if now - state["last_decrease"] >= self.config.decrease_cooldown_s:
+                state["rate"] = max(self.config.min_rps, state["rate"] * self.config.decrease_factor)
+                state["last_decrease"] = now
+            state["tokens"] = 0.0
+            if retry_after_s:
+                state["blocked_until"] = max(state["blocked_until"], now + retry_after_s)
+
+        self._update(decrease)
+
+    def snapshot(self) -> dict[str, float]:
+        def read(state: dict[str, float], now: float) -> dict[str, float]:
+            self._refill(state, now)
+            return dict(state)
+
+        return self._update(read)
+
+
+_limiter: Optional[SharedTokenBucket] = None
+_limiter_configured = False
+_limiter_lock = threading.Lock()
+
+
+def shared_limiter() -> Optional[SharedTokenBucket]:
+    """
+    Process-wide limiter built from the environment on first use, or None
+    when WOODWIDE_RATE_LIMIT_RPS=0.
+    """
+    global _limiter, _limiter_configured
+    with _limiter_lock:
+        if not _limiter_configured:
+            _limiter_configured = True
+            defaults = RateLimitConfig()
+            initial = float(os.getenv(RATE_ENV, defaults.initial_rps))
+            if initial > 0:
+                max_rps = float(os.getenv(MAX_RATE_ENV, max(defaults.max_rps, initial)))
+                _limiter = SharedTokenBucket(
+                    os.getenv(STATE_FILE_ENV, DEFAULT_STATE_FILE),
+                    RateLimitConfig(initial_rps=initial, max_rps=max_rps),
+                )
+        return _limiter
+
+
+def configure_limiter(limiter: Optional[SharedTokenBucket]) -> None:
+    """Replace the process-wide limiter (None disables limiting)."""
+    global _limiter, _limiter_configured
+    with _limiter_lock:
+        _limiter = limiter
+        _limiter_configured = True
+
+
+def main():
+    limiter = shared_limiter()
+    if limiter is None:
+        print(f"Rate limiting disabled ({RATE_ENV}=0)")
+        return
+    state = limiter.snapshot()
+    blocked = max(0.0, state["blocked_until"] - time.time())
+    print(f"State file: {limiter.state_path}")
+    print(f"Rate:       {state['rate']:.2f} req/s (max {limiter.config.max_rps:g})")
+    print(f"Tokens:     {state['tokens']:.2f} / {limiter.config.burst:g}")
+    print(f"Blocked:    {blocked:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# retry_policy.py
+#
+# Retries for WoodWide API calls: exponential backoff with full jitter,
+# Retry-After support and a per-operation time budget. Transient failures
+# (429, 5xx, timeouts, dropped connections) are retried; anything else is
+# raised immediately.
+#
+# Training posts are not naturally idempotent: a request that timed out may
+# still have started a job. Callers pass `reconcile`, which is consulted
+# before every retry and can return the result of the earlier attempt
+# (e.g. the model id it created) instead of posting again.
+#
+# Every attempt first takes a token from the host-wide rate limiter
+# (rate_limiter.py); 429s feed back into it so all processes slow down.
+
+from __future__ import annotations
+
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, TypeVar
+
+import httpx
+from woodwide import APIConnectionError, APIStatusError
+
+from rate_limiter import shared_limiter
+from stage_timing import current_span
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay_s: float = 0.5
+    max_delay_s: float = 30.0
+    multiplier: float = 2.0
+    budget_s: float = 120.0  # give up once retrying would exceed this much total time
+
+
+# Per-operation budgets: uploads and inference move data and can be slow;
+# status polls are cheap and frequent.
+DEFAULT_POLICIES: dict[str, RetryPolicy] = {
+    "upload": RetryPolicy(max_attempts=5, base_delay_s=1.0, budget_s=300.0),
+    "train": RetryPolicy(max_attempts=5, base_delay_s=1.0, budget_s=180.0),
+    "retrieve": RetryPolicy(max_attempts=8, base_delay_s=0.5, max_delay_s=15.0, budget_s=120.0),
+    "infer": RetryPolicy(max_attempts=5, base_delay_s=1.0, budget_s=300.0),
+}
+
+
+class TransientHTTPError(Exception):
+    """Retryable status from a raw (non-SDK) request."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        super().__init__(f"HTTP {response.status_code}: {response.text[:200]}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+def raise_for_transient_status(response: httpx.Response) -> httpx.Response:
+    if response.status_code in RETRYABLE_STATUSES:
+        raise TransientHTTPError(response)
+    return response
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def as_utc(value: Any) -> Optional[datetime]:
+    """
+    Timestamp from the API as an aware UTC datetime. Naive values are taken
+    to be UTC already; ISO strings are parsed; anything unparseable is None.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def classify(error: BaseException) -> tuple[bool, bool, Optional[float]]:
+    """
+    Return (retryable, ambiguous, retry_after_s). Ambiguous failures are the
+    ones where the server may have acted on the request before it failed.
+    """
+    if isinstance(error, (APIStatusError, TransientHTTPError)):
+        status = error.status_code
+        retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+        # 429 and 408 mean the request was not processed
+        return status in RETRYABLE_STATUSES, status >= 500, retry_after
+    if isinstance(error, (APIConnectionError, httpx.TransportError)):
+        return True, True, None
+    return False, False, None
+
+
+def backoff_delay(policy: RetryPolicy, attempt: int) -> float:
+    """Full-jitter delay before retry number `attempt` (1-based)."""
+    cap = min(policy.max_delay_s, policy.base_delay_s * policy.multiplier ** (attempt - 1))
+    return random.uniform(0, cap)
+
+
+def call_with_retry(
+    operation: str,
+    fn: Callable[[], T],
+    *,
+    policy: Optional[RetryPolicy] = None,
+    reconcile: Optional[Callable[[], Optional[T]]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """
+    Call `fn` under the retry policy for `operation`. After an ambiguous
+    failure, `reconcile()` runs before the next attempt; a non-None result is
+    returned as if the call had succeeded.
+    """
+    policy = policy or DEFAULT_POLICIES.get(operation, RetryPolicy())
+    limiter = shared_limiter()
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            result = fn()
+            if limiter is not None:
+                limiter.on_success()
+            return result
+        except Exception as e:
+            retryable, ambiguous, retry_after = classify(e)
+            if limiter is not None and getattr(e, "status_code", None) == 429:
+                limiter.on_throttled(retry_after)
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+
+            delay = backoff_delay(policy, attempt)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if time.monotonic() - start + delay > policy.budget_s:
+                raise
+
+            span = current_span()
+            if span is not None:
+                span.set(**{f"{operation}_retries": attempt})
+            print(f"{operation} attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+            sleep(delay)
+
+            if ambiguous and reconcile is not None:
+                try:
+                    recovered = reconcile()
+                except Exception as reconcile_error:
+                    # Can't tell whether the earlier attempt took effect; retrying is the only option
+                    print(f"{operation}: reconcile failed ({reconcile_error}); treating as not found")
+                    recovered = None
+                if recovered is not None:
+                    print(f"{operation}: earlier attempt succeeded server-side; not retrying")
+                    return recovered
@@ -0,0 +1,183 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "pandas",
+#   "woodwide",
+# ]
+# ///
+# retry_standin_check.py
+#
+# Failure-injection check for the retry path (retry_policy.py) and the
+# idempotent training start in train_model, run against the local stand-in
+# (woodwide_standin.py):
+#
+#   fail_first    the first train posts are refused with 503; train_model
+#                 retries exactly that many times and one model exists
+#   ambiguous     train posts are processed, then answered 503, and the
+#                 stand-in ignores Idempotency-Key and sends naive
+#                 timestamps; reconcile must find the started model, so
+#                 exactly one model exists
+#   retry_after   a rate-limited stand-in answers 429 + Retry-After; no
+#                 backoff sleep is shorter than the advertised delay
+#
+#   python retry_standin_check.py
+#
+# Exits non-zero on the first failed check. Backoff delays are shortened so
+# the whole run takes a few seconds.
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+from woodwide import WoodWide
+
+import retry_policy
+from rate_limiter import configure_limiter
+from retry_policy import RetryPolicy, call_with_retry, parse_retry_after
+from script_loader import load_script
+from stage_timing import StageTracer, stage_span
+from woodwide_standin import StandinConfig, run_standin_server
+
+DATASET_NAME = "retry_check"
+MODEL_NAME = "retry_check_model"
+LABEL_COLUMN = "monthly_usage_units"
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Check WoodWide retries against the local stand-in")
+    parser.add_argument("--fail-first", type=int, default=2, help="Train posts refused before one succeeds")
+    parser.add_argument("--ambiguous-failure-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0, help="Stand-in seed for the ambiguous check")
+    parser.add_argument("--rate-limit", type=float, default=5.0, help="Stand-in requests/second for the Retry-After check")
+    return parser.parse_args()
+
+
+def _fast_policies() -> None:
+    """Same attempt counts, millisecond delays; the checks are about counts, not timing."""
+    for op, policy in list(retry_policy.DEFAULT_POLICIES.items()):
+        retry_policy.DEFAULT_POLICIES[op] = RetryPolicy(
+            max_attempts=max(policy.max_attempts, 6), base_delay_s=0.01, max_delay_s=0.05, budget_s=30.0
+        )
+
+
+def _write_dataset(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"medicine_id_ndc,ending_inventory_units,{LABEL_COLUMN}\n")
+        for i in range(50):
+            f.write(f"00000-{i:04d}-01,{100 + i},{10 + i % 7}\n")
+
+
+def _check(condition: bool, message: str) -> None:
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def _train_once(config: StandinConfig, data_path: str) -> tuple[str, dict[str, Any], dict[str, Any]]:
+    """Upload + train against a fresh stand-in; returns (model_id, train span attributes, stand-in stats)."""
+    model_script = load_script("prediction-model.py")
+    tracer = StageTracer()
+    with run_standin_server(config) as srv:
+        client = WoodWide(api_key="check", base_url=srv.base_url, max_retries=0)
+        with tracer.activate(), stage_span("check"):
+            model_script.upload_dataset(client, data_path, DATASET_NAME)
+            model_id = model_script.train_model(
+                client=client,
+                dataset_name=DATASET_NAME,
+                model_name=MODEL_NAME,
+                usecase="prediction",
+                label_column=LABEL_COLUMN,
+            )
+        stats = srv.state.stats()
+        model_ids = list(srv.state.models)
+    train_span = next(s for s in tracer.spans if s.name == "train_request")
+    stats["model_ids"] = model_ids
+    return model_id, train_span.attributes, stats
+
+
+def check_fail_first(data_path: str, fail_first: int) -> None:
+    print(f"fail_first={fail_first}")
+    model_id, attrs, stats = _train_once(StandinConfig(fail_first=fail_first, training_duration_s=0.1), data_path)
+    train_posts = stats["routes"].get("POST /api/models/prediction/train", 0)
+    _check(attrs.get("train_retries") == fail_first, f"train retried {attrs.get('train_retries')} times")
+    _check(train_posts == fail_first + 1, f"{train_posts} train posts reached the stand-in")
+    _check(stats["model_ids"] == [model_id], f"exactly one model created ({len(stats['model_ids'])})")
+
+
+def check_ambiguous(data_path: str, rate: float, seed: int) -> None:
+    print(f"ambiguous_failure_rate={rate} seed={seed} (no idempotency keys, naive timestamps)")
+    config = StandinConfig(
+        ambiguous_failure_rate=rate,
+        honor_idempotency_keys=False,
+        naive_timestamps=True,
+        training_duration_s=0.1,
+        seed=seed,
+    )
+    model_id, attrs, stats = _train_once(config, data_path)
+    train_posts = stats["routes"].get("POST /api/models/prediction/train", 0)
+    _check(attrs.get("train_retries", 0) >= 1, f"first train post failed after processing ({attrs.get('train_retries', 0)} retries)")
+    _check(train_posts == 1, f"reconcile found the started model instead of posting again ({train_posts} posts)")
+    _check(stats["model_ids"] == [model_id], f"exactly one model created ({len(stats['model_ids'])})")
+
+
+def check_retry_after(rate_limit: float) -> None:
+    print(f"rate_limit={rate_limit} rps, burst 1")
+    advertised: list[float] = []
+    slept: list[float] = []
+
+    def _sleep(delay: float) -> None:
+        slept.append(delay)
+        time.sleep(delay)
+
+    with run_standin_server(StandinConfig(rate_limit_rps=rate_limit, rate_limit_burst=1)) as srv:
+        client = WoodWide(api_key="check", base_url=srv.base_url, max_retries=0)
+
+        def _list() -> Any:
+            try:
+                return client.api.models.list()
+            except Exception as e:
+                response = getattr(e, "response", None)
+                if response is not None and response.status_code == 429:
+                    advertised.append(parse_retry_after(response.headers.get("Retry-After")))
+                raise
+
+        for _ in range(6):
+            call_with_retry("retrieve", _list, sleep=_sleep)
+        throttled = srv.state.stats()["statuses"].get("429", 0)
+
+    _check(throttled > 0 and len(advertised) == throttled, f"{throttled} requests throttled with Retry-After")
+    _check(len(slept) == len(advertised), f"one backoff sleep per 429 ({len(slept)})")
+    short = [(s, a) for s, a in zip(slept, advertised) if a is None or s < a]
+    _check(not short, "every sleep honoured Retry-After" + (f" (short: {short})" if short else ""))
+
+
+def run_checks(args) -> None:
+    checks: list[tuple[str, Callable[[], None]]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "retry_check.csv")
+        _write_dataset(data_path)
+        checks = [
+            ("fail_first", lambda: check_fail_first(data_path, args.fail_first)),
+            ("ambiguous", lambda: check_ambiguous(data_path, args.ambiguous_failure_rate, args.seed)),
+            ("retry_after", lambda: check_retry_after(args.rate_limit)),
+        ]
+        for _, check in checks:
+            check()
+    print(f"\nAll {len(checks)} retry checks passed")
+
+
+def main():
+    args = setup_args()
+    # The host-wide limiter would add its own waits and share state with real runs
+    configure_limiter(None)
+    _fast_policies()
+    run_checks(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# run_checkpoint.py
+#
+# Stage checkpoints for woodwide_run, so a run that dies after uploading or
+# while training can pick up where it stopped instead of re-uploading and
+# retraining. One small JSON file per run in the checkpoint directory.
+#
+# A partitioned run writes a parent checkpoint listing its segment run ids;
+# each segment is a checkpointed run of its own whose prepared split files
+# are kept next to its checkpoint until both datasets are uploaded. Resuming
+# the parent resumes every segment; a segment can also be resumed alone.
+#
+#   python run_checkpoint.py list
+#   python run_checkpoint.py resume <run_id>
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+CHECKPOINT_DIR_ENV = "WOODWIDE_CHECKPOINT_DIR"
+DEFAULT_CHECKPOINT_DIR = ".woodwide_runs"
+
+# In order; a run has completed every stage up to and including `stage`
+STAGES = (
+    "created",
+    "prepared",
+    "uploaded_train",
+    "uploaded_test",
+    "training_started",
+    "trained",
+    "complete",
+)
+
+
+@dataclass
+class RunCheckpoint:
+    run_id: str
+    usecase: str
+    params: dict[str, Any]  # woodwide_run arguments, minus secrets and live objects
+    stage: str = "created"
+    status: str = "running"  # running | failed | complete
+    label_column: Optional[str] = None
+    train_split_sha256: str = ""
+    test_split_sha256: str = ""
+    train_dataset_id: str = ""
+    test_dataset_id: str = ""
+    model_id: str = ""
+    segments: dict[str, str] = field(default_factory=dict)  # partitioned runs: segment -> run id
+    drift_profile: Optional[dict[str, Any]] = None  # drift.DriftProfile of the train split, registered once trained
+    reused_model: bool = False  # drift gate found the data stable: model_id is the registered model, not trained here
+    error: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CheckpointStore:
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = root or os.getenv(CHECKPOINT_DIR_ENV) or DEFAULT_CHECKPOINT_DIR
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.root, f"{run_id}.json")
+
+    def exists(self, run_id: str) -> bool:
+        return os.path.exists(self._path(run_id))
+
+    def split_paths(self, run_id: str) -> tuple[str, str]:
+        """Where a segment run keeps its train/test splits so it can resume without the parent."""
+        return os.path.join(self.root, f"{run_id}_train.csv"), os.path.join(self.root, f"{run_id}_test.csv")
+
+    def remove_splits(self, run_id: str) -> None:
+        for path in self.split_paths(run_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def save(self, checkpoint: RunCheckpoint) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        checkpoint.updated_at = time.time()
+        path = self._path(checkpoint.run_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(checkpoint), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, run_id: str) -> RunCheckpoint:
+        path = self._path(run_id)
+        if not os.path.exists(path):
+            raise ValueError(f"No checkpoint for run '{run_id}' in {self.root}")
+        with open(path, "r", encoding="utf-8") as f:
+            return RunCheckpoint(**json.load(f))
+
+    def list(self) -> list[RunCheckpoint]:
+        if not os.path.isdir(self.root):
+            return []
+        runs = [
+            self.load(name[: -len(".json")])
+            for name in os.listdir(self.root)
+            if name.endswith(".json")
+        ]
+        return sorted(runs, key=lambda c: c.updated_at)
+
+    def advance(self, checkpoint: RunCheckpoint, stage: str, **fields: Any) -> None:
+        """Mark `stage` complete, update fields and persist immediately."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'. Expected one of: {STAGES}")
+        for k, v in fields.items():
+            setattr(checkpoint, k, v)
+        checkpoint.stage = stage
+        self.save(checkpoint)
+
+    def record_splits(self, checkpoint: RunCheckpoint, train_path: str, test_path: str) -> None:
+        """
+        Store split hashes. If the splits differ from the ones already uploaded
+        (source data changed), the uploaded datasets are stale: roll back so
+        they are uploaded again.
+        """
+        train_sha, test_sha = file_sha256(train_path), file_sha256(test_path)
+        stage = checkpoint.stage if checkpoint.reached("prepared") else "prepared"
+        if checkpoint.reached("uploaded_train") and (
+            train_sha != checkpoint.train_split_sha256 or test_sha != checkpoint.test_split_sha256
+        ):
+            print("Prepared splits changed since the checkpoint; re-uploading datasets.")
+            checkpoint.train_dataset_id = checkpoint.test_dataset_id = checkpoint.model_id = ""
+            checkpoint.reused_model = False
+            stage = "prepared"
+        self.advance(checkpoint, stage, train_split_sha256=train_sha, test_split_sha256=test_sha)
+
+    def fail(self, checkpoint: RunCheckpoint, error: BaseException) -> None:
+        checkpoint.status = "failed"
+        checkpoint.error = f"{type(error).__name__}: {error}"
+        self.save(checkpoint)
+
+
+# -------------------------
+# Resume
+# -------------------------
+
+def resume(
+    run_id: str,
+    *,
+    api_key: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    **overrides: Any,
+) -> Any:
+    """
+    Continue a checkpointed run from its last completed stage. The API key is
+    never stored, so it comes from `api_key` or WOODWIDE_API_KEY.
+    """
+    from script_loader import load_runner
+
+    checkpoint = CheckpointStore(checkpoint_dir).load(run_id)
+    api_key = api_key or os.getenv("WOODWIDE_API_KEY")
+    if not api_key:
+        raise ValueError("api_key is required to resume (or set WOODWIDE_API_KEY)")
+
+    woodwide_run = load_runner(checkpoint.usecase)
+    params = {**checkpoint.params, **overrides}
+    return woodwide_run(
+        api_key=api_key,
+        run_id=run_id,
+        checkpoint_dir=checkpoint_dir,
+        resume=True,
+        **params,
+    )
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Inspect and resume checkpointed WoodWide runs")
+    parser.add_argument("--checkpoint-dir", help=f"Checkpoint directory (default: ${CHECKPOINT_DIR_ENV} or {DEFAULT_CHECKPOINT_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List checkpointed runs")
+    resume_parser = sub.add_parser("resume", help="Resume a run from its last completed stage")
+    resume_parser.add_argument("run_id")
+    resume_parser.add_argument("-k", "--api-key", help="Woodwide API Key (default: $WOODWIDE_API_KEY)")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    store = CheckpointStore(args.checkpoint_dir)
+
+    if args.command == "list":
+        for cp in store.list():
+            updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cp.updated_at))
+            print(f"{cp.run_id}  {cp.usecase:<11} {cp.stage:<17} {cp.status:<9} {updated}  {cp.error or ''}")
+        return
+
+    try:
+        result = resume(args.run_id, api_key=args.api_key, checkpoint_dir=args.checkpoint_dir)
+    except Exception as e:
+        print(f"Error: {type(e).__name__}: {e}")
+        sys.exit(1)
+    print(f"\n✓ Run {args.run_id} completed. Model ID: {result.model_id}")
+
+
+if __name__ == "__main__":
+    main()
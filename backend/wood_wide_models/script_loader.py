@@ -0,0 +1,64 @@
+# script_loader.py
+#
+# The pipeline scripts use hyphenated filenames (prediction-model.py, ...),
+# which the regular import statement can't reach. This loads them by path.
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+SCRIPTS_DIR = Path(__file__).parent
+
+# Reentrant: a script may load another script while it is being imported
+_load_lock = threading.RLock()
+
+# Which script implements woodwide_run for each use case
+USECASE_SCRIPTS = {
+    "prediction": "prediction-model.py",
+    "clustering": "prediction-model.py",
+    "anomaly": "anomaly-model.py",
+    "embedding": "anomaly-model.py",
+}
+
+
+def load_script(filename: str) -> ModuleType:
+    """
+    Import a script in this directory by filename and cache it in sys.modules
+    under its underscored name (prediction-model.py -> prediction_model).
+    """
+    module_name = Path(filename).stem.replace("-", "_")
+    # Held for the whole import so concurrent callers never see a half-executed module
+    with _load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        path = SCRIPTS_DIR / filename
+        if not path.exists():
+            raise FileNotFoundError(f"Script not found: {path}")
+
+        # Scripts import their sibling modules by bare name
+        if str(SCRIPTS_DIR) not in sys.path:
+            sys.path.insert(0, str(SCRIPTS_DIR))
+
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+
+def load_runner(usecase: str) -> Callable[..., object]:
+    """Return the woodwide_run implementation that handles `usecase`."""
+    script = USECASE_SCRIPTS.get(usecase)
+    if script is None:
+        raise ValueError(f"Unknown usecase '{usecase}'. Expected one of: {sorted(USECASE_SCRIPTS)}")
+    return load_script(script).woodwide_run
@@ -0,0 +1,97 @@
+# singleflight.py
+#
+# Coalesce identical concurrent calls: while a call for `key` is in flight,
+# further callers with the same key wait for it and get its result (or its
+# exception) instead of issuing their own request. Threads and asyncio tasks
+# share the same in-flight entry, so a dashboard refresh on the event loop
+# and a scheduled job in a worker thread still make a single API call.
+#
+#   result, shared = flight("inference").do(key, lambda: expensive(key))
+#   result, shared = await flight("inference").do_async(key, lambda: expensive(key))
+#
+# Only concurrent calls are merged; nothing is cached once the call returns.
+# Coalesced callers receive the same result object and must not mutate it.
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0  # calls actually executed
+        self.coalesced = 0  # callers served by another caller's in-flight call
+
+    def _claim(self, key: Hashable) -> tuple[Future, bool]:
+        """Return (future, leader). The leader is the caller that must run the call."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.calls += 1
+            return future, True
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[[], T]) -> None:
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+        else:
+            # Forget the key before publishing so a later caller starts a fresh call
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """Run fn once per concurrent key. Returns (result, shared)."""
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result(), not leader
+
+    async def do_async(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Async variant: the leader runs the blocking fn in the loop's default
+        executor (with the caller's context, so stage spans nest correctly).
+        """
+        future, leader = self._claim(key)
+        if leader:
+            ctx = contextvars.copy_context()
+            asyncio.get_running_loop().run_in_executor(None, ctx.run, self._run, key, future, fn)
+        return await asyncio.wrap_future(future), not leader
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+_flights: dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def flight(name: str) -> SingleFlight:
+    """Process-wide SingleFlight group for `name` (e.g. "inference")."""
+    with _flights_lock:
+        group = _flights.get(name)
+        if group is None:
+            group = _flights[name] = SingleFlight()
+        return group
+
+
+def flight_stats() -> dict[str, dict[str, Any]]:
+    with _flights_lock:
+        groups = dict(_flights)
+    return {name: group.stats() for name, group in groups.items()}
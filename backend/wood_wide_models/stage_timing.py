@@ -0,0 +1,377 @@
+# stage_timing.py
+#
+# Lightweight nested timing spans for pipeline stages (upload, training
+# request, training wait, inference, ...). Spans use the monotonic clock,
+# carry bytes/rows/status attributes, and export to JSONL (one span per line,
+# appended across runs) and Prometheus text format. The Prometheus file
+# accumulates across runs too: each export adds its counts to the ones
+# already in the file, so histogram buckets and counters never go down.
+#
+#   tracer = StageTracer(run_id="nightly-2025-01-01")
+#   with tracer.activate(), stage_span("woodwide_run", usecase="prediction"):
+#       with stage_span("upload", bytes=1234) as span:
+#           ...
+#           span.set(rows=960)
+#   tracer.export(jsonl_path="stage_spans.jsonl")
+
+from __future__ import annotations
+
+import argparse
+import contextvars
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are not serialized across processes
+    fcntl = None
+
+SPANS_FILE_ENV = "WOODWIDE_SPANS_FILE"
+METRICS_FILE_ENV = "WOODWIDE_METRICS_FILE"
+
+# Seconds; remote training waits can take many minutes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+@dataclass
+class Span:
+    name: str
+    run_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_unix: float  # wall clock, for charting only
+    duration_s: float = 0.0
+    status: str = "ok"
+    attributes: dict[str, Any] = field(default_factory=dict)
+    _start_mono: float = field(default=0.0, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def elapsed(self) -> float:
+        """Seconds since the span started (monotonic), usable while it is open."""
+        return time.monotonic() - self._start_mono
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out.pop("_start_mono")
+        return out
+
+
+class StageTracer:
+    """Collects finished spans for one pipeline run."""
+
+    def __init__(self, run_id: Optional[str] = None) -> None:
+        self.run_id = run_id or uuid.uuid4().hex[:16]
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def activate(self) -> Iterator["StageTracer"]:
+        """Make this tracer receive every stage_span opened in this context."""
+        token = _active_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _active_tracer.reset(token)
+
+    def export(
+        self,
+        *,
+        jsonl_path: Optional[str] = None,
+        prometheus_path: Optional[str] = None,
+    ) -> None:
+        """
+        Append spans to `jsonl_path` and write Prometheus text to
+        `prometheus_path`. Each falls back to its env var when not given.
+        """
+        jsonl_path = jsonl_path or os.getenv(SPANS_FILE_ENV)
+        prometheus_path = prometheus_path or os.getenv(METRICS_FILE_ENV)
+        with self._lock:
+            spans = list(self.spans)
+        if jsonl_path:
+            append_spans_jsonl(jsonl_path, spans)
+        if prometheus_path:
+            write_prometheus(prometheus_path, spans)
+
+
+_active_tracer: contextvars.ContextVar[Optional[StageTracer]] = contextvars.ContextVar(
+    "woodwide_active_tracer", default=None
+)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "woodwide_current_span", default=None
+)
+
+
+def current_tracer() -> Optional[StageTracer]:
+    return _active_tracer.get()
+
+
+def current_span() -> Optional[Span]:
+    """Innermost open span in this context, for attaching attributes from helpers."""
+    return _current_span.get()
+
+
+@contextmanager
+def stage_span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage. Nested calls become child spans. Without an active tracer
+    the span is still timed (callers print `span.duration_s`) but not kept.
+    Exceptions mark the span status "error" and are re-raised.
+    """
+    tracer = _active_tracer.get()
+    parent = _current_span.get()
+    span = Span(
+        name=name,
+        run_id=tracer.run_id if tracer else (parent.run_id if parent else ""),
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_unix=time.time(),
+        _start_mono=time.monotonic(),
+    )
+    span.set(**attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set(error=type(e).__name__)
+        raise
+    finally:
+        span.duration_s = span.elapsed()
+        _current_span.reset(token)
+        if tracer is not None:
+            tracer.record(span)
+
+
+# -------------------------
+# Export
+# -------------------------
+
+def append_spans_jsonl(path: str, spans: Iterable[Span]) -> None:
+    lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def load_spans_jsonl(path: str) -> list[dict[str, Any]]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def _as_dicts(spans: Iterable[Span | dict[str, Any]]) -> list[dict[str, Any]]:
+    return [s.to_dict() if isinstance(s, Span) else s for s in spans]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(
+    spans: Iterable[Span | dict[str, Any]],
+    *,
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+    prefix: str = "woodwide",
+) -> str:
+    """Render stage durations as a Prometheus histogram plus byte/row counters."""
+    by_stage: dict[tuple[str, str], list[float]] = defaultdict(list)
+    bytes_total: dict[str, float] = defaultdict(float)
+    rows_total: dict[str, float] = defaultdict(float)
+
+    for s in _as_dicts(spans):
+        by_stage[(s["name"], s["status"])].append(float(s["duration_s"]))
+        attrs = s.get("attributes") or {}
+        if isinstance(attrs.get("bytes"), (int, float)):
+            bytes_total[s["name"]] += attrs["bytes"]
+        if isinstance(attrs.get("rows"), (int, float)):
+            rows_total[s["name"]] += attrs["rows"]
+
+    metric = f"{prefix}_stage_duration_seconds"
+    lines = [
+        f"# HELP {metric} Duration of pipeline stages.",
+        f"# TYPE {metric} histogram",
+    ]
+    for (stage, status), durations in sorted(by_stage.items()):
+        labels = f'stage="{_escape_label(stage)}",status="{_escape_label(status)}"'
+        for le in buckets:
+            count = sum(1 for d in durations if d <= le)
+            lines.append(f'{metric}_bucket{{{labels},le="{le:g}"}} {count}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {len(durations)}')
+        lines.append(f"{metric}_sum{{{labels}}} {sum(durations):.6f}")
+        lines.append(f"{metric}_count{{{labels}}} {len(durations)}")
+
+    for name, totals, help_text in (
+        (f"{prefix}_stage_bytes_total", bytes_total, "Bytes processed by pipeline stages."),
+        (f"{prefix}_stage_rows_total", rows_total, "Rows processed by pipeline stages."),
+    ):
+        if totals:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for stage, total in sorted(totals.items()):
+                lines.append(f'{name}{{stage="{_escape_label(stage)}"}} {_format_value(total)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    # Exact for counts and byte totals; %g would round them to 6 digits
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+_SAMPLE_RE = re.compile(r"^(?P<series>[A-Za-z_:][A-Za-z0-9_:]*(?:\{.*\})?)\s+(?P<value>\S+)$")
+
+
+def _parse_prometheus(text: str) -> dict[str, tuple[list[str], dict[str, float]]]:
+    """Prometheus text -> {family: (HELP/TYPE lines, {series: value})}, in file order."""
+    families: dict[str, tuple[list[str], dict[str, float]]] = {}
+    current: Optional[str] = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith(("# HELP ", "# TYPE ")):
+            current = line.split()[2]
+            header, _ = families.setdefault(current, ([], {}))
+            if line not in header:
+                header.append(line)
+            continue
+        match = _SAMPLE_RE.match(line)
+        if match is None or current is None:
+            continue
+        try:
+            families[current][1][match["series"]] = float(match["value"])
+        except ValueError:
+            continue
+    return families
+
+
+def merge_prometheus(existing: str, new: str) -> str:
+    """
+    Add the samples of `new` to the matching series of `existing`. Every
+    series this module writes is cumulative (buckets, sums, counts, totals),
+    so adding keeps them monotonic across runs; series only in one side are
+    kept as they are.
+    """
+    merged = _parse_prometheus(existing)
+    for family, (header, samples) in _parse_prometheus(new).items():
+        merged_header, merged_samples = merged.setdefault(family, ([], {}))
+        merged_header.extend(line for line in header if line not in merged_header)
+        for series, value in samples.items():
+            merged_samples[series] = merged_samples.get(series, 0.0) + value
+
+    lines = []
+    for header, samples in merged.values():
+        lines.extend(header)
+        lines.extend(f"{series} {_format_value(value)}" for series, value in samples.items())
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, spans: Iterable[Span | dict[str, Any]], *, accumulate: bool = True) -> None:
+    """
+    Export `spans` to `path`. By default their counts are added to what the
+    file already holds (see merge_prometheus); accumulate=False replaces it,
+    e.g. when `spans` already is the complete history from a JSONL file.
+    """
+    text = to_prometheus(spans)
+    directory = os.path.dirname(path) or "."
+    # The read-merge-write is serialized across threads and processes by an
+    # flock on a sidecar file; the data file itself is replaced atomically, so
+    # a textfile collector never reads a partial file.
+    lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        if accumulate:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    text = merge_prometheus(f.read(), text)
+            except FileNotFoundError:
+                pass
+        # Unique temp name: concurrent runs must not write into each other's file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    finally:
+        os.close(lock_fd)  # releases the flock
+
+
+# -------------------------
+# Aggregation
+# -------------------------
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    pos = (len(sorted_values) - 1) * q
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def stage_quantiles(
+    spans: Iterable[Span | dict[str, Any]],
+    quantiles: Sequence[float] = (0.5, 0.95),
+) -> dict[str, dict[str, float]]:
+    """Per-stage count, error count and duration quantiles (e.g. p50/p95)."""
+    durations: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    for s in _as_dicts(spans):
+        durations[s["name"]].append(float(s["duration_s"]))
+        if s["status"] != "ok":
+            errors[s["name"]] += 1
+
+    out = {}
+    for stage, values in sorted(durations.items()):
+        values.sort()
+        row = {"count": float(len(values)), "errors": float(errors[stage])}
+        for q in quantiles:
+            row[f"p{round(q * 100):d}"] = _quantile(values, q)
+        out[stage] = row
+    return out
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Summarize stage spans collected across pipeline runs")
+    parser.add_argument("spans_file", help="JSONL file written by StageTracer.export")
+    parser.add_argument("--prometheus", help="Also write Prometheus text for all spans to this path (replaces the file)")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    spans = load_spans_jsonl(args.spans_file)
+    print(f"{'stage':<20} {'count':>7} {'errors':>7} {'p50_s':>10} {'p95_s':>10}")
+    for stage, row in stage_quantiles(spans).items():
+        print(f"{stage:<20} {int(row['count']):>7} {int(row['errors']):>7} {row['p50']:>10.3f} {row['p95']:>10.3f}")
+    if args.prometheus:
+        # The JSONL already holds every run; adding it to the file would double count
+        write_prometheus(args.prometheus, spans, accumulate=False)
+        print(f"Prometheus metrics written to {args.prometheus}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "numpy",
+#   "pandas",
+# ]
+# ///
+# synthetic_inventory.py
+#
+# Seeded, vectorized generator for inventory timeseries shaped like
+# mock_medicine_inventory_timeseries.csv, used for load and scaling tests.
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from inventory_schema import MONTH_COLUMN, NDC_COLUMN, STATIC_COLUMNS
+
+TEMPLATE_PATH = Path(__file__).parent / "mock_medicine_inventory_timeseries.csv"
+
+ANOMALY_LABEL_COLUMN = "injected_anomaly"
+
+COLUMNS = [
+    NDC_COLUMN,
+    MONTH_COLUMN,
+    "generic_medicine_name",
+    "brand_name",
+    "manufacturer_name",
+    "dosage_amount",
+    "dosage_unit",
+    "medication_form",
+    "order_unit_description",
+    "units_per_order_unit",
+    "is_order_unit_openable",
+    "price_per_unit_usd",
+    "beginning_inventory_units",
+    "units_received_this_month",
+    "ending_inventory_units",
+    "restock_events_count",
+    "units_used_this_month",
+    "average_daily_usage_units",
+    "monthly_usage_trend",
+    "usage_variability_flag",
+    "currently_backordered",
+    "available_suppliers",
+    "historically_stocked",
+]
+
+# Month-over-month usage change that flips the trend label (matches the mock data)
+TREND_THRESHOLD = 0.10
+
+
+# -------------------------
+# Template
+# -------------------------
+
+def load_product_template(template_path: str | os.PathLike = TEMPLATE_PATH) -> pd.DataFrame:
+    """
+    One row per template NDC: its static attributes plus the mean monthly
+    usage, which seeds the usage level of every synthetic product drawn from it.
+    """
+    df = pd.read_csv(template_path, dtype={NDC_COLUMN: str})
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Template is missing columns: {missing}")
+
+    grouped = df.groupby(NDC_COLUMN, sort=False)
+    template = grouped[STATIC_COLUMNS].first()
+    template["base_usage"] = grouped["units_used_this_month"].mean()
+    template["available_suppliers"] = template["available_suppliers"].fillna("")
+    return template.reset_index(drop=True)
+
+
+# -------------------------
+# Generation
+# -------------------------
+
+def _format_ndcs(ndc_index: np.ndarray, package: np.ndarray) -> np.ndarray:
+    # 5-4-2 NDC layout; unique for the first 900M products
+    labeler = pd.Series(10000 + ndc_index // 10000).astype(str)
+    product = pd.Series(ndc_index % 10000).astype(str).str.zfill(4)
+    pkg = pd.Series(package).astype(str).str.zfill(2)
+    return (labeler + "-" + product + "-" + pkg).to_numpy()
+
+
+def generate_inventory_chunk(
+    template: pd.DataFrame,
+    *,
+    ndc_start: int,
+    n_ndcs: int,
+    months: pd.PeriodIndex,
+    rng: np.random.Generator,
+    anomaly_rate: float = 0.005,
+    backorder_rate: float = 0.012,
+    include_anomaly_labels: bool = False,
+) -> pd.DataFrame:
+    """
+    Generate `n_ndcs` products x `len(months)` months in long format, ordered
+    by NDC then month like the mock dataset. All per-cell work is done on
+    (n_ndcs, n_months) arrays; only the inventory ledger walks the months.
+    """
+    n, m = n_ndcs, len(months)
+
+    # Static attributes: bootstrap template products, jitter the price
+    static = template.iloc[rng.integers(0, len(template), n)].reset_index(drop=True)
+    static["price_per_unit_usd"] = np.round(
+        static["price_per_unit_usd"].to_numpy() * rng.lognormal(0.0, 0.1, n), 2
+    )
+    ndcs = _format_ndcs(np.arange(ndc_start, ndc_start + n), rng.integers(0, 100, n))
+
+    # Usage = level * drift * seasonality * noise
+    base = static["base_usage"].to_numpy() * rng.lognormal(0.0, 0.35, n)
+    t = np.arange(m)
+    drift = np.exp(np.outer(rng.normal(0.0, 0.015, n), t))
+    amplitude, phase = rng.uniform(0.0, 0.2, n), rng.uniform(0, 12, n)
+    season = 1.0 + amplitude[:, None] * np.sin(
+        2 * np.pi * (months.month.to_numpy()[None, :] + phase[:, None]) / 12
+    )
+    sigma = np.where(static["usage_variability_flag"].to_numpy(bool), 0.25, 0.08)
+    noise = rng.lognormal(0.0, 1.0, (n, m)) ** sigma[:, None]
+    demand = base[:, None] * drift * season * noise
+
+    # Injected anomalies: spikes (x3-x8) and collapses (x0-x0.2)
+    anomalies = rng.random((n, m)) < anomaly_rate
+    spike = rng.random((n, m)) < 0.5
+    factor = np.where(spike, rng.uniform(3.0, 8.0, (n, m)), rng.uniform(0.0, 0.2, (n, m)))
+    demand = np.where(anomalies, demand * factor, demand)
+    demand = np.rint(demand).astype(np.int64)
+
+    backordered = rng.random((n, m)) < backorder_rate
+
+    # Inventory ledger: reorder up to a per-product cover target in whole order units
+    per_order = static["units_per_order_unit"].to_numpy(np.int64)
+    cover = rng.uniform(0.7, 2.0, n)
+    target = base * cover
+    beginning = np.empty((n, m), dtype=np.int64)
+    received = np.empty((n, m), dtype=np.int64)
+    used = np.empty((n, m), dtype=np.int64)
+    on_hand = np.rint(base * rng.uniform(0.7, 2.8, n)).astype(np.int64)
+    for j in range(m):
+        beginning[:, j] = on_hand
+        shortfall = np.maximum(target + demand[:, j] - on_hand, 0.0)
+        order = np.ceil(shortfall / per_order).astype(np.int64) * per_order
+        # Backordered months only receive a partial fill, if anything
+        order = np.where(backordered[:, j], (order * rng.uniform(0.0, 0.3, n)).astype(np.int64), order)
+        received[:, j] = order
+        used[:, j] = np.minimum(demand[:, j], on_hand + order)
+        on_hand = on_hand + order - used[:, j]
+    ending = beginning + received - used
+
+    restocks = np.where(received > 0, rng.choice([1, 2, 3, 4, 5], (n, m), p=[0.06, 0.12, 0.36, 0.26, 0.20]), 0)
+    days = months.days_in_month.to_numpy()
+    average_daily = np.rint(used / days[None, :]).astype(np.int64)
+
+    prev = np.concatenate([used[:, :1], used[:, :-1]], axis=1).astype(float)
+    change = np.divide(used - prev, prev, out=np.zeros((n, m)), where=prev > 0)
+    trend = np.full((n, m), "stable", dtype=object)
+    trend[change > TREND_THRESHOLD] = "increasing"
+    trend[change < -TREND_THRESHOLD] = "decreasing"
+
+    data: dict[str, np.ndarray] = {
+        NDC_COLUMN: np.repeat(ndcs, m),
+        MONTH_COLUMN: np.tile(months.strftime("%Y-%m").to_numpy(), n),
+    }
+    for col in STATIC_COLUMNS:
+        data[col] = np.repeat(static[col].to_numpy(), m)
+    data.update({
+        "beginning_inventory_units": beginning.ravel(),
+        "units_received_this_month": received.ravel(),
+        "ending_inventory_units": ending.ravel(),
+        "restock_events_count": restocks.ravel(),
+        "units_used_this_month": used.ravel(),
+        "average_daily_usage_units": average_daily.ravel(),
+        "monthly_usage_trend": trend.ravel(),
+        "currently_backordered": backordered.ravel(),
+    })
+
+    df = pd.DataFrame(data, columns=COLUMNS)
+    if include_anomaly_labels:
+        df[ANOMALY_LABEL_COLUMN] = anomalies.ravel()
+    return df
+
+
+def iter_synthetic_inventory(
+    *,
+    n_ndcs: int,
+    n_months: int,
+    start_month: str = "2021-01",
+    seed: int = 42,
+    chunk_ndcs: int = 10_000,
+    anomaly_rate: float = 0.005,
+    backorder_rate: float = 0.012,
+    include_anomaly_labels: bool = False,
+    template_path: str | os.PathLike = TEMPLATE_PATH,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the dataset in chunks of `chunk_ndcs` products. Each chunk draws from
+    its own stream derived from (seed, chunk index), so output is identical
+    across runs for the same seed and chunk size.
+    """
+    if n_ndcs <= 0 or n_months <= 0:
+        raise ValueError("n_ndcs and n_months must be positive")
+    if chunk_ndcs <= 0:
+        raise ValueError("chunk_ndcs must be positive")
+
+    template = load_product_template(template_path)
+    months = pd.period_range(start=start_month, periods=n_months, freq="M")
+
+    for chunk_idx, ndc_start in enumerate(range(0, n_ndcs, chunk_ndcs)):
+        rng = np.random.default_rng([seed, chunk_idx])
+        yield generate_inventory_chunk(
+            template,
+            ndc_start=ndc_start,
+            n_ndcs=min(chunk_ndcs, n_ndcs - ndc_start),
+            months=months,
+            rng=rng,
+            anomaly_rate=anomaly_rate,
+            backorder_rate=backorder_rate,
+            include_anomaly_labels=include_anomaly_labels,
+        )
+
+
+def write_synthetic_inventory(
+    out_path: str,
+    *,
+    n_ndcs: int,
+    n_months: int,
+    file_format: Optional[str] = None,
+    **kwargs,
+) -> int:
+    """
+    Stream the generated dataset to CSV or Parquet chunk by chunk, so memory
+    stays bounded by `chunk_ndcs * n_months` rows. Returns the rows written.
+    """
+    fmt = file_format or ("parquet" if out_path.endswith(".parquet") else "csv")
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Unsupported file_format '{fmt}'. Expected 'csv' or 'parquet'.")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+
+    print(f"Generating {n_ndcs} NDCs x {n_months} months -> {out_path} ({fmt})")
+    start = time.time()
+    rows = 0
+    writer = None
+
+    try:
+        for i, chunk in enumerate(
+            iter_synthetic_inventory(n_ndcs=n_ndcs, n_months=n_months, **kwargs)
+        ):
+            if fmt == "csv":
+                chunk.to_csv(out_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            else:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            rows += len(chunk)
+            print(f"  wrote {rows} rows ({time.time() - start:.1f}s)")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Done: {rows} rows in {time.time() - start:.2f}s")
+    return rows
+
+
+# -------------------------
+# CLI
+# -------------------------
+
+def setup_args():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic medicine inventory timeseries for load and scaling tests"
+    )
+    parser.add_argument("-o", "--output-file", default="synthetic_inventory_timeseries.csv",
+                        help="Output path (.csv or .parquet)")
+    parser.add_argument("-n", "--ndcs", type=int, default=100_000, help="Number of NDCs")
+    parser.add_argument("-m", "--months", type=int, default=60, help="Number of months per NDC")
+    parser.add_argument("--start-month", default="2021-01", help="First year_month (YYYY-MM)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--chunk-ndcs", type=int, default=10_000, help="NDCs generated per chunk")
+    parser.add_argument("--anomaly-rate", type=float, default=0.005,
+                        help="Fraction of rows with injected usage anomalies")
+    parser.add_argument("--backorder-rate", type=float, default=0.012,
+                        help="Fraction of rows flagged as backordered")
+    parser.add_argument("--anomaly-labels", action="store_true",
+                        help=f"Add a '{ANOMALY_LABEL_COLUMN}' ground-truth column")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Override output format")
+    parser.add_argument("--template", default=str(TEMPLATE_PATH), help="Template CSV path")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    write_synthetic_inventory(
+        args.output_file,
+        n_ndcs=args.ndcs,
+        n_months=args.months,
+        file_format=args.format,
+        start_month=args.start_month,
+        seed=args.seed,
+        chunk_ndcs=args.chunk_ndcs,
+        anomaly_rate=args.anomaly_rate,
+        backorder_rate=args.backorder_rate,
+        include_anomaly_labels=args.anomaly_labels,
+        template_path=args.template,
+    )
+
+
+if __name__ == "__main__":
+    main()
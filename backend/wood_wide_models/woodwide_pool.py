@@ -0,0 +1,113 @@
+# woodwide_pool.py
+#
+# Process-wide caches shared by every woodwide_run in the same process:
+#   - one long-lived WoodWide client per (base_url, api_key), so repeated runs
+#     reuse the SDK's keep-alive HTTP connection pool instead of a new TLS
+#     handshake per run;
+#   - an opt-in cache of parsed source CSVs keyed by path + mtime + size, so a
+#     resident service doesn't re-parse the same export for every job.
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import pandas as pd
+from woodwide import WoodWide
+
+
+class ClientPool:
+    def __init__(self) -> None:
+        self._clients: dict[tuple[str, str], WoodWide] = {}
+        self._lock = threading.Lock()
+
+    def get(self, *, api_key: str, base_url: str) -> WoodWide:
+        key = (base_url.rstrip("/"), api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                # retry_policy owns retries; stacking the SDK's own would multiply attempts
+                client = WoodWide(api_key=api_key, base_url=base_url, max_retries=0)
+                self._clients[key] = client
+            return client
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"clients": len(self._clients), "base_urls": sorted({k[0] for k in self._clients})}
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+class FrameCache:
+    """Small LRU of parsed CSVs. Callers get a copy, so in-place cleaning is safe."""
+
+    def __init__(self, max_entries: int = 8) -> None:
+        self.max_entries = max_entries
+        self._frames: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read_csv(self, path: str, **read_kwargs: Any) -> pd.DataFrame:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size, tuple(sorted(read_kwargs.items())))
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return df.copy()
+            self.misses += 1
+
+        df = pd.read_csv(path, **read_kwargs)
+        with self._lock:
+            self._frames[key] = df
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return df.copy()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._frames), "hits": self.hits, "misses": self.misses}
+
+
+_client_pool = ClientPool()
+_frame_cache: Optional[FrameCache] = None
+
+
+def get_client(*, api_key: str, base_url: str) -> WoodWide:
+    """Shared client for (base_url, api_key); created on first use."""
+    return _client_pool.get(api_key=api_key, base_url=base_url)
+
+
+def client_pool() -> ClientPool:
+    return _client_pool
+
+
+def enable_frame_cache(max_entries: int = 8) -> FrameCache:
+    """Turn on source CSV caching for this process (used by the service mode)."""
+    global _frame_cache
+    if _frame_cache is None:
+        _frame_cache = FrameCache(max_entries=max_entries)
+    return _frame_cache
+
+
+def frame_cache() -> Optional[FrameCache]:
+    return _frame_cache
+
+
+def read_source_csv(path: str, **read_kwargs: Any) -> pd.DataFrame:
+    """pd.read_csv, served from the frame cache when it is enabled."""
+    if _frame_cache is None:
+        return pd.read_csv(path, **read_kwargs)
+    return _frame_cache.read_csv(path, **read_kwargs)
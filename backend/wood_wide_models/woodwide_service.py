@@ -0,0 +1,361 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#   "pandas",
+#   "woodwide",
+# ]
+# ///
+# woodwide_service.py
+#
+# Resident service mode: one long-lived process that accepts woodwide_run
+# jobs over local HTTP (TCP or unix socket). Python startup, pandas import,
+# TLS handshakes and source CSV parsing are paid once instead of per run;
+# jobs share the pooled clients from woodwide_pool.
+#
+#   POST /jobs        {"usecase": "prediction", "model_name": ..., "dataset_name": ...,
+#                      "data_path": ..., "api_key"?: ..., "base_url"?: ..., ...}
+#                     -> 202 {"job_id": ...}
+#   GET  /jobs        -> all jobs
+#   GET  /jobs/{id}   -> status, timings, result summary or error
+#   GET  /health      -> pool, cache and queue stats
+#
+# The service holds the WOODWIDE_API_KEY, so POSTs must be application/json
+# (a web page can't send that cross-origin without a preflight this server
+# never answers). The service key is only sent to the default base URL or
+# to hosts allowed with --allow-base-url; any other base_url needs the job's
+# own api_key. output_file / spans_file / metrics_file are resolved inside
+# --output-root, and with --data-root so is data_path. Finished jobs beyond
+# --max-jobs are forgotten oldest first.
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Optional
+
+from script_loader import USECASE_SCRIPTS, load_runner, load_script
+from singleflight import flight_stats
+from woodwide_pool import client_pool, enable_frame_cache, frame_cache, get_client
+
+DEFAULT_BASE_URL = "https://beta.woodwide.ai/"
+
+# woodwide_run keyword arguments a job may set
+JOB_PARAMS = {
+    "usecase", "model_name", "dataset_name", "data_path", "output_file",
+    "label_column", "run_id", "spans_file", "metrics_file",
+}
+# Files a job writes; confined to the output root
+OUTPUT_PARAMS = ("output_file", "spans_file", "metrics_file")
+DEFAULT_OUTPUT_ROOT = "woodwide_service_output"
+DEFAULT_MAX_JOBS = 1000
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobQueueFull(RuntimeError):
+    """Every tracked job is still queued or running."""
+
+
+def _path_within(root: str, path: str, field_name: str) -> str:
+    """`path` resolved against `root`; ValueError if it points outside it."""
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError(f"'{field_name}' must stay inside {root}")
+    return full
+
+
+@dataclass
+class Job:
+    id: str
+    params: dict[str, Any]
+    status: str = "queued"  # queued | running | succeeded | failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        params = {k: v for k, v in self.params.items() if k != "api_key"}
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": params,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": (self.finished_at - self.started_at) if self.finished_at and self.started_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        default_api_key: Optional[str],
+        default_base_url: str,
+        allowed_base_urls: Iterable[str] = (),
+        output_root: str = DEFAULT_OUTPUT_ROOT,
+        data_root: Optional[str] = None,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+    ) -> None:
+        self.default_api_key = default_api_key
+        self.default_base_url = default_base_url
+        # Hosts the service's own key may be sent to
+        self.trusted_base_urls = {u.rstrip("/") for u in (default_base_url, *allowed_base_urls)}
+        self.output_root = os.path.realpath(output_root)
+        self.data_root = os.path.realpath(data_root) if data_root else None
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="woodwide-job")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, payload: dict[str, Any]) -> Job:
+        # Any JSON value parses; a list or string would slip through set(payload)
+        if not isinstance(payload, dict):
+            raise ValueError(f"Job payload must be a JSON object, got {type(payload).__name__}")
+        unknown = set(payload) - JOB_PARAMS - {"api_key", "base_url"}
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        for required in ("usecase", "model_name", "dataset_name", "data_path"):
+            if not payload.get(required):
+                raise ValueError(f"'{required}' is required")
+        if payload["usecase"] not in USECASE_SCRIPTS:
+            raise ValueError(f"Unknown usecase '{payload['usecase']}'. Expected one of: {sorted(USECASE_SCRIPTS)}")
+        if not (payload.get("api_key") or self.default_api_key):
+            raise ValueError("api_key is required (or start the service with WOODWIDE_API_KEY set)")
+        base_url = payload.get("base_url")
+        if base_url and not payload.get("api_key") and base_url.rstrip("/") not in self.trusted_base_urls:
+            # Otherwise any caller could have the service key sent to a host of its choosing
+            raise ValueError("A base_url override needs its own api_key (or start the service with --allow-base-url)")
+
+        params = dict(payload)
+        for name in OUTPUT_PARAMS:
+            if params.get(name):
+                params[name] = _path_within(self.output_root, params[name], name)
+        if self.data_root:
+            params["data_path"] = _path_within(self.data_root, params["data_path"], "data_path")
+
+        job = Job(id=uuid.uuid4().hex[:12], params=params)
+        with self._lock:
+            self._evict_finished()
+            if len(self._jobs) >= self.max_jobs:
+                raise JobQueueFull(f"{len(self._jobs)} jobs still queued or running; try again later")
+            self._jobs[job.id] = job
+        if any(params.get(name) for name in OUTPUT_PARAMS):
+            os.makedirs(self.output_root, exist_ok=True)
+        self._executor.submit(self._run, job)
+        return job
+
+    def _evict_finished(self) -> None:
+        """Drop the oldest finished jobs until there is room for one more. Caller holds _lock."""
+        excess = len(self._jobs) - self.max_jobs + 1
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        params = dict(job.params)
+        api_key = params.pop("api_key", None) or self.default_api_key
+        base_url = params.pop("base_url", None) or self.default_base_url
+        work_dir = tempfile.mkdtemp(prefix=f"woodwide_job_{job.id}_")
+
+        job.status = "running"
+        job.started_at = time.time()
+        print(f"[job {job.id}] started: {params['usecase']} on {params['data_path']}")
+        try:
+            woodwide_run = load_runner(params["usecase"])
+            result = woodwide_run(
+                api_key=api_key,
+                base_url=base_url,
+                client=get_client(api_key=api_key, base_url=base_url),
+                work_dir=work_dir,
+                **params,
+            )
+            job.result = {
+                "model_id": result.model_id,
+                "train_dataset_id": result.train_dataset_id,
+                "test_dataset_id": result.test_dataset_id,
+                "label_column": result.label_column,
+                "output_file": params.get("output_file"),
+            }
+            job.status = "succeeded"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            print(f"[job {job.id}] {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self) -> dict[str, Any]:
+        counts: dict[str, int] = {}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# -------------------------
+# HTTP front end
+# -------------------------
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # unix-socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        runner: JobRunner = self.server.runner
+        if self.path == "/health":
+            cache = frame_cache()
+            self._send_json(200, {
+                "status": "ok",
+                "jobs": runner.stats(),
+                "clients": client_pool().stats(),
+                "frame_cache": cache.stats() if cache else None,
+                "singleflight": flight_stats(),
+            })
+        elif self.path == "/jobs":
+            self._send_json(200, [j.to_dict() for j in runner.list()])
+        elif self.path.startswith("/jobs/"):
+            job = runner.get(self.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"detail": "Job not found"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"detail": f"No route for GET {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path != "/jobs":
+            self._send_json(404, {"detail": f"No route for POST {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        # Browsers send text/plain or form posts cross-site without a preflight; JSON they don't
+        if self.headers.get_content_type() != "application/json":
+            self._send_json(415, {"detail": "Content-Type must be application/json"})
+            return
+        try:
+            payload = json.loads(body or b"{}")
+            job = self.server.runner.submit(payload)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"detail": str(e)})
+            return
+        except JobQueueFull as e:
+            self._send_json(503, {"detail": str(e)})
+            return
+        self._send_json(202, {"job_id": job.id, "status": job.status})
+
+
+class TCPServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Resident WoodWide job service with pooled clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--socket", help="Listen on this unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent jobs")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="Default API base URL for jobs")
+    parser.add_argument("--allow-base-url", action="append", default=[],
+                        help="Extra base URL jobs may use with the service's API key (repeatable)")
+    parser.add_argument("--output-root", default=DEFAULT_OUTPUT_ROOT,
+                        help="Directory that job output_file / spans_file / metrics_file paths resolve into")
+    parser.add_argument("--data-root", help="Only accept data_path inside this directory")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS,
+                        help="Jobs kept for GET /jobs; the oldest finished ones are dropped beyond this")
+    parser.add_argument("--frame-cache-size", type=int, default=8, help="Parsed source CSVs kept in memory")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    enable_frame_cache(max_entries=args.frame_cache_size)
+
+    # Pay the heavy imports once, before the first job arrives
+    for script in sorted(set(USECASE_SCRIPTS.values())):
+        load_script(script)
+
+    runner = JobRunner(
+        max_workers=args.workers,
+        default_api_key=os.getenv("WOODWIDE_API_KEY"),
+        default_base_url=args.base_url,
+        allowed_base_urls=args.allow_base_url,
+        output_root=args.output_root,
+        data_root=args.data_root,
+        max_jobs=args.max_jobs,
+    )
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixServiceServer(args.socket, ServiceHandler)
+        where = f"unix:{args.socket}"
+    else:
+        server = TCPServiceServer((args.host, args.port), ServiceHandler)
+        where = f"http://{args.host}:{server.server_address[1]}/"
+    server.runner = runner
+
+    print(f"WoodWide service listening on {where} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        runner.shutdown()
+        client_pool().close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+# /// script
+# requires-python = ">=3.11"
+# ///
+# woodwide_standin.py
+#
+# Local stand-in for the WoodWide API endpoints the pipeline scripts use, so
+# woodwide_run can be benchmarked and failure-tested offline:
+#
+#   POST /api/datasets                               (multipart upload)
+#   GET  /api/datasets, /api/datasets/{id}
+#   POST /api/models/{usecase}/train                 (form or JSON body)
+#   GET  /api/models, /api/models/{id}
+#   POST /api/models/{usecase}/{model_id}/infer
+#   GET  /_standin/stats                             (request counters)
+#
+# Point `base_url` at the address printed on startup. Stdlib only.
+
+from __future__ import annotations
+
+import argparse
+import csv
+import email.parser
+import email.policy
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+USECASES = ("prediction", "clustering", "anomaly", "embedding")
+
+
+@dataclass
+class StandinConfig:
+    training_duration_s: float = 5.0  # PENDING -> COMPLETE after this long
+    latency_s: float = 0.0  # added to every request
+    latency_jitter_s: float = 0.0  # uniform extra latency in [0, jitter]
+    failure_rate: float = 0.0  # fraction of API requests answered with failure_status
+    failure_status: int = 503
+    ambiguous_failure_rate: float = 0.0  # fraction of requests processed, then answered with failure_status
+    fail_first: int = 0  # the first N requests per route fail (deterministic)
+    train_failure_rate: float = 0.0  # fraction of models that end up FAILED
+    honor_idempotency_keys: bool = True  # off: a repeated train post starts a second model
+    naive_timestamps: bool = False  # created_at / updated_at without a UTC offset
+    rate_limit_rps: float = 0.0  # token-bucket throughput limit, 0 = unlimited
+    rate_limit_burst: int = 10
+    max_concurrent: int = 0  # concurrent in-flight requests before 429, 0 = unlimited
+    seed: int = 0
+
+
+@dataclass
+class _Dataset:
+    id: str
+    name: str
+    columns: list[str]
+    rows: list[list[str]]
+    file_size_bytes: int
+
+
+@dataclass
+class _Model:
+    id: str
+    name: str
+    usecase: str
+    dataset_id: str
+    label_column: Optional[str]
+    created_at: float
+    will_fail: bool
+
+
+@dataclass
+class StandinState:
+    config: StandinConfig
+    datasets: dict[str, _Dataset] = field(default_factory=dict)
+    models: dict[str, _Model] = field(default_factory=dict)
+    route_counts: Counter = field(default_factory=Counter)
+    status_counts: Counter = field(default_factory=Counter)
+    in_flight: int = 0
+    idempotency_keys: dict[str, str] = field(default_factory=dict)  # Idempotency-Key -> model id
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.config.seed)
+        self._tokens = float(self.config.rate_limit_burst)
+        self._last_refill = time.monotonic()
+
+    def take_token(self) -> float:
+        """Return 0 if a request may proceed, else seconds until a token frees up."""
+        rate = self.config.rate_limit_rps
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.config.rate_limit_burst),
+            self._tokens + (now - self._last_refill) * rate,
+        )
+        self._last_refill = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return 0.0
+        return (1.0 - self._tokens) / rate
+
+    def model_status(self, model: _Model) -> str:
+        elapsed = time.monotonic() - model.created_at
+        duration = self.config.training_duration_s
+        if elapsed >= duration:
+            return "FAILED" if model.will_fail else "COMPLETE"
+        return "PENDING" if elapsed < duration * 0.1 else "TRAINING"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "routes": dict(self.route_counts),
+            "statuses": {str(k): v for k, v in self.status_counts.items()},
+            "datasets": len(self.datasets),
+            "models": len(self.models),
+        }
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _route_key(method: str, path: str) -> str:
+    # Collapse ids so failure injection and stats are per endpoint
+    path = re.sub(r"/api/datasets/[^/]+$", "/api/datasets/{id}", path)
+    path = re.sub(r"/api/models/(\w+)/[^/]+/infer$", r"/api/models/\1/{id}/infer", path)
+    path = re.sub(r"/api/models/(?!(?:%s)/)[^/]+$" % "|".join(USECASES), "/api/models/{id}", path)
+    return f"{method} {path}"
+
+
+# -------------------------
+# Request handling
+# -------------------------
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+    server: "StandinServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    # -- plumbing --
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[dict[str, str]] = None) -> None:
+        if getattr(self, "_drop_success", False) and status < 400:
+            # The work is done, but the client is told it failed
+            self._drop_success = False
+            status, payload = self.server.state.config.failure_status, {"detail": "Injected failure after processing"}
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.state.lock:
+            self.server.state.status_counts[status] += 1
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _form(self, body: bytes) -> dict[str, Any]:
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("application/json"):
+            return json.loads(body or b"{}")
+        if ctype.startswith("multipart/form-data"):
+            msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"Content-Type: {ctype}\r\n\r\n".encode() + body
+            )
+            out: dict[str, Any] = {}
+            for part in msg.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                out[name] = part.get_payload(decode=True)
+            return out
+        return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+    def _dispatch(self, method: str) -> None:
+        state = self.server.state
+        cfg = state.config
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        body = self._read_body()
+        route = _route_key(method, parsed.path)
+
+        if parsed.path == "/_standin/stats":
+            with state.lock:
+                stats = state.stats()
+            self._send_json(200, stats)
+            return
+
+        with state.lock:
+            state.route_counts[route] += 1
+            nth = state.route_counts[route]
+            wait = state.take_token()
+            over_capacity = 0 < cfg.max_concurrent <= state.in_flight
+            inject = nth <= cfg.fail_first or state.rng.random() < cfg.failure_rate
+            ambiguous = not inject and state.rng.random() < cfg.ambiguous_failure_rate
+            jitter = state.rng.uniform(0, cfg.latency_jitter_s) if cfg.latency_jitter_s else 0.0
+            rejected = wait > 0 or over_capacity
+            if not rejected:
+                state.in_flight += 1
+
+        if rejected:
+            retry_after = max(wait, 0.1)
+            self._send_json(
+                429,
+                {"detail": "Rate limit exceeded"},
+                headers={"Retry-After": f"{retry_after:.3f}"},
+            )
+            return
+
+        try:
+            if cfg.latency_s or jitter:
+                time.sleep(cfg.latency_s + jitter)
+
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                self._send_json(401, {"detail": "Not authenticated"})
+                return
+
+            if inject:
+                self._send_json(cfg.failure_status, {"detail": "Injected failure"})
+                return
+
+            self._drop_success = ambiguous
+            self._handle(method, parsed.path, query, body)
+        finally:
+            self._drop_success = False
+            with state.lock:
+                state.in_flight -= 1
+
+    # -- endpoints --
+
+    def _handle(self, method: str, path: str, query: dict[str, str], body: bytes) -> None:
+        state = self.server.state
+
+        if path == "/api/datasets" and method == "POST":
+            form = self._form(body)
+            raw = form.get("file") or b""
+            name = form.get("name")
+            if isinstance(name, bytes):
+                name = name.decode()
+            if not name:
+                self._send_json(422, {"detail": "name is required"})
+                return
+            reader = csv.reader(io.StringIO(raw.decode("utf-8", errors="replace")))
+            header = next(reader, [])
+            rows = list(reader)
+            with state.lock:
+                # overwrite=True semantics: same name replaces the old dataset
+                for old_id, ds in list(state.datasets.items()):
+                    if ds.name == name:
+                        del state.datasets[old_id]
+                ds = _Dataset(f"dataset_{uuid.uuid4().hex[:12]}", name, header, rows, len(raw))
+                state.datasets[ds.id] = ds
+            self._send_json(200, self._dataset_json(ds))
+            return
+
+        if path == "/api/datasets" and method == "GET":
+            with state.lock:
+                listing = [self._dataset_json(d) for d in state.datasets.values()]
+            self._send_json(200, listing)
+            return
+
+        m = re.fullmatch(r"/api/datasets/([^/]+)", path)
+        if m:
+            with state.lock:
+                ds = state.datasets.get(m.group(1))
+                if ds and method == "DELETE":
+                    del state.datasets[ds.id]
+            if not ds:
+                self._send_json(404, {"detail": "Dataset not found"})
+            else:
+                self._send_json(200, self._dataset_json(ds))
+            return
+
+        m = re.fullmatch(r"/api/models/(\w+)/train", path)
+        if m and method == "POST" and m.group(1) in USECASES:
+            self._train(m.group(1), query, self._form(body))
+            return
+
+        m = re.fullmatch(r"/api/models/(\w+)/([^/]+)/infer", path)
+        if m and method == "POST" and m.group(1) in USECASES:
+            self._infer(m.group(1), m.group(2), query)
+            return
+
+        if path == "/api/models" and method == "GET":
+            with state.lock:
+                listing = [self._model_json(x) for x in state.models.values()]
+            self._send_json(200, listing)
+            return
+
+        m = re.fullmatch(r"/api/models/([^/]+)", path)
+        if m and method == "GET":
+            with state.lock:
+                model = state.models.get(m.group(1))
+            if not model:
+                self._send_json(404, {"detail": "Model not found"})
+            else:
+                self._send_json(200, self._model_json(model))
+            return
+
+        self._send_json(404, {"detail": f"No route for {method} {path}"})
+
+    def _train(self, usecase: str, query: dict[str, str], form: dict[str, Any]) -> None:
+        state = self.server.state
+        dataset_name = query.get("dataset_name") or form.get("dataset_name")
+        dataset_id = query.get("dataset_id") or form.get("dataset_id")
+        model_name = form.get("model_name")
+        label_column = form.get("label_column")
+
+        with state.lock:
+            ds = state.datasets.get(dataset_id) if dataset_id else next(
+                (d for d in state.datasets.values() if d.name == dataset_name), None
+            )
+        if ds is None:
+            self._send_json(404, {"detail": f"Dataset '{dataset_name or dataset_id}' not found"})
+            return
+        if not model_name:
+            self._send_json(422, {"detail": "model_name is required"})
+            return
+        if usecase == "prediction" and (not label_column or label_column not in ds.columns):
+            self._send_json(422, {"detail": f"label_column '{label_column}' not in dataset"})
+            return
+
+        idempotency_key = self.headers.get("Idempotency-Key") if state.config.honor_idempotency_keys else None
+        with state.lock:
+            # A repeated post with the same key gets the model the first one started
+            existing = state.models.get(state.idempotency_keys.get(idempotency_key or "", ""))
+            if existing is not None:
+                model = existing
+            else:
+                model = _Model(
+                    id=f"model_{uuid.uuid4().hex[:12]}",
+                    name=model_name,
+                    usecase=usecase,
+                    dataset_id=ds.id,
+                    label_column=label_column,
+                    created_at=time.monotonic(),
+                    will_fail=state.rng.random() < state.config.train_failure_rate,
+                )
+                state.models[model.id] = model
+                if idempotency_key:
+                    state.idempotency_keys[idempotency_key] = model.id
+        self._send_json(200, self._model_json(model))
+
+    def _infer(self, usecase: str, model_id: str, query: dict[str, str]) -> None:
+        state = self.server.state
+        with state.lock:
+            model = state.models.get(model_id)
+            ds = state.datasets.get(query.get("dataset_id", "")) or next(
+                (d for d in state.datasets.values() if d.name == query.get("dataset_name")), None
+            )
+        if model is None or model.usecase != usecase:
+            self._send_json(404, {"detail": "Model not found"})
+            return
+        if state.model_status(model) != "COMPLETE":
+            self._send_json(409, {"detail": "Model has not completed training"})
+            return
+        if ds is None:
+            self._send_json(404, {"detail": "Dataset not found"})
+            return
+
+        # Deterministic per (model, dataset) outputs
+        rng = random.Random(f"{model.id}:{ds.id}")
+        n = len(ds.rows)
+        if usecase == "prediction":
+            idx = ds.columns.index(model.label_column) if model.label_column in ds.columns else None
+            preds = {}
+            for i, row in enumerate(ds.rows):
+                try:
+                    truth = float(row[idx]) if idx is not None else 0.0
+                except (ValueError, IndexError):
+                    truth = 0.0
+                preds[str(i)] = truth * rng.uniform(0.85, 1.15)
+            payload: Any = {"prediction": preds}
+        elif usecase == "clustering":
+            payload = {"cluster_label": {str(i): rng.randrange(5) for i in range(n)}}
+        elif usecase == "anomaly":
+            payload = {"anomalous_ids": [i for i in range(n) if rng.random() < 0.05]}
+        else:
+            payload = {"embedding": {str(i): [rng.gauss(0, 1) for _ in range(8)] for i in range(n)}}
+        self._send_json(200, payload)
+
+    def _dataset_json(self, ds: _Dataset) -> dict[str, Any]:
+        return {
+            "id": ds.id,
+            "name": ds.name,
+            "num_rows": len(ds.rows),
+            "file_size_bytes": ds.file_size_bytes,
+            "dataset_schema": {"columns": [{"name": c, "type": "string"} for c in ds.columns]},
+        }
+
+    def _model_json(self, model: _Model) -> dict[str, Any]:
+        created = datetime.now(timezone.utc).timestamp() - (time.monotonic() - model.created_at)
+        created_at, updated_at = datetime.fromtimestamp(created, timezone.utc).isoformat(), _now_iso()
+        if self.server.state.config.naive_timestamps:
+            created_at, updated_at = created_at[:-len("+00:00")], updated_at[:-len("+00:00")]
+        return {
+            "id": model.id,
+            "name": model.name,
+            "type": model.usecase,
+            "training_status": self.server.state.model_status(model),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: StandinConfig, *, verbose: bool = False):
+        super().__init__(address, StandinHandler)
+        self.state = StandinState(config)
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+# -------------------------
+# Public entrypoints
+# -------------------------
+
+def start_standin_server(
+    config: Optional[StandinConfig] = None,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    verbose: bool = False,
+) -> StandinServer:
+    """Start the stand-in on a background thread. port=0 picks a free port."""
+    server = StandinServer((host, port), config or StandinConfig(), verbose=verbose)
+    thread = threading.Thread(target=server.serve_forever, name="woodwide-standin", daemon=True)
+    thread.start()
+    return server
+
+
+@contextmanager
+def run_standin_server(config: Optional[StandinConfig] = None, **kwargs: Any) -> Iterator[StandinServer]:
+    """
+    with run_standin_server(StandinConfig(training_duration_s=1)) as srv:
+        woodwide_run(..., base_url=srv.base_url)
+    """
+    server = start_standin_server(config, **kwargs)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description="Local WoodWide API stand-in for offline benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--training-duration", type=float, default=5.0, help="Seconds until a model is COMPLETE")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed per-request latency (s)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra uniform latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--failure-status", type=int, default=503, help="Status code for injected failures")
+    parser.add_argument("--ambiguous-failure-rate", type=float, default=0.0, help="Fraction of requests processed but answered as failed")
+    parser.add_argument("--fail-first", type=int, default=0, help="Fail the first N requests per route")
+    parser.add_argument("--train-failure-rate", type=float, default=0.0, help="Fraction of models that FAIL")
+    parser.add_argument("--ignore-idempotency-keys", action="store_true", help="Start a new model for every train post")
+    parser.add_argument("--naive-timestamps", action="store_true", help="Send model timestamps without a UTC offset")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests/second before 429s (0 = off)")
+    parser.add_argument("--burst", type=int, default=10, help="Token-bucket burst size")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="In-flight requests before 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+def main():
+    args = setup_args()
+    config = StandinConfig(
+        training_duration_s=args.training_duration,
+        latency_s=args.latency,
+        latency_jitter_s=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        ambiguous_failure_rate=args.ambiguous_failure_rate,
+        fail_first=args.fail_first,
+        train_failure_rate=args.train_failure_rate,
+        honor_idempotency_keys=not args.ignore_idempotency_keys,
+        naive_timestamps=args.naive_timestamps,
+        rate_limit_rps=args.rate_limit,
+        rate_limit_burst=args.burst,
+        max_concurrent=args.max_concurrent,
+        seed=args.seed,
+    )
+    server = StandinServer((args.host, args.port), config, verbose=args.verbose)
+    print(f"WoodWide stand-in listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 from livekit import agents, rtc
 from livekit.agents import AgentServer
-from livekit.agents.tts import SynthesizedAudio
 from livekit.plugins import cartesia
 from typing import AsyncIterable
 
+from tts_cache import CachedTTSPlayer, PhraseAudioCache
+
+MODEL = "sonic-english"
+VOICE = "f786b574-daa5-4673-aa0c-cbe3e8534c02"
 
 server = AgentServer()
 
+# One cache per process: repeated alert sentences play from memory (or disk) with no API call
+phrase_cache = PhraseAudioCache()
+
 @server.rtc_session()
 async def my_agent(ctx: agents.JobContext):
 
@@ -16,26 +22,21 @@ async def my_agent(ctx: agents.JobContext):
 
     text_stream: AsyncIterable[str] = text_generator()
 
-    audio_source = rtc.AudioSource(44100, 1)
+    tts = cartesia.TTS(model=MODEL, voice=VOICE)
+
+    # The source must match the TTS output format; cached frames are pushed to it as-is
+    audio_source = rtc.AudioSource(tts.sample_rate, tts.num_channels)
 
     track = rtc.LocalAudioTrack.create_audio_track("agent-audio", audio_source)
     await ctx.room.local_participant.publish_track(track)
 
-    tts = cartesia.TTS(model="sonic-english")
-    tts_stream = tts.stream()
-
-    # create a task to consume and publish audio frames
-    ctx.create_task(send_audio(tts_stream))
+    player = CachedTTSPlayer(tts, audio_source, model=MODEL, voice=VOICE, cache=phrase_cache)
 
-    # push text into the stream, TTS stream will emit audio frames along with events
-    # indicating sentence (or segment) boundaries.
+    # Each text is split into sentences; only ones not heard before are synthesized
     async for text in text_stream:
-        tts_stream.push_text(text)
-    tts_stream.end_input()
+        await player.say(text)
 
-    async def send_audio(audio_stream: AsyncIterable[SynthesizedAudio]):
-        async for a in audio_stream:
-            await audio_source.capture_frame(a.audio.frame)
+    await audio_source.wait_for_playout()
 
 if __name__ == "__main__":
-    agents.cli.run_app(server)
\ No newline at end of file
+    agents.cli.run_app(server)
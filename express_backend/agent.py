@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import os
+import time
 from dotenv import load_dotenv
 from livekit import rtc
 from livekit.agents import (
@@ -7,8 +10,11 @@ from livekit.agents import (
     AgentSession,
     JobContext,
     JobProcess,
+    RunContext,
     cli,
+    function_tool,
     inference,
+    llm,
     room_io,
 )
 from livekit.plugins import (
@@ -16,13 +22,25 @@ from livekit.plugins import (
     silero,
 )
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from drug_resolver import DrugNameResolver
+from frame_dedup import FrameDedupSampler
+from inventory_snapshot import InventorySnapshot
+from turn_metrics import TurnMetricsCollector, worker_summary
 
 logger = logging.getLogger("agent-Avery-d81")
 
 load_dotenv(".env")
 
 class DefaultAgent(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        inventory: InventorySnapshot | None = None,
+        resolver: DrugNameResolver | None = None,
+        frames: FrameDedupSampler | None = None,
+    ) -> None:
+        self.inventory = inventory
+        self.resolver = resolver
+        self.frames = frames
         super().__init__(
             instructions="""You are a friendly, reliable voice assistant that answers questions, explains topics, and completes tasks with available tools.
 
@@ -30,6 +48,8 @@ class DefaultAgent(Agent):
 
 The user will converse to you via text and image, and you are outputing in text or voice, and must apply the following rules to ensure your output sounds is accurate
 - when you are given image input, read over the medicine and identify the medicine name and return the name
+- to match a name you read against our inventory, pass it as written to check_inventory with seen_on_camera set to true; it tolerates misspellings and strengths
+- for names the user says or types, call check_inventory with seen_on_camera set to false
 - when you are given text, output voice
 
 - Help the user accomplish their objective efficiently and correctly. Prefer the simplest safe step first. Check understanding and adapt.
@@ -39,6 +59,7 @@ The user will converse to you via text and image, and you are outputing in text
 # Tools
 
 - Use available tools as needed, or upon user request.
+- For stock levels, usage trends or backorders, call check_inventory or list_backordered; never guess quantities.
 - Collect required inputs first. Perform actions silently if the runtime expects it.
 - Speak outcomes clearly. If an action fails, say so once, propose a fallback, or ask how to proceed.
 - When tools return structured data, summarize it to the user in a way that is easy to understand, and don't directly recite identifiers or other technical details.
@@ -50,6 +71,56 @@ The user will converse to you via text and image, and you are outputing in text
 - Protect privacy and minimize sensitive data.""",
         )
 
+    @function_tool()
+    async def check_inventory(self, context: RunContext, medicine: str, seen_on_camera: bool = False) -> dict:
+        """Look up current stock on hand, monthly usage, usage trend and backorder status for a medicine.
+
+        Args:
+            medicine: NDC code, generic name or brand name, e.g. "warfarin" or "Coumadin"
+            seen_on_camera: true if the name was read from the camera image of this turn, false if the user said or typed it
+        """
+        if self.inventory is None or not self.inventory.configured or not self.inventory.ready:
+            return {"error": "Inventory data is not available right now."}
+        matches = self.inventory.lookup(medicine)
+        resolved = None
+        if not matches and self.resolver is not None:
+            # Misspelled or OCR'd names ("warfrin", "Coumadin 5mg tabs") resolve locally
+            candidates = self.resolver.resolve(medicine, limit=1)
+            if candidates:
+                resolved = candidates[0]
+                matches = self.resolver.resolve_items(medicine)
+        if not matches:
+            return {"error": f"No inventory item matches '{medicine}'."}
+        if self.frames is not None and seen_on_camera:
+            # Remember what this camera view showed, so repeats of it skip the image.
+            # Spoken lookups in the same turn say nothing about the view.
+            self.frames.label(resolved.name if resolved is not None else matches[0].generic_name or medicine)
+        result = {"matches": [item.summary() for item in matches]}
+        if resolved is not None:
+            result["interpreted_as"] = resolved.name
+        return result
+
+    @function_tool()
+    async def list_backordered(self, context: RunContext) -> dict:
+        """List medicines that are currently backordered."""
+        if self.inventory is None or not self.inventory.configured or not self.inventory.ready:
+            return {"error": "Inventory data is not available right now."}
+        items = self.inventory.index.backordered()
+        return {"backordered": [{"ndc": i.ndc, "generic_name": i.generic_name, "brand_name": i.brand_name,
+                                 "on_hand_units": i.on_hand_units} for i in items]}
+
+    async def on_user_turn_completed(self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage) -> None:
+        if self.frames is None:
+            return
+        frame, seen = self.frames.turn_frame()
+        if frame is not None:
+            new_message.content.append(llm.ImageContent(image=frame))
+        elif seen is not None and seen.name:
+            # Same view as an earlier turn: answer from what was recognized then, no image call
+            new_message.content.append(
+                f"(The camera still shows the item you identified earlier as {seen.name}.)"
+            )
+
     async def on_enter(self):
         await self.session.generate_reply(
             instructions="""Greet the user and offer your assistance.""",
@@ -57,15 +128,60 @@ The user will converse to you via text and image, and you are outputing in text
         )
 
 
-server = AgentServer()
+# Each job runs in a process that was prewarmed ahead of time; keep this many
+# ready so a caller never waits for a process spawn + model load.
+# Unset = livekit's default (0 in dev mode, one per CPU in production).
+_idle_processes = os.getenv("AGENT_IDLE_PROCESSES")
+server = AgentServer(**({"num_idle_processes": int(_idle_processes)} if _idle_processes else {}))
 
 def prewarm(proc: JobProcess):
+    start = time.perf_counter()
     proc.userdata["vad"] = silero.VAD.load()
+    # Noise cancellation options are built once per process, not per participant
+    proc.userdata["noise_cancellation"] = noise_cancellation.BVC()
+    proc.userdata["noise_cancellation_sip"] = noise_cancellation.BVCTelephony()
+    # Loaded and refreshed in a background thread, so a slow database can't stall
+    # prewarm past livekit's initialize timeout; tools report "not available" until ready
+    inventory = InventorySnapshot()
+    resolver = DrugNameResolver()
+    # Rebuilt incrementally (added / removed names only) whenever the snapshot changes
+    inventory.subscribe(resolver.update)
+    inventory.start()
+    proc.userdata["inventory"] = inventory
+    proc.userdata["drug_resolver"] = resolver
+    proc.userdata["prewarm_s"] = time.perf_counter() - start
+    logger.info("prewarm finished in %.0f ms", proc.userdata["prewarm_s"] * 1000)
 
 server.setup_fnc = prewarm
 
+
+async def warm_turn_detector(turn_detection: MultilingualModel):
+    """
+    The end-of-turn model runs in the worker's shared inference process, and
+    its first prediction pays for session setup there. Run one on a dummy
+    message while the session starts so the caller's first turn doesn't.
+    """
+    start = time.perf_counter()
+    chat_ctx = llm.ChatContext()
+    chat_ctx.add_message(role="user", content="Hello, can you help me?")
+    try:
+        await turn_detection.predict_end_of_turn(chat_ctx)
+        logger.info("turn detector warm in %.0f ms", (time.perf_counter() - start) * 1000)
+    except Exception:
+        logger.warning("turn detector warm-up failed", exc_info=True)
+
+
 @server.rtc_session(agent_name="Avery-d81")
 async def entrypoint(ctx: JobContext):
+    job_start = time.perf_counter()
+    userdata = ctx.proc.userdata
+
+    # Needs the job context (it binds to the inference executor), so it can't move into prewarm
+    turn_detection = MultilingualModel()
+    warmup = asyncio.create_task(warm_turn_detector(turn_detection))
+    # Camera frames are hashed and only visually new ones reach the LLM
+    frames = FrameDedupSampler()
+
     session = AgentSession(
         stt=inference.STT(model="assemblyai/universal-streaming", language="en"),
         llm=inference.LLM(model="openai/gpt-4.1-mini"),
@@ -74,20 +190,63 @@ async def entrypoint(ctx: JobContext):
             voice="9626c31c-bec5-4cca-baa8-f8ba9e84c8bc",
             language="en"
         ),
-        turn_detection=MultilingualModel(),
-        vad=ctx.proc.userdata["vad"],
+        turn_detection=turn_detection,
+        vad=userdata["vad"],
         preemptive_generation=True,
+        video_sampler=frames,
     )
 
+    turn_metrics = TurnMetricsCollector(ctx.room.name)
+    turn_metrics.attach(session)
+
+    async def log_turn_metrics():
+        logger.info("session turn latency: %s", turn_metrics.summary())
+        logger.info("worker turn latency: %s", worker_summary())
+        logger.info("camera frames: %s", frames.stats)
+
+    ctx.add_shutdown_callback(log_turn_metrics)
+
+    # First response = greeting (session start -> agent speaking) and the
+    # first real turn (user stops speaking -> agent speaking)
+    first_response = {"user_stopped": None, "greeting_ms": None, "first_turn_ms": None}
+
+    @session.on("user_state_changed")
+    def _on_user_state(ev):
+        if ev.old_state == "speaking" and first_response["user_stopped"] is None:
+            first_response["user_stopped"] = time.perf_counter()
+
+    @session.on("agent_state_changed")
+    def _on_agent_state(ev):
+        if ev.new_state != "speaking":
+            return
+        now = time.perf_counter()
+        if first_response["greeting_ms"] is None:
+            first_response["greeting_ms"] = (now - job_start) * 1000
+            logger.info("first response (greeting) %.0f ms after job start", first_response["greeting_ms"])
+        elif first_response["user_stopped"] is not None and first_response["first_turn_ms"] is None:
+            first_response["first_turn_ms"] = (now - first_response["user_stopped"]) * 1000
+            logger.info("first turn response %.0f ms after end of speech", first_response["first_turn_ms"])
+
     await session.start(
-        agent=DefaultAgent(),
+        agent=DefaultAgent(
+            inventory=userdata.get("inventory"),
+            resolver=userdata.get("drug_resolver"),
+            frames=frames,
+        ),
         room=ctx.room,
         room_options=room_io.RoomOptions(
+            video_input=True,
             audio_input=room_io.AudioInputOptions(
-                noise_cancellation=lambda params: noise_cancellation.BVCTelephony() if params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP else noise_cancellation.BVC(),
+                noise_cancellation=lambda params: userdata["noise_cancellation_sip"] if params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP else userdata["noise_cancellation"],
             ),
         ),
     )
+    logger.info(
+        "session started in %.0f ms (process prewarm took %.0f ms)",
+        (time.perf_counter() - job_start) * 1000,
+        userdata.get("prewarm_s", 0) * 1000,
+    )
+    await warmup
 
 
 if __name__ == "__main__":
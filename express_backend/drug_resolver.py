@@ -0,0 +1,163 @@
+"""
+Fuzzy drug-name resolution against the inventory formulary.
+
+Names read from a box or label by OCR or by the LLM are often slightly off:
+"warfrin", "Coumadin 5mg", "METFORMIN HCl ER 500 mg tabs". DrugNameResolver
+maps that text to a canonical inventory name and its NDCs in microseconds,
+so resolving it needs no second LLM call.
+
+Every generic and brand name is indexed by its character trigrams. A query
+is cleaned first: case and punctuation are folded, strengths are pulled
+out as a hint, and packaging words are dropped. Each run of one to three
+remaining words, spaced and run together, gathers candidates that share
+trigrams with it. Candidates are ranked by Dice similarity, and ties are
+broken by edit distance. A strength in the text ("5mg") narrows the NDCs
+to that strength when any match.
+
+The resolver follows the inventory snapshot: update() diffs the new
+formulary against the indexed one and only touches names that were added
+or removed.
+"""
+
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from inventory_snapshot import InventoryIndex, InventoryItem
+
+MIN_SCORE = 0.5  # Dice similarity a match needs
+MAX_SPAN_WORDS = 3
+
+_STRENGTH = re.compile(r"(\d+(?:\.\d+)?)\s*(mcg/ml|mg/ml|units/ml|mcg|mg|g|units|iu)\b")
+# Packaging / dosage-form words that never belong to a drug name
+_NOISE_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "oral", "injection",
+    "inj", "vial", "vials", "syringe", "solution", "suspension", "cream", "ointment", "drops",
+    "usp", "hcl", "er", "sr", "xl", "dr", "each", "ml", "mg", "mcg", "g", "units", "iu", "x", "rx",
+    "only", "count", "ct", "pack", "box", "for", "of", "the", "and",
+}
+
+
+@dataclass(frozen=True)
+class Resolution:
+    name: str  # canonical (normalized) generic or brand name
+    ndcs: tuple[str, ...]
+    score: float  # Dice similarity of trigram sets, 1.0 = exact
+    matched_text: str  # the part of the query that matched
+    strength: Optional[str] = None  # strength found in the query, e.g. "5 mg"
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def parse_query(text: str) -> tuple[list[str], Optional[str]]:
+    """(name words, strength) from free text: 'Coumadin 5mg tabs' -> (['coumadin'], '5 mg')."""
+    text = (text or "").lower()
+    strength = None
+    match = _STRENGTH.search(text)
+    if match:
+        strength = f"{float(match.group(1)):g} {match.group(2)}"
+        text = _STRENGTH.sub(" ", text)
+    words = [w for w in re.split(r"[^a-z0-9\-]+", text) if w and not w.isdigit() and w not in _NOISE_WORDS]
+    return words, strength
+
+
+class DrugNameResolver:
+    def __init__(self, min_score: float = MIN_SCORE):
+        self.min_score = min_score
+        self._ndcs: dict[str, tuple[str, ...]] = {}  # name -> NDCs
+        self._name_grams: dict[str, frozenset[str]] = {}
+        self._postings: dict[str, set[str]] = defaultdict(set)  # trigram -> names
+        self._items: dict[str, InventoryItem] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ndcs)
+
+    def update(self, index: InventoryIndex) -> tuple[int, int]:
+        """Sync with `index`; returns (names added, names removed)."""
+        names: dict[str, set[str]] = defaultdict(set)
+        for keyed in (index.by_generic, index.by_brand):
+            for name, ndcs in keyed.items():
+                if name:
+                    names[name].update(ndcs)
+
+        with self._lock:
+            removed = self._ndcs.keys() - names.keys()
+            added = names.keys() - self._ndcs.keys()
+            for name in removed:
+                for gram in self._name_grams.pop(name):
+                    self._postings[gram].discard(name)
+                    if not self._postings[gram]:
+                        del self._postings[gram]
+            for name in added:
+                grams = trigrams(name)
+                self._name_grams[name] = grams
+                for gram in grams:
+                    self._postings[gram].add(name)
+            self._ndcs = {name: tuple(sorted(ndcs)) for name, ndcs in names.items()}
+            self._items = index.items
+        return len(added), len(removed)
+
+    def resolve(self, text: str, limit: int = 3) -> list[Resolution]:
+        """Best matching names for `text`, best first; empty if nothing scores min_score."""
+        words, strength = parse_query(text)
+        spans = set()
+        for n in range(1, MAX_SPAN_WORDS + 1):
+            for i in range(len(words) - n + 1):
+                spans.add(" ".join(words[i:i + n]))
+                if n > 1:
+                    spans.add("".join(words[i:i + n]))  # brand names are often run together
+        best: dict[str, tuple[float, str]] = {}  # name -> (score, span)
+        with self._lock:
+            for span in spans:
+                span_grams = trigrams(span)
+                shared: dict[str, int] = defaultdict(int)
+                for gram in span_grams:
+                    for name in self._postings.get(gram, ()):
+                        shared[name] += 1
+                for name, common in shared.items():
+                    score = 2 * common / (len(span_grams) + len(self._name_grams[name]))
+                    if score >= self.min_score and score > best.get(name, (0.0, ""))[0]:
+                        best[name] = (score, span)
+            # Edit distance only to order the few best-scoring names
+            top = sorted(best.items(), key=lambda kv: kv[1][0], reverse=True)[:limit + 2]
+            ranked = sorted(top, key=lambda kv: (-kv[1][0], edit_distance(kv[1][1], kv[0])))[:limit]
+            return [
+                Resolution(
+                    name=name,
+                    ndcs=self._with_strength(self._ndcs[name], strength),
+                    score=round(score, 3),
+                    matched_text=span,
+                    strength=strength,
+                )
+                for name, (score, span) in ranked
+            ]
+
+    def _with_strength(self, ndcs: tuple[str, ...], strength: Optional[str]) -> tuple[str, ...]:
+        if not strength:
+            return ndcs
+        matching = tuple(n for n in ndcs if n in self._items and self._items[n].strength == strength)
+        return matching or ndcs
+
+    def resolve_items(self, text: str, limit: int = 5) -> list[InventoryItem]:
+        """Inventory items for the best match of `text` (strength-filtered when given)."""
+        matches = self.resolve(text, limit=1)
+        if not matches:
+            return []
+        items = self._items
+        return [items[n] for n in matches[0].ndcs if n in items][:limit]
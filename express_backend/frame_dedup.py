@@ -0,0 +1,201 @@
+"""
+Perceptual-hash dedup for camera frames sent to the agent.
+
+A user holding a medicine box up to the webcam produces a stream of nearly
+identical frames, and each one shown to the LLM is a multimodal call.
+FrameDedupSampler sits between the room's video track and the agent:
+
+- Frames are sampled at AGENT_FRAME_SAMPLE_FPS. Each sampled frame is
+  reduced to a 64-bit difference hash (dHash): luma, downscaled to 9x8 by
+  area averaging, with one bit per horizontal brightness increase. Compression
+  noise, small hand movements and lighting flicker change only a few bits.
+- Two frames are "the same" when their hashes differ in at most
+  AGENT_FRAME_HASH_THRESHOLD bits.
+- At the end of each user turn, turn_frame() returns the newest frame only
+  if it is visually new. A repeat returns the cached entry instead, which
+  carries the name recognized for that view (via label()) so the agent can
+  answer from it without showing the model the image again.
+- Frames stop arriving when the camera is turned off. After
+  AGENT_FRAME_STALE_INTERVALS sample intervals without a frame, the last one
+  is dropped, so later turns are not described with a view the user no
+  longer shows.
+
+The cache is a per-session LRU of AGENT_FRAME_CACHE_SIZE hashes. Used as an
+AgentSession video_sampler, it also only forwards frames that differ from
+the last forwarded one, which keeps realtime models from seeing repeats.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from livekit import rtc
+
+logger = logging.getLogger("agent-frame-dedup")
+
+FRAME_SAMPLE_FPS = float(os.getenv("AGENT_FRAME_SAMPLE_FPS", "2"))
+FRAME_HASH_THRESHOLD = int(os.getenv("AGENT_FRAME_HASH_THRESHOLD", "10"))  # differing bits out of 64
+FRAME_CACHE_SIZE = int(os.getenv("AGENT_FRAME_CACHE_SIZE", "32"))
+FRAME_STALE_INTERVALS = float(os.getenv("AGENT_FRAME_STALE_INTERVALS", "4"))  # sample intervals without frames
+HASH_SIZE = 8
+# Minimum brightness step (of 255) for a 1 bit; flat areas would otherwise hash to noise
+HASH_MARGIN = 1.0
+
+# Formats whose first plane is already 8-bit luma
+_LUMA_FIRST = (rtc.VideoBufferType.I420, rtc.VideoBufferType.I420A, rtc.VideoBufferType.NV12)
+
+
+def luma(frame: rtc.VideoFrame) -> np.ndarray:
+    if frame.type not in _LUMA_FIRST:
+        frame = frame.convert(rtc.VideoBufferType.I420)
+    plane = np.frombuffer(frame.get_plane(0), dtype=np.uint8)
+    # Rows may be padded past the visible width; the plane holds `stride` bytes per row
+    stride = len(plane) // frame.height
+    if stride < frame.width:
+        raise ValueError(f"luma plane too small for {frame.width}x{frame.height}: {len(plane)} bytes")
+    return plane[: stride * frame.height].reshape(frame.height, stride)[:, : frame.width]
+
+
+def dhash(gray: np.ndarray, size: int = HASH_SIZE) -> int:
+    """Difference hash of a 2-D grayscale image: size*size bits."""
+    # Averaging every pixel (~1 ms at 720p) rather than striding keeps sensor noise out of the bits
+    rows, cols = gray.shape[0] // size, gray.shape[1] // (size + 1)
+    if rows == 0 or cols == 0:
+        raise ValueError(f"frame too small to hash: {gray.shape}")
+    small = gray[: rows * size, : cols * (size + 1)].reshape(size, rows, size + 1, cols).mean(axis=(1, 3))
+    bits = (small[:, 1:] - small[:, :-1] > HASH_MARGIN).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def frame_hash(frame: rtc.VideoFrame) -> int:
+    return dhash(luma(frame))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@dataclass
+class SeenFrame:
+    hash: int
+    name: Optional[str] = None  # what the model recognized in this view, once known
+    hits: int = 0  # later frames answered from this entry
+    first_seen: float = field(default_factory=time.time)
+
+
+class FrameCache:
+    """LRU of frame hashes; match() returns the closest entry within `threshold` bits."""
+
+    def __init__(self, size: int = FRAME_CACHE_SIZE, threshold: int = FRAME_HASH_THRESHOLD):
+        self.size = size
+        self.threshold = threshold
+        self._entries: OrderedDict[int, SeenFrame] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def match(self, h: int) -> Optional[SeenFrame]:
+        best, best_distance = None, self.threshold + 1
+        # Linear scan: a few dozen XOR + popcounts is cheaper than any index at this size
+        for entry in self._entries.values():
+            distance = hamming(h, entry.hash)
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        if best is not None:
+            self._entries.move_to_end(best.hash)
+        return best
+
+    def add(self, h: int) -> SeenFrame:
+        entry = self._entries.get(h) or SeenFrame(h)
+        self._entries[h] = entry
+        self._entries.move_to_end(h)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class FrameDedupSampler:
+    """
+    Per-session camera frame sampler and dedup cache:
+
+        frames = FrameDedupSampler()
+        session = AgentSession(..., video_sampler=frames)
+        frame, seen = frames.turn_frame()  # at end of each user turn
+    """
+
+    def __init__(
+        self,
+        *,
+        fps: float = FRAME_SAMPLE_FPS,
+        threshold: int = FRAME_HASH_THRESHOLD,
+        cache_size: int = FRAME_CACHE_SIZE,
+        stale_intervals: float = FRAME_STALE_INTERVALS,
+    ):
+        self.min_interval = 1.0 / fps if fps > 0 else float("inf")
+        self.stale_after = self.min_interval * stale_intervals
+        self.threshold = threshold
+        self.cache = FrameCache(cache_size, threshold)
+        self._last_sampled: Optional[float] = None
+        self._last_frame_at: Optional[float] = None  # any frame, sampled or not
+        self._last_forwarded: Optional[int] = None
+        self._latest: Optional[tuple[rtc.VideoFrame, int]] = None
+        self._pending: Optional[SeenFrame] = None  # sent to the model, not yet labelled
+        self.stats = {"sampled": 0, "forwarded": 0, "sent": 0, "repeats": 0, "expired": 0}
+
+    def __call__(self, frame: rtc.VideoFrame, session=None) -> bool:
+        """AgentSession video_sampler hook: keep the newest frame, forward it only if it changed."""
+        now = time.monotonic()
+        self._last_frame_at = now
+        if self._last_sampled is not None and now - self._last_sampled < self.min_interval:
+            return False
+        self._last_sampled = now
+        try:
+            h = frame_hash(frame)
+        except Exception:
+            logger.warning("could not hash video frame", exc_info=True)
+            return False
+        self.stats["sampled"] += 1
+        self._latest = (frame, h)
+        if self._last_forwarded is not None and hamming(h, self._last_forwarded) <= self.threshold:
+            return False
+        self._last_forwarded = h
+        self.stats["forwarded"] += 1
+        return True
+
+    def turn_frame(self) -> tuple[Optional[rtc.VideoFrame], Optional[SeenFrame]]:
+        """
+        What to show the model for this turn:
+        (frame, None) for a visually new frame, (None, entry) for a repeat of a
+        cached view, (None, None) when there is no camera frame, or none
+        arrived in the last `stale_after` seconds.
+        """
+        self._pending = None
+        if self._latest is not None and time.monotonic() - self._last_frame_at > self.stale_after:
+            # Camera turned off (track muted or unpublished): its last frame no longer applies
+            self._latest = None
+            self.stats["expired"] += 1
+        if self._latest is None:
+            return None, None
+        frame, h = self._latest
+        seen = self.cache.match(h)
+        if seen is not None:
+            seen.hits += 1
+            self.stats["repeats"] += 1
+            return None, seen
+        self._pending = self.cache.add(h)
+        self.stats["sent"] += 1
+        return frame, None
+
+    def label(self, name: str) -> None:
+        """
+        Record what the model recognized in the frame sent this turn. Only
+        for names read from that image: a name the user said in the same
+        turn does not describe the view.
+        """
+        if self._pending is not None and name and self._pending.name is None:
+            self._pending.name = name
+            logger.debug("frame %016x recognized as %s", self._pending.hash, name)
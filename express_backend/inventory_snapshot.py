@@ -0,0 +1,369 @@
+"""
+In-memory inventory snapshot for the voice agent.
+
+The agent answers stock questions ("how many units of warfarin do we have")
+from a per-NDC snapshot held in the worker process, not from a database
+round trip per question. The snapshot keeps the latest record of each NDC
+and indexes it by NDC, generic name and brand name.
+
+Sources:
+- AGENT_INVENTORY_CSV: a CSV export such as
+  mock_medicine_inventory_timeseries.csv, with one row per NDC per
+  year_month. It is reloaded when the file's mtime changes.
+- The Supabase `inventory` table (SUPABASE_URL + SUPABASE_ANON_KEY). The
+  first load pages through the whole table. Later refreshes ask PostgREST
+  only for rows with updated_at at or after the last one seen.
+
+A background thread does the first load and then refreshes every
+AGENT_INVENTORY_REFRESH_S seconds. start() only launches it: a slow
+database must not hold up process start-up (livekit kills a process whose
+setup takes longer than its initialize timeout), so `ready` stays False
+until the first load has finished. Each refresh builds a new index and
+swaps it in with one assignment, so lookups never take a lock.
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from dataclasses import asdict, dataclass, replace
+from itertools import chain
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger("agent-inventory")
+
+INVENTORY_CSV = os.getenv("AGENT_INVENTORY_CSV")
+REFRESH_S = float(os.getenv("AGENT_INVENTORY_REFRESH_S", "60"))
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+SUPABASE_TABLE = "inventory"
+PAGE_SIZE = 1000  # PostgREST's default max rows per request
+TREND_THRESHOLD = 0.10  # usage change treated as increasing / decreasing
+MAX_MATCHES = 5
+
+
+@dataclass(frozen=True)
+class InventoryItem:
+    ndc: str
+    generic_name: str
+    brand_name: str
+    manufacturer: str
+    strength: str
+    form: str
+    as_of: str  # year_month or date of the record
+    on_hand_units: Optional[float]
+    monthly_usage_units: Optional[float]
+    daily_usage_units: Optional[float]
+    usage_trend: Optional[str]  # increasing / stable / decreasing
+    currently_backordered: bool
+    suppliers: str
+    previous_as_of: Optional[str] = None
+    previous_monthly_usage_units: Optional[float] = None
+
+    @property
+    def months_of_supply(self) -> Optional[float]:
+        if not self.on_hand_units or not self.monthly_usage_units:
+            return None
+        return self.on_hand_units / self.monthly_usage_units
+
+    def summary(self) -> dict:
+        data = asdict(self)
+        data.pop("previous_as_of")
+        data.pop("previous_monthly_usage_units")
+        data["usage_trend"] = self.usage_trend or _derive_trend(self)
+        supply = self.months_of_supply
+        data["months_of_supply"] = round(supply, 1) if supply is not None else None
+        return data
+
+
+def _derive_trend(item: InventoryItem) -> Optional[str]:
+    prev, cur = item.previous_monthly_usage_units, item.monthly_usage_units
+    if not prev or cur is None:
+        return None
+    change = (cur - prev) / prev
+    if change > TREND_THRESHOLD:
+        return "increasing"
+    if change < -TREND_THRESHOLD:
+        return "decreasing"
+    return "stable"
+
+
+def normalize_name(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def _number(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _flag(value) -> bool:
+    return str(value).strip().lower() in ("true", "1", "t", "yes")
+
+
+def _first(row: dict, *keys):
+    for key in keys:
+        if row.get(key) not in (None, ""):
+            return row[key]
+    return None
+
+
+def _as_of(row: dict) -> str:
+    return str(_first(row, "year_month", "date") or "")
+
+
+def _usage(row: dict) -> Optional[float]:
+    return _number(_first(row, "units_used_this_month", "monthly_usage_total_units"))
+
+
+def item_from_row(row: dict) -> Optional[InventoryItem]:
+    """Map a CSV-export row or a Supabase inventory row onto an InventoryItem."""
+    ndc = (row.get("medicine_id_ndc") or "").strip()
+    if not ndc:
+        return None
+    amount = _number(row.get("dosage_amount"))
+    strength = f"{amount:g} {row.get('dosage_unit') or ''}".strip() if amount is not None else ""
+    return InventoryItem(
+        ndc=ndc,
+        generic_name=(row.get("generic_medicine_name") or "").strip(),
+        brand_name=(row.get("brand_name") or "").strip(),
+        manufacturer=(row.get("manufacturer_name") or "").strip(),
+        strength=strength,
+        form=(row.get("medication_form") or "").strip(),
+        as_of=_as_of(row),
+        on_hand_units=_number(_first(row, "ending_inventory_units", "current_on_hand_units")),
+        monthly_usage_units=_usage(row),
+        daily_usage_units=_number(_first(row, "average_daily_usage_units", "daily_usage_avg_units")),
+        usage_trend=(row.get("monthly_usage_trend") or "").strip() or None,
+        currently_backordered=_flag(row.get("currently_backordered")),
+        suppliers=(row.get("available_suppliers") or "").strip(),
+    )
+
+
+class InventoryIndex:
+    """Immutable per-NDC snapshot with name indexes. Build a new one to change it."""
+
+    def __init__(self, items: dict[str, InventoryItem]):
+        self.items = items
+        self.by_generic: dict[str, list[str]] = {}
+        self.by_brand: dict[str, list[str]] = {}
+        for ndc, item in items.items():
+            self.by_generic.setdefault(normalize_name(item.generic_name), []).append(ndc)
+            self.by_brand.setdefault(normalize_name(item.brand_name), []).append(ndc)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def merged(self, rows: Iterable[dict]) -> "InventoryIndex":
+        """
+        New index with `rows` applied. Only the newest row per NDC becomes an
+        item (the next-newest supplies last month's usage for the trend), and
+        it replaces the current item only if it is at least as new.
+        """
+        # ndc -> [newest row, its period, previous period, previous usage]
+        newest: dict[str, list] = {}
+        for row in rows:
+            ndc = (row.get("medicine_id_ndc") or "").strip()
+            if not ndc:
+                continue
+            as_of = _as_of(row)
+            entry = newest.get(ndc)
+            if entry is None:
+                newest[ndc] = [row, as_of, None, None]
+            elif as_of > entry[1]:
+                entry[2], entry[3] = entry[1], _usage(entry[0])
+                entry[0], entry[1] = row, as_of
+            elif as_of == entry[1]:
+                entry[0] = row  # later row for the same period wins
+            elif entry[2] is None or as_of >= entry[2]:
+                entry[2], entry[3] = as_of, _usage(row)
+
+        items = dict(self.items)
+        for ndc, (row, as_of, prev_as_of, prev_usage) in newest.items():
+            current = items.get(ndc)
+            # (period, usage) pairs that could be "last month" for the winning record
+            candidates = [(prev_as_of, prev_usage)]
+            if current is None:
+                best = item_from_row(row)
+            else:
+                candidates.append((current.previous_as_of, current.previous_monthly_usage_units))
+                if current.as_of > as_of:
+                    best = current
+                    candidates.append((as_of, _usage(row)))
+                else:
+                    best = item_from_row(row)
+                    candidates.append((current.as_of, current.monthly_usage_units))
+            older = [c for c in candidates if c[0] is not None and c[0] < best.as_of]
+            previous = max(older, key=lambda c: c[0], default=(None, None))
+            items[ndc] = replace(best, previous_as_of=previous[0], previous_monthly_usage_units=previous[1])
+        return InventoryIndex(items)
+
+    def lookup(self, query: str, limit: int = MAX_MATCHES) -> list[InventoryItem]:
+        """Exact NDC, then exact generic / brand name, then names containing the query."""
+        query = (query or "").strip()
+        if query in self.items:
+            return [self.items[query]]
+        name = normalize_name(query)
+        if not name:
+            return []
+        ndcs = chain(self.by_generic.get(name, ()), self.by_brand.get(name, ()))
+        if name not in self.by_generic and name not in self.by_brand:
+            ndcs = (
+                ndc
+                for index in (self.by_generic, self.by_brand)
+                for key, keyed in index.items()
+                if name in key
+                for ndc in keyed
+            )
+        matches: dict[str, InventoryItem] = {}  # de-duplicated, in match order
+        for ndc in ndcs:
+            matches.setdefault(ndc, self.items[ndc])
+            if len(matches) >= limit:
+                break
+        return list(matches.values())
+
+    def backordered(self, limit: int = 20) -> list[InventoryItem]:
+        return [item for item in self.items.values() if item.currently_backordered][:limit]
+
+
+class InventorySnapshot:
+    """Holds the current InventoryIndex and refreshes it from the configured source."""
+
+    def __init__(
+        self,
+        *,
+        csv_path: Optional[str] = INVENTORY_CSV,
+        supabase_url: Optional[str] = SUPABASE_URL,
+        supabase_key: Optional[str] = SUPABASE_KEY,
+        refresh_s: float = REFRESH_S,
+    ):
+        self.csv_path = csv_path
+        self.supabase_url = supabase_url.rstrip("/") if supabase_url else None
+        self.supabase_key = supabase_key
+        self.refresh_s = refresh_s
+        self.index = InventoryIndex({})
+        self.loaded_at: Optional[float] = None
+        self._csv_mtime: Optional[float] = None
+        self._watermark: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: list[Callable[[InventoryIndex], object]] = []
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.csv_path or (self.supabase_url and self.supabase_key))
+
+    @property
+    def ready(self) -> bool:
+        """True once the first load has finished (an empty source counts)."""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def lookup(self, query: str, limit: int = MAX_MATCHES) -> list[InventoryItem]:
+        return self.index.lookup(query, limit)
+
+    def subscribe(self, callback: Callable[[InventoryIndex], object]) -> None:
+        """Call `callback(index)` after every refresh that changed the snapshot."""
+        self._listeners.append(callback)
+        if self.loaded_at is not None:
+            callback(self.index)
+
+    def refresh(self) -> int:
+        """Pull new data from the source; returns the number of rows applied."""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            if self.csv_path:
+                applied = self._refresh_csv()
+            elif self.supabase_url and self.supabase_key:
+                applied = self._refresh_supabase()
+            else:
+                return 0
+            if applied:
+                self.loaded_at = time.time()
+                logger.info(
+                    "inventory snapshot: %d rows applied, %d NDCs (%.0f ms)",
+                    applied, len(self.index), (time.perf_counter() - start) * 1000,
+                )
+                for callback in self._listeners:
+                    try:
+                        callback(self.index)
+                    except Exception:
+                        logger.warning("inventory listener failed", exc_info=True)
+            return applied
+
+    def _refresh_csv(self) -> int:
+        mtime = os.path.getmtime(self.csv_path)
+        if mtime == self._csv_mtime:
+            return 0
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        # A changed export replaces the snapshot, so dropped NDCs disappear too
+        self.index = InventoryIndex({}).merged(rows)
+        self._csv_mtime = mtime
+        return len(rows)
+
+    def _fetch_supabase_page(self, offset: int) -> list[dict]:
+        params = {"select": "*", "order": "updated_at.asc", "limit": PAGE_SIZE, "offset": offset}
+        if self._watermark:
+            params["updated_at"] = f"gte.{self._watermark}"
+        url = f"{self.supabase_url}/rest/v1/{SUPABASE_TABLE}?{urllib.parse.urlencode(params)}"
+        request = urllib.request.Request(url, headers={
+            "apikey": self.supabase_key,
+            "Authorization": f"Bearer {self.supabase_key}",
+        })
+        with urllib.request.urlopen(request, timeout=30) as resp:
+            return json.loads(resp.read())
+
+    def _refresh_supabase(self) -> int:
+        # Re-reading rows at exactly the watermark is harmless: merging is idempotent
+        rows, offset = [], 0
+        while True:
+            page = self._fetch_supabase_page(offset)
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        if not rows:
+            return 0
+        self.index = self.index.merged(rows)
+        self._watermark = max((r["updated_at"] for r in rows if r.get("updated_at")), default=self._watermark)
+        return len(rows)
+
+    def start(self) -> None:
+        """Load and keep refreshing in a daemon thread; returns immediately."""
+        if not self.configured:
+            logger.info("no inventory source configured; inventory lookups disabled")
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inventory-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        # First load right away; until it succeeds, retry on the refresh interval
+        delay = 0.0
+        while not self._stop.wait(delay):
+            delay = self.refresh_s
+            try:
+                self.refresh()
+            except Exception:
+                logger.warning(
+                    "inventory refresh failed" if self.ready else "initial inventory load failed", exc_info=True
+                )
+                continue
+            self._ready.set()
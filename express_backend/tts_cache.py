@@ -0,0 +1,292 @@
+"""
+Content-addressed cache of synthesized phrase audio.
+
+Low-stock and backorder alerts repeat the same sentences all day, and
+synthesizing each one again costs a TTS call plus time to first audio.
+Audio is cached per sentence, under a SHA-256 of (model, voice, text,
+sample rate, channels). Any change to the voice or format is therefore a
+different key, and stale audio is never replayed.
+
+- Memory tier: an LRU of raw PCM bounded by AGENT_TTS_CACHE_MB.
+- Disk tier: one WAV file per key in AGENT_TTS_CACHE_DIR ("" disables it).
+  Files are written atomically, so the cache survives restarts and is
+  shared by every job process on the host. Sentences with changing
+  quantities are new keys every time, so the directory is pruned: files
+  unused for AGENT_TTS_CACHE_MAX_AGE_DAYS go, then the least recently used
+  until it fits in AGENT_TTS_CACHE_DISK_MB.
+
+CachedTTSPlayer.say() splits text into sentences, one per alert sentence
+however short (the default tokenizer would merge "Warfarin is low." into
+its neighbour and give it a different key each time). Cached sentences are
+pushed to the rtc.AudioSource straight away. Novel ones are synthesized
+concurrently, streamed to the source as their audio arrives and stored for
+next time.
+
+    player = CachedTTSPlayer(tts, audio_source, model="sonic-english", voice=VOICE)
+    await player.say("Warfarin 5 mg is on backorder.")
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from livekit import rtc
+from livekit.agents import tokenize, tts as agents_tts
+
+logger = logging.getLogger("agent-tts-cache")
+
+TTS_CACHE_DIR = os.getenv("AGENT_TTS_CACHE_DIR", ".tts_cache")  # "" disables the disk tier
+TTS_CACHE_MB = float(os.getenv("AGENT_TTS_CACHE_MB", "64"))
+TTS_CACHE_DISK_MB = float(os.getenv("AGENT_TTS_CACHE_DISK_MB", "256"))
+TTS_CACHE_MAX_AGE_DAYS = float(os.getenv("AGENT_TTS_CACHE_MAX_AGE_DAYS", "30"))
+PRUNE_EVERY_WRITES = 32  # disk writes between directory scans
+FRAME_MS = 20  # size of the frames cached audio is pushed in
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace only; case and punctuation change the prosody
+    return " ".join(text.split())
+
+
+def cache_key(model: str, voice: str, text: str, sample_rate: int, num_channels: int = 1) -> str:
+    identity = json.dumps([model, voice, normalize_text(text), sample_rate, num_channels])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class CachedAudio:
+    pcm: bytes  # interleaved signed 16-bit little-endian
+    sample_rate: int
+    num_channels: int
+
+    @classmethod
+    def from_frames(cls, frames: list[rtc.AudioFrame]) -> "CachedAudio":
+        combined = rtc.combine_audio_frames(frames)
+        return cls(bytes(combined.data.cast("B")), combined.sample_rate, combined.num_channels)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (2 * self.num_channels * self.sample_rate)
+
+    def frames(self, frame_ms: int = FRAME_MS) -> Iterator[rtc.AudioFrame]:
+        bytes_per_sample = 2 * self.num_channels
+        step = self.sample_rate * frame_ms // 1000 * bytes_per_sample
+        for start in range(0, len(self.pcm), step):
+            chunk = self.pcm[start:start + step]
+            yield rtc.AudioFrame(chunk, self.sample_rate, self.num_channels, len(chunk) // bytes_per_sample)
+
+
+class PhraseAudioCache:
+    """Memory LRU in front of a directory of WAV files, keyed by cache_key()."""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = TTS_CACHE_DIR,
+        max_memory_mb: float = TTS_CACHE_MB,
+        *,
+        max_disk_mb: float = TTS_CACHE_DISK_MB,
+        max_age_days: float = TTS_CACHE_MAX_AGE_DAYS,
+    ):
+        self.cache_dir = cache_dir or None
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.max_age_s = max_age_days * 86400
+        self._memory: OrderedDict[str, CachedAudio] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "pruned": 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.prune_disk()
+
+    def get_memory(self, key: str) -> Optional[CachedAudio]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return audio
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        """Memory, then disk (promoting the hit into memory). Disk reads block; call off the event loop."""
+        audio = self.get_memory(key)
+        if audio is not None:
+            return audio
+        audio = self._read_disk(key)
+        with self._lock:
+            self.stats["disk_hits" if audio is not None else "misses"] += 1
+        if audio is not None:
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: CachedAudio) -> None:
+        self._remember(key, audio)
+        self._write_disk(key, audio)
+
+    def _remember(self, key: str, audio: CachedAudio) -> None:
+        if len(audio.pcm) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous.pcm)
+            self._memory[key] = audio
+            self._memory_bytes += len(audio.pcm)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.pcm)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _read_disk(self, key: str) -> Optional[CachedAudio]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with wave.open(path, "rb") as f:
+                audio = CachedAudio(f.readframes(f.getnframes()), f.getframerate(), f.getnchannels())
+            os.utime(path)  # mtime is the last use, for prune_disk()
+            return audio
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, wave.Error):
+            logger.warning("unreadable TTS cache file for %s", key, exc_info=True)
+            return None
+
+    def _write_disk(self, key: str, audio: CachedAudio) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, wave.open(raw, "wb") as f:
+                f.setnchannels(audio.num_channels)
+                f.setsampwidth(2)
+                f.setframerate(audio.sample_rate)
+                f.writeframes(audio.pcm)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logger.warning("could not write TTS cache file for %s", key, exc_info=True)
+            return
+        with self._lock:
+            self._writes_since_prune += 1
+            due = self._writes_since_prune >= PRUNE_EVERY_WRITES
+            if due:
+                self._writes_since_prune = 0
+        if due:
+            self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """Drop WAVs unused for max_age_days, then the least recently used over max_disk_mb. Returns files removed."""
+        if not self.cache_dir:
+            return 0
+        now = time.time()
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".wav"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # another process pruned it
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age_s and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        if removed:
+            with self._lock:
+                self.stats["pruned"] += removed
+            logger.info("pruned %d TTS cache files from %s", removed, self.cache_dir)
+        return removed
+
+
+class CachedTTSPlayer:
+    """Speaks text into an AudioSource, synthesizing only sentences not already cached."""
+
+    def __init__(
+        self,
+        tts: agents_tts.TTS,
+        source: rtc.AudioSource,
+        *,
+        model: str,
+        voice: str,
+        cache: Optional[PhraseAudioCache] = None,
+        tokenizer: Optional[tokenize.SentenceTokenizer] = None,
+    ):
+        self.tts = tts
+        self.source = source
+        self.model = model
+        self.voice = voice
+        self.cache = cache or PhraseAudioCache()
+        # min_sentence_len=1: every sentence is its own cache key, whatever surrounds it
+        self.tokenizer = tokenizer or tokenize.basic.SentenceTokenizer(min_sentence_len=1)
+        self.synthesized = 0  # sentences sent to the TTS API
+
+    def key(self, sentence: str) -> str:
+        return cache_key(self.model, self.voice, sentence, self.tts.sample_rate, self.tts.num_channels)
+
+    async def say(self, text: str) -> None:
+        sentences = [s for s in self.tokenizer.tokenize(text) if s.strip()]
+        keys = [self.key(s) for s in sentences]
+        cached: dict[str, CachedAudio] = {}
+        for key in set(keys):
+            audio = self.cache.get_memory(key) or await asyncio.to_thread(self.cache.get, key)
+            if audio is not None:
+                cached[key] = audio
+
+        # Every novel sentence starts synthesizing now, while earlier ones play
+        queues: dict[str, asyncio.Queue] = {}
+        tasks: dict[str, asyncio.Task] = {}
+        for sentence, key in zip(sentences, keys):
+            if key not in cached and key not in tasks:
+                queues[key] = asyncio.Queue()
+                tasks[key] = asyncio.create_task(self._synthesize(sentence, key, queues[key]))
+        try:
+            for key in keys:
+                if key in cached:
+                    for frame in cached[key].frames():
+                        await self.source.capture_frame(frame)
+                    continue
+                # First occurrence of a novel sentence streams as it is synthesized
+                while (frame := await queues[key].get()) is not None:
+                    await self.source.capture_frame(frame)
+                cached[key] = await tasks[key]
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _synthesize(self, sentence: str, key: str, queue: asyncio.Queue) -> CachedAudio:
+        frames: list[rtc.AudioFrame] = []
+        self.synthesized += 1
+        try:
+            async with self.tts.synthesize(sentence) as stream:
+                async for event in stream:
+                    frames.append(event.frame)
+                    queue.put_nowait(event.frame)
+        finally:
+            queue.put_nowait(None)
+        if not frames:
+            return CachedAudio(b"", self.tts.sample_rate, self.tts.num_channels)
+        audio = CachedAudio.from_frames(frames)
+        await asyncio.to_thread(self.cache.put, key, audio)
+        return audio
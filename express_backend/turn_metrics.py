@@ -0,0 +1,301 @@
+"""
+Per-turn latency for the voice agent.
+
+Each finished turn records where its time went:
+
+- stt_final: end of user speech -> final transcript
+- end_of_turn: end of user speech -> end-of-turn decision
+- llm_ttft: LLM time to first token
+- tts_ttfa: TTS time to first audio
+- total: end of user speech -> agent starts responding
+
+The numbers come from the metrics livekit attaches to chat messages. The
+user message carries the STT and end-of-turn delays, and the assistant
+reply that follows it carries the LLM and TTS timings. Agent-initiated
+replies, such as the greeting, have no user half.
+
+Turns feed rolling windows per session and per worker process, which give
+the p50/p90 summaries. Each turn is appended to a JSONL file that every job
+process on the host shares. The worker's totals since it started can also
+be written as a Prometheus text file. Those counts only go up; the rolling
+window would make them shrink. Every process writes its own file
+(agent_metrics.prom -> agent_metrics.<pid>.prom) with a pid label, so a
+textfile collector can read them all side by side. Turns slower than the
+SLA are flagged and logged.
+
+    python turn_metrics.py agent_turns.jsonl       # per-session + overall summary
+    python turn_metrics.py agent_turns.jsonl --prometheus
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+logger = logging.getLogger("agent-turn-metrics")
+
+TURN_SLA_S = float(os.getenv("AGENT_TURN_SLA_MS", "1500")) / 1000
+TURNS_FILE = os.getenv("AGENT_TURNS_FILE", "agent_turns.jsonl")  # "" disables
+PROMETHEUS_FILE = os.getenv("AGENT_METRICS_FILE")  # Prometheus text file (one per process), unset = off
+HISTOGRAM_WINDOW = 500  # turns kept per rolling window
+BUCKETS_S = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+STAGES = ("stt_final", "end_of_turn", "llm_ttft", "tts_ttfa", "total")
+
+
+class RollingHistogram:
+    """The last `window` observations, for percentiles."""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self._values: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self._values.append(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": len(self),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class CumulativeHistogram:
+    """Bucket counts, sum and count of every observation; Prometheus histogram semantics."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS_S)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, le in enumerate(BUCKETS_S):
+            if value <= le:
+                self.bucket_counts[i] += 1
+
+    def buckets(self) -> list[tuple[float, int]]:
+        return list(zip(BUCKETS_S, self.bucket_counts))
+
+
+@dataclass
+class TurnRecord:
+    session_id: str
+    turn: int
+    user_initiated: bool
+    stt_final: Optional[float] = None
+    end_of_turn: Optional[float] = None
+    llm_ttft: Optional[float] = None
+    tts_ttfa: Optional[float] = None
+    total: Optional[float] = None
+    over_sla: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+
+class _Histograms:
+    def __init__(self):
+        self.stages = {stage: RollingHistogram() for stage in STAGES}
+        self.totals = {stage: CumulativeHistogram() for stage in STAGES}
+        self.turns = 0
+        self.over_sla = 0
+
+    def add(self, record: TurnRecord) -> None:
+        self.turns += 1
+        self.over_sla += record.over_sla
+        for stage in STAGES:
+            value = getattr(record, stage)
+            if value is not None:
+                self.stages[stage].observe(value)
+                self.totals[stage].observe(value)
+
+    def summary(self) -> dict:
+        return {
+            "turns": self.turns,
+            "over_sla": self.over_sla,
+            **{stage: hist.summary() for stage, hist in self.stages.items()},
+        }
+
+
+# Worker-wide histograms: every session in this process adds to them
+_worker = _Histograms()
+_worker_lock = threading.Lock()
+_file_lock = threading.Lock()
+
+
+def worker_summary() -> dict:
+    with _worker_lock:
+        return _worker.summary()
+
+
+def prometheus_text(histograms: Optional[_Histograms] = None, *, pid: Optional[int] = None) -> str:
+    """
+    Prometheus text exposition of the given (default: this worker's) totals.
+    With `pid`, every series carries a pid label.
+    """
+    histograms = histograms or _worker
+    base = f'pid="{pid}",' if pid is not None else ""
+    lines = [
+        "# HELP agent_turn_latency_seconds Voice agent turn latency by stage",
+        "# TYPE agent_turn_latency_seconds histogram",
+    ]
+    for stage, hist in histograms.totals.items():
+        labels = f'{base}stage="{stage}"'
+        for le, count in hist.buckets():
+            lines.append(f'agent_turn_latency_seconds_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'agent_turn_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+        lines.append(f"agent_turn_latency_seconds_sum{{{labels}}} {hist.sum:.6f}")
+        lines.append(f"agent_turn_latency_seconds_count{{{labels}}} {hist.count}")
+    process = f"{{{base.rstrip(',')}}}" if base else ""
+    lines += [
+        "# TYPE agent_turns_total counter",
+        f"agent_turns_total{process} {histograms.turns}",
+        "# TYPE agent_turns_over_sla_total counter",
+        f"agent_turns_over_sla_total{process} {histograms.over_sla}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def process_metrics_file(path: str, pid: Optional[int] = None) -> str:
+    """agent_metrics.prom -> agent_metrics.<pid>.prom: job processes never share a file."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid if pid is not None else os.getpid()}{ext}"
+
+
+class TurnMetricsCollector:
+    """
+    Attach to an AgentSession to record a TurnRecord per agent reply:
+
+        collector = TurnMetricsCollector(ctx.room.name)
+        collector.attach(session)
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        *,
+        sla_s: float = TURN_SLA_S,
+        turns_file: Optional[str] = TURNS_FILE,
+        prometheus_file: Optional[str] = PROMETHEUS_FILE,
+    ):
+        self.session_id = session_id
+        self.sla_s = sla_s
+        self.turns_file = turns_file
+        self.prometheus_file = prometheus_file
+        self.histograms = _Histograms()
+        self._pending_user: Optional[dict] = None
+
+    def attach(self, session) -> None:
+        session.on("conversation_item_added", self._on_item_added)
+
+    def summary(self) -> dict:
+        return self.histograms.summary()
+
+    def _on_item_added(self, ev) -> None:
+        item = ev.item
+        metrics = getattr(item, "metrics", None) or {}
+        role = getattr(item, "role", None)
+        if role == "user":
+            self._pending_user = metrics
+        elif role == "assistant":
+            user, self._pending_user = self._pending_user, None
+            self.record(user, metrics)
+
+    def record(self, user_metrics: Optional[dict], reply_metrics: dict) -> TurnRecord:
+        user_metrics = user_metrics or {}
+        record = TurnRecord(
+            session_id=self.session_id,
+            turn=self.histograms.turns + 1,
+            user_initiated=bool(user_metrics),
+            stt_final=user_metrics.get("transcription_delay"),
+            end_of_turn=user_metrics.get("end_of_turn_delay"),
+            llm_ttft=reply_metrics.get("llm_node_ttft"),
+            tts_ttfa=reply_metrics.get("tts_node_ttfb"),
+        )
+        record.total = reply_metrics.get("e2e_latency")
+        if record.total is None:
+            parts = [record.end_of_turn, record.llm_ttft, record.tts_ttfa]
+            known = [p for p in parts if p is not None]
+            record.total = sum(known) if known else None
+        record.over_sla = record.total is not None and record.total > self.sla_s
+
+        self.histograms.add(record)
+        with _worker_lock:
+            _worker.add(record)
+            prom = prometheus_text(_worker, pid=os.getpid()) if self.prometheus_file else None
+
+        if record.over_sla:
+            logger.warning(
+                "turn %d over SLA: total %.0f ms > %.0f ms (stt %s, eot %s, llm ttft %s, tts ttfa %s)",
+                record.turn, record.total * 1000, self.sla_s * 1000,
+                *(_ms(getattr(record, s)) for s in ("stt_final", "end_of_turn", "llm_ttft", "tts_ttfa")),
+            )
+        self._export(record, prom)
+        return record
+
+    def _export(self, record: TurnRecord, prom: Optional[str]) -> None:
+        try:
+            with _file_lock:
+                if self.turns_file:
+                    # One short append per turn; O_APPEND keeps lines from several processes whole
+                    with open(self.turns_file, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(asdict(record)) + "\n")
+                if prom is not None:
+                    # Per-process file, so its temp file is private too; _file_lock covers this process's threads
+                    path = process_metrics_file(self.prometheus_file)
+                    tmp_path = path + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        f.write(prom)
+                    os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("could not write turn metrics", exc_info=True)
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def load_turns(path: str) -> list[TurnRecord]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [TurnRecord(**json.loads(line)) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize voice agent turn latency from a turns JSONL file")
+    parser.add_argument("turns_file", nargs="?", default=TURNS_FILE)
+    parser.add_argument("--prometheus", action="store_true", help="Print Prometheus text instead")
+    args = parser.parse_args()
+
+    overall = _Histograms()
+    sessions: dict[str, _Histograms] = {}
+    for record in load_turns(args.turns_file):
+        overall.add(record)
+        sessions.setdefault(record.session_id, _Histograms()).add(record)
+
+    if args.prometheus:
+        print(prometheus_text(overall), end="")
+        return
+    for name, hist in [*sessions.items(), ("ALL", overall)]:
+        s = hist.summary()
+        stages = "  ".join(
+            f"{stage} p50={_ms(s[stage]['p50'])} p90={_ms(s[stage]['p90'])}" for stage in STAGES
+        )
+        print(f"{name}: {s['turns']} turns, {s['over_sla']} over SLA  {stages}")
+
+
+if __name__ == "__main__":
+    main()